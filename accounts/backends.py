@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import get_hashing_pool, hash_password, verify_password
+
+UserModel = get_user_model()
+
+
+class HashingPoolModelBackend(ModelBackend):
+    """
+    `ModelBackend` verifying passwords in the password hashing pool when it is
+    enabled (see `accounts.hashing`), e.g. for `TokenObtainPairView`.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if get_hashing_pool() is None:
+            return super().authenticate(request, username, password, **kwargs)
+
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so response times don't reveal which usernames exist
+            hash_password(password)
+            return None
+
+        is_correct, outdated = verify_password(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if outdated:
+            user.password = hash_password(password)
+            user.save(update_fields=["password"])
+        return user
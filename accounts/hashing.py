@@ -0,0 +1,116 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import Throttled
+
+
+class HashingPoolSaturated(Throttled):
+    default_detail = "Too many sign-ins are in progress; retry shortly."
+
+
+def _setup_worker():
+    import django
+
+    django.setup()
+
+
+def _check_password(password, encoded):
+    # The setter is only called for a correct password hashed with outdated settings
+    outdated = []
+    return check_password(password, encoded, setter=outdated.append), bool(outdated)
+
+
+class HashingPool:
+    """
+    Process pool running password hashing and verification off the request worker.
+
+    At most `max_pending` operations are running or queued at a time in this web
+    process; further ones are rejected at once with `HashingPoolSaturated` (429 with
+    `Retry-After`) instead of piling up behind a login storm.
+
+    The calling request thread waits for the result, so the pool only frees capacity
+    for other requests in processes serving several requests at once (threaded or
+    ASGI workers). A sync gunicorn worker has a single request in flight, which can
+    never exceed the limit.
+    """
+
+    def __init__(self, workers, max_pending, retry_after):
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            # Workers only hash, so they start clean instead of forking the web process
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_setup_worker,
+        )
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.retry_after = retry_after
+
+    def run(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingPoolSaturated(wait=self.retry_after)
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache(maxsize=None)
+def get_hashing_pool():
+    """
+    Return the password hashing pool, or None if `ACCOUNTS_HASHING_POOL_ENABLED` is off.
+    """
+    if not settings.ACCOUNTS_HASHING_POOL_ENABLED:
+        return None
+    return HashingPool(
+        settings.ACCOUNTS_HASHING_WORKERS,
+        settings.ACCOUNTS_HASHING_MAX_PENDING,
+        settings.ACCOUNTS_HASHING_RETRY_AFTER,
+    )
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    if setting.startswith("ACCOUNTS_HASHING_"):
+        if get_hashing_pool.cache_info().currsize:
+            pool = get_hashing_pool()
+            if pool is not None:
+                pool.shutdown()
+        get_hashing_pool.cache_clear()
+
+
+def hash_password(password):
+    """
+    Hash a raw password for storage, in the hashing pool if it is enabled.
+
+    Raises:
+    - HashingPoolSaturated: If the pool has no free slot.
+    """
+    pool = get_hashing_pool()
+    if pool is None:
+        return make_password(password)
+    return pool.run(make_password, password)
+
+
+def verify_password(password, encoded):
+    """
+    Check a raw password against a stored hash, in the hashing pool if it is enabled.
+
+    Returns:
+    - tuple: Whether the password is correct, and whether the stored hash should be
+      upgraded to the current hasher settings.
+
+    Raises:
+    - HashingPoolSaturated: If the pool has no free slot.
+    """
+    pool = get_hashing_pool()
+    if pool is None:
+        return _check_password(password, encoded)
+    return pool.run(_check_password, password, encoded)
@@ -0,0 +1,255 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from message.models import MailboxEntry, Message
+
+PASSWORD = "benchmark-password"
+
+
+class ServerClient:
+    """
+    Minimal HTTP client for benchmarking a running server.
+    """
+
+    def __init__(self, base_url, headers=None):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+
+    def request(self, method, path, data=None):
+        """
+        Send a request and read the whole response.
+
+        Returns:
+        - tuple: The status code and the `Retry-After` header (None if absent).
+        """
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=urlencode(data).encode() if data is not None else None,
+            headers=self.headers,
+            method=method,
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get("Retry-After")
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get("Retry-After")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of the message list endpoint while other threads flood "
+        "the token endpoint with sign-ins, with password hashing inline and in the "
+        "hashing pool. With --url, a running server (e.g. gunicorn) is benchmarked "
+        "instead, with whichever hashing settings it was started with."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--storm-threads",
+            type=int,
+            default=8,
+            help="Threads signing in concurrently during the storm.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Message list requests timed per scenario.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Hashing pool processes (ACCOUNTS_HASHING_WORKERS).",
+        )
+        parser.add_argument(
+            "--max-pending",
+            type=int,
+            default=4,
+            help="Hashing pool capacity (ACCOUNTS_HASHING_MAX_PENDING).",
+        )
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server sharing this database, e.g. "
+                "http://localhost:8000; the benchmark users are created if missing."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self.benchmark_server(options)
+            return
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            reader = self.seed()
+            client = Client(
+                SERVER_NAME="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(reader)}",
+            )
+            list_url = reverse("message:message-list-create")
+
+            def list_messages():
+                return client.get(list_url).status_code
+
+            def make_sign_in():
+                storm_client = Client(SERVER_NAME="localhost")
+
+                def sign_in():
+                    response = storm_client.post(
+                        reverse("token_obtain_pair"),
+                        {"username": "bench_login", "password": PASSWORD},
+                    )
+                    return response.status_code, response.get("Retry-After")
+
+                return sign_in
+
+            scenarios = {
+                "baseline": (0, False),
+                "storm, inline hashing": (options["storm_threads"], False),
+                "storm, hashing pool": (options["storm_threads"], True),
+            }
+            for name, (storm_threads, pool_enabled) in scenarios.items():
+                with override_settings(
+                    ACCOUNTS_HASHING_POOL_ENABLED=pool_enabled,
+                    ACCOUNTS_HASHING_WORKERS=options["workers"],
+                    ACCOUNTS_HASHING_MAX_PENDING=options["max_pending"],
+                ):
+                    self.run_scenario(
+                        name,
+                        list_messages,
+                        make_sign_in,
+                        storm_threads,
+                        options["requests"],
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def benchmark_server(self, options):
+        """
+        Run the baseline and storm scenarios against the server at `--url`.
+        """
+        reader = self.seed()
+        connections.close_all()
+        client = ServerClient(
+            options["url"], {"Authorization": f"Bearer {AccessToken.for_user(reader)}"}
+        )
+        list_path = reverse("message:message-list-create")
+
+        def list_messages():
+            return client.request("GET", list_path)[0]
+
+        def make_sign_in():
+            storm_client = ServerClient(options["url"])
+            return lambda: storm_client.request(
+                "POST",
+                reverse("token_obtain_pair"),
+                {"username": "bench_login", "password": PASSWORD},
+            )
+
+        scenarios = {"baseline": 0, "storm": options["storm_threads"]}
+        for name, storm_threads in scenarios.items():
+            self.run_scenario(
+                name, list_messages, make_sign_in, storm_threads, options["requests"]
+            )
+
+    def seed(self):
+        """
+        Create the benchmark users and the reader's messages, unless they exist.
+
+        Returns:
+        - User: The user whose messages are listed.
+        """
+        reader, created = User.objects.get_or_create(username="bench_reader")
+        if created:
+            messages = Message.objects.bulk_create(
+                Message(
+                    sender=reader,
+                    receiver=reader,
+                    subject="Benchmark",
+                    content="Benchmark message body",
+                )
+                for _ in range(50)
+            )
+            MailboxEntry.objects.create_for_messages(messages)
+        if not User.objects.filter(username="bench_login").exists():
+            User.objects.create_user(username="bench_login", password=PASSWORD)
+        return reader
+
+    def run_scenario(self, name, list_messages, make_sign_in, storm_threads, requests):
+        """
+        Time message list requests while `storm_threads` threads keep signing in.
+
+        Parameters:
+        - list_messages (callable): Requests the message list, returning the status.
+        - make_sign_in (callable): Returns a function signing in once for a storm
+          thread, returning the status and `Retry-After` of the response.
+        """
+        stop = threading.Event()
+        logins = Counter()
+        lock = threading.Lock()
+
+        def storm():
+            sign_in = make_sign_in()
+            try:
+                while not stop.is_set():
+                    status, retry_after = sign_in()
+                    with lock:
+                        logins[status] += 1
+                    # Rejected clients back off as told, like well-behaved clients do
+                    if retry_after is not None:
+                        stop.wait(float(retry_after))
+            finally:
+                connections.close_all()
+
+        # Start the hashing pool's processes before timing anything
+        if storm_threads:
+            make_sign_in()()
+        threads = [threading.Thread(target=storm) for _ in range(storm_threads)]
+        for thread in threads:
+            thread.start()
+
+        timings = []
+        errors = 0
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                if list_messages() != 200:
+                    errors += 1
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        timings.sort()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"message list: median={statistics.median(timings):.2f}ms "
+            f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+            f"max={timings[-1]:.2f}ms errors={errors}"
+        )
+        if storm_threads:
+            self.stdout.write(
+                "sign-ins: "
+                + ", ".join(
+                    f"{count} x {status}" for status, count in sorted(logins.items())
+                )
+            )
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -51,3 +51,55 @@ class UserRegistrationTestCase(TestCase):
         }
         response = self.client.post(self.register_url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HashingPoolTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.register_url = reverse("register")
+        self.token_url = reverse("token_obtain_pair")
+        self.data = {
+            "username": "testuser",
+            "email": "testuser@example.com",
+            "password": "testpassword",
+        }
+
+    @override_settings(ACCOUNTS_HASHING_POOL_ENABLED=True, ACCOUNTS_HASHING_WORKERS=1)
+    def test_register_and_sign_in_through_the_pool(self):
+        """
+        Test that passwords hashed and verified in the pool work as usual.
+        """
+        response = self.client.post(self.register_url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            User.objects.get(username="testuser").check_password("testpassword")
+        )
+
+        response = self.client.post(
+            self.token_url, {"username": "testuser", "password": "testpassword"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("access", response.data)
+
+        response = self.client.post(
+            self.token_url, {"username": "testuser", "password": "wrong"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(
+        ACCOUNTS_HASHING_POOL_ENABLED=True, ACCOUNTS_HASHING_MAX_PENDING=0
+    )
+    def test_saturated_pool_rejects_with_retry_after(self):
+        """
+        Test that requests beyond the pool's capacity are turned away with 429.
+        """
+        response = self.client.post(self.register_url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(User.objects.exists())
+
+        User.objects.create_user(username="testuser", password="testpassword")
+        response = self.client.post(
+            self.token_url, {"username": "testuser", "password": "testpassword"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
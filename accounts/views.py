@@ -30,7 +30,7 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        logger.info(f"User {user.id} registered successfully.")
+        logger.info("User %s registered successfully.", user.id)
 
         return Response(
             {"message": "User registration successful.", "user_id": user.id}
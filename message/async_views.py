@@ -0,0 +1,247 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from messaging_system.metrics import render_response
+
+from .cache import acached_response
+from .cold import get_user_cold_messages
+from .conditional import (
+    mailbox_etag,
+    message_etag,
+    not_modified_response,
+    set_validators,
+)
+from .stats import aget_mailbox_stats
+from .utils import get_user_related_messages
+from .views import (
+    MessageListCreateView,
+    MessageMarkReadView,
+    MessageRetrieveUpdateDestroyView,
+)
+from .write_queue import run_write
+
+
+class AsyncAPIViewMixin:
+    """
+    Run a DRF view natively under ASGI.
+
+    Mirrors `APIView.dispatch` as a coroutine: the request is authenticated with the
+    authenticators' `aauthenticate`, the async handler is awaited on the event loop,
+    and the response is rendered in place, so a request served from the async ORM
+    never hops to a worker thread. Every HTTP method handler of the view (other than
+    `options`) must be a coroutine function.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if not isinstance(response, HttpResponse):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.render_response(self.response)
+
+    async def aperform_authentication(self, request):
+        """
+        Async version of `perform_authentication`, setting `request.user` and
+        `request.auth` from the first authenticator that accepts the request.
+        """
+        for authenticator in request.authenticators:
+            try:
+                result = await authenticator.aauthenticate(request)
+            except Exception:
+                request._not_authenticated()
+                raise
+            if result is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request._not_authenticated()
+
+    def render_response(self, response):
+        """
+        Render the response into a plain `HttpResponse`.
+
+        Django renders a response that still has a `render` method in a worker
+        thread; rendering it here keeps the whole request on the event loop.
+        """
+        if not isinstance(response, Response):
+            return response
+        render_response(response)
+        return HttpResponse(
+            response.content, status=response.status_code, headers=response.headers
+        )
+
+
+class AsyncMessageListCreateView(AsyncAPIViewMixin, MessageListCreateView):
+    """
+    `MessageListCreateView` served natively under ASGI.
+
+    Listing reads the mailbox stats, the page and its cold read-through with the
+    async ORM. Creating a message validates the receiver and writes the message, its
+    mailbox entries and counters in one transaction, which Django only runs
+    synchronously, so it is handed to a worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        """
+        Async version of `list`.
+        """
+        stats = await aget_mailbox_stats(request.user)
+        etag = mailbox_etag(request, stats)
+        response = not_modified_response(request, etag, stats.last_modified)
+        if response is not None:
+            return response
+
+        response = await acached_response(
+            request, partial(self.alist_page, request), data_version=stats.version
+        )
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag, stats.last_modified)
+        return response
+
+    async def alist_page(self, request):
+        """
+        Async version of `list_page`.
+        """
+        queryset = self.as_rows(self.filter_queryset(self.get_queryset()))
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return self.get_paginated_response(
+            self.get_row_serializer().to_representation(page)
+        )
+
+
+class AsyncMessageRetrieveUpdateDestroyView(
+    AsyncAPIViewMixin, MessageRetrieveUpdateDestroyView
+):
+    """
+    `MessageRetrieveUpdateDestroyView` served natively under ASGI.
+
+    Retrieving reads the message from the hot or cold tier with the async ORM; only
+    marking it as read, a transactional write, runs in a worker thread. Updates and
+    deletes run the synchronous handlers in a worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+    async def put(self, request, *args, **kwargs):
+        return await sync_to_async(super().put)(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await sync_to_async(super().patch)(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await sync_to_async(super().delete)(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Async version of `retrieve`.
+        """
+        row = None
+        for messages in (
+            get_user_related_messages(request.user),
+            get_user_cold_messages(request.user),
+        ):
+            row = (
+                await messages.filter(pk=kwargs["pk"])
+                .values_list("updated_at", "receiver_id", "is_read")
+                .afirst()
+            )
+            if row is not None:
+                break
+        # An unread message must still be marked as read when its receiver fetches it
+        if row is not None and (row[1] != request.user.id or row[2]):
+            updated_at = row[0]
+            response = not_modified_response(
+                request, message_etag(kwargs["pk"], updated_at), updated_at
+            )
+            if response is not None:
+                return response
+
+        response = await acached_response(
+            request,
+            partial(self.aretrieve_and_mark_read, request),
+            # A cached unread copy must not bypass marking the message as read
+            is_reusable=lambda data: data["is_read"]
+            or data["receiver"] != request.user.id,
+            data_version=row and row[0],
+        )
+        if (
+            response.status_code == status.HTTP_200_OK
+            and "ETag" not in response
+            and row is not None
+        ):
+            set_validators(response, message_etag(kwargs["pk"], row[0]), row[0])
+        return response
+
+    async def aretrieve_and_mark_read(self, request):
+        """
+        Async version of `retrieve_and_mark_read`.
+        """
+        instance = await self.aget_object()
+        if instance.receiver_id == request.user.id and not instance.is_read:
+            await sync_to_async(run_write)(self.mark_read, instance)
+        return self.message_response(instance)
+
+    async def aget_object(self):
+        """
+        Async version of `get_object` for reads: the message from the user's hot
+        messages, or else from their cold ones.
+        """
+        for queryset in (
+            self.filter_queryset(self.get_queryset()),
+            get_user_cold_messages(self.request.user),
+        ):
+            try:
+                instance = await queryset.aget(pk=self.kwargs["pk"])
+            except queryset.model.DoesNotExist:
+                continue
+            self.check_object_permissions(self.request, instance)
+            return instance
+        raise Http404
+
+
+class AsyncMessageMarkReadView(AsyncAPIViewMixin, MessageMarkReadView):
+    """
+    `MessageMarkReadView` served natively under ASGI.
+
+    The request is validated on the event loop; the locking read and the updates run
+    in one transaction in a worker thread.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = await sync_to_async(run_write)(
+            self.mark_read, request, serializer.validated_data
+        )
+
+        return Response({"updated": updated})
@@ -0,0 +1,117 @@
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .cache import LocMemLRUBackend
+
+
+class ActiveStatusCache:
+    """
+    Process-local cache of whether users are active, each answer kept for `ttl`
+    seconds, so a deactivated user is locked out within `ttl` seconds.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.backend = LocMemLRUBackend(max_entries=max_entries)
+
+    def get(self, user_id):
+        """
+        Return the cached active status of a user, or None if unknown or expired.
+        """
+        entry = self.backend.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def set(self, user_id, is_active):
+        self.backend.set(user_id, (is_active, time.monotonic() + self.ttl))
+
+
+@lru_cache(maxsize=None)
+def get_active_status_cache():
+    """
+    Return the active status cache, or None if `MESSAGE_AUTH_ACTIVE_CACHE_SECONDS`
+    disables it.
+    """
+    if settings.MESSAGE_AUTH_ACTIVE_CACHE_SECONDS <= 0:
+        return None
+    return ActiveStatusCache(settings.MESSAGE_AUTH_ACTIVE_CACHE_SECONDS)
+
+
+@receiver(setting_changed)
+def reset_active_status_cache(setting, **kwargs):
+    if setting == "MESSAGE_AUTH_ACTIVE_CACHE_SECONDS":
+        get_active_status_cache.cache_clear()
+
+
+def is_user_active(user_id):
+    """
+    Check whether a user exists and is active, through the active status cache.
+    """
+    active_status_cache = get_active_status_cache()
+    is_active = None
+    if active_status_cache is not None:
+        is_active = active_status_cache.get(user_id)
+    if is_active is None:
+        # A deleted user is as locked out as a deactivated one
+        is_active = User.objects.filter(id=user_id, is_active=True).exists()
+        if active_status_cache is not None:
+            active_status_cache.set(user_id, is_active)
+    return is_active
+
+
+async def ais_user_active(user_id):
+    """
+    Async version of `is_user_active`.
+    """
+    active_status_cache = get_active_status_cache()
+    is_active = None
+    if active_status_cache is not None:
+        is_active = active_status_cache.get(user_id)
+    if is_active is None:
+        is_active = await User.objects.filter(id=user_id, is_active=True).aexists()
+        if active_status_cache is not None:
+            active_status_cache.set(user_id, is_active)
+    return is_active
+
+
+class MessageJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication for the message endpoints that does not load the user row.
+
+    `request.user` is a `TokenUser` built from the token claims, carrying the user's
+    `id`; views that need the full `User` must load it themselves. The only state
+    read from the database is whether the user is still active, and that answer is
+    cached for `MESSAGE_AUTH_ACTIVE_CACHE_SECONDS`.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not is_user_active(user.id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        Async version of `authenticate`, for the async message views.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = super().get_user(validated_token)
+        if not await ais_user_active(user.id):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user, validated_token
@@ -0,0 +1,241 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import MailboxEntry, Message
+from .stats import rebuild_mailbox_stats
+from .threads import backfill_threads
+
+SEED_BATCH_SIZE = 10000
+
+# Workloads run by `benchmark_api`, in order. `detail` fetches unread messages as
+# their receiver, so each request also marks a message as read.
+WORKLOADS = ("list", "unread", "detail", "create", "delete")
+
+# Change of a metric between two runs beyond which `compare_results` flags it
+REGRESSION_THRESHOLD = 0.1
+
+
+def seed_dataset(user_count, message_count, read_ratio=0.8, rng=random):
+    """
+    Top up the database to the requested number of users and messages, with their
+    mailbox entries, threads and mailbox counters.
+
+    Parameters:
+    - user_count (int): The number of users to have.
+    - message_count (int): The number of messages to have.
+    - read_ratio (float): The fraction of seeded messages already read.
+    - rng (Random): The random number generator picking senders and receivers.
+
+    Returns:
+    - list: The ids of all users.
+    """
+    existing_users = User.objects.count()
+    User.objects.bulk_create(
+        User(username=f"bench_user_{i}", password="!")
+        for i in range(existing_users, max(user_count, 2))
+    )
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+
+    existing_messages = Message.objects.count()
+    for start in range(existing_messages, message_count, SEED_BATCH_SIZE):
+        messages = []
+        for _ in range(min(SEED_BATCH_SIZE, message_count - start)):
+            sender_id, receiver_id = rng.sample(user_ids, 2)
+            messages.append(
+                Message(
+                    sender_id=sender_id,
+                    receiver_id=receiver_id,
+                    subject="Benchmark",
+                    content="Benchmark message body",
+                    is_read=rng.random() < read_ratio,
+                )
+            )
+        MailboxEntry.objects.create_for_messages(Message.objects.bulk_create(messages))
+
+    if existing_messages < message_count:
+        backfill_threads()
+        rebuild_mailbox_stats()
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return user_ids
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which `fraction` of the sorted `values` fall.
+    """
+    return values[min(len(values) - 1, max(0, round(len(values) * fraction) - 1))]
+
+
+class APIBenchmark:
+    """
+    Time scripted requests against the message endpoints, through the full Django
+    request stack (middleware, authentication, views, serialization and rendering).
+
+    Every workload sends its requests one at a time as randomly picked actors, each
+    authenticated with their own JWT access token.
+    """
+
+    def __init__(self, user_ids, actor_count=20, rng=random):
+        self.rng = rng
+        self.user_ids = user_ids
+        self.clients = {
+            user.id: Client(
+                SERVER_NAME="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}",
+            )
+            for user in User.objects.filter(
+                id__in=rng.sample(user_ids, min(actor_count, len(user_ids)))
+            )
+        }
+        self.list_url = reverse("message:message-list-create")
+
+    def run(self, workloads=WORKLOADS, requests=100):
+        """
+        Run the workloads.
+
+        Returns:
+        - dict: The results of each workload, keyed by name (see `measure`).
+        """
+        return {
+            name: self.measure(getattr(self, f"{name}_requests")(requests))
+            for name in workloads
+        }
+
+    def measure(self, requests):
+        """
+        Send the requests and summarize their latency and database queries.
+
+        Parameters:
+        - requests (iterable): `(client, method, url, data, expected_status)` tuples.
+
+        Returns:
+        - dict: The request and error counts, the throughput, the latency
+          percentiles in milliseconds and the number of queries per request.
+        """
+        timings = []
+        query_counts = []
+        errors = 0
+        started = time.perf_counter()
+        for client, method, url, data, expected_status in requests:
+            kwargs = {}
+            if data is not None:
+                kwargs = {"data": data, "content_type": "application/json"}
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                timings.append((time.perf_counter() - start) * 1000)
+            query_counts.append(len(queries))
+            if response.status_code != expected_status:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        if not timings:
+            return {"requests": 0, "errors": 0}
+        timings.sort()
+        return {
+            "requests": len(timings),
+            "errors": errors,
+            "rps": round(len(timings) / elapsed, 2),
+            "latency_ms": {
+                "p50": round(percentile(timings, 0.5), 3),
+                "p95": round(percentile(timings, 0.95), 3),
+                "p99": round(percentile(timings, 0.99), 3),
+                "mean": round(statistics.mean(timings), 3),
+                "max": round(timings[-1], 3),
+            },
+            "queries_per_request": {
+                "mean": round(statistics.mean(query_counts), 2),
+                "max": max(query_counts),
+            },
+        }
+
+    def pick_client(self):
+        return self.rng.choice(list(self.clients.values()))
+
+    def list_requests(self, count):
+        for _ in range(count):
+            yield self.pick_client(), "get", self.list_url, None, status.HTTP_200_OK
+
+    def unread_requests(self, count):
+        url = f"{self.list_url}?is_read=false"
+        for _ in range(count):
+            yield self.pick_client(), "get", url, None, status.HTTP_200_OK
+
+    def detail_requests(self, count):
+        unread = list(
+            Message.objects.filter(
+                receiver_id__in=self.clients, is_read=False
+            ).values_list("id", "receiver_id")
+        )
+        for message_id, receiver_id in self.rng.sample(unread, min(count, len(unread))):
+            url = reverse("message:message-detail", kwargs={"pk": message_id})
+            yield self.clients[receiver_id], "get", url, None, status.HTTP_200_OK
+
+    def create_requests(self, count):
+        for _ in range(count):
+            data = {
+                "receiver": self.rng.choice(self.user_ids),
+                "subject": "Benchmark",
+                "content": "Benchmark message body",
+            }
+            yield self.pick_client(), "post", self.list_url, data, status.HTTP_201_CREATED
+
+    def delete_requests(self, count):
+        entries = list(
+            MailboxEntry.objects.filter(
+                user_id__in=self.clients, is_deleted=False
+            ).values_list("message_id", "user_id")
+        )
+        for message_id, user_id in self.rng.sample(entries, min(count, len(entries))):
+            url = reverse("message:message-detail", kwargs={"pk": message_id})
+            yield self.clients[user_id], "delete", url, None, status.HTTP_204_NO_CONTENT
+
+
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the workloads of two benchmark runs.
+
+    Parameters:
+    - baseline (dict): The `workloads` of the earlier run.
+    - results (dict): The `workloads` of the later run.
+    - threshold (float): The relative change flagged as a regression.
+
+    Returns:
+    - list: `(workload, metric, before, after, change, regressed)` tuples for the
+      p50/p95/p99 latency, the throughput and the queries per request of the
+      workloads present in both runs.
+    """
+    rows = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("requests") or not result.get("requests"):
+            continue
+        metrics = [
+            (f"{key} ms", before["latency_ms"][key], result["latency_ms"][key], 1)
+            for key in ("p50", "p95", "p99")
+        ]
+        metrics.append(("rps", before["rps"], result["rps"], -1))
+        metrics.append(
+            (
+                "queries",
+                before["queries_per_request"]["mean"],
+                result["queries_per_request"]["mean"],
+                1,
+            )
+        )
+        for metric, old, new, direction in metrics:
+            change = (new - old) / old if old else 0.0
+            rows.append(
+                (name, metric, old, new, change, change * direction > threshold)
+            )
+    return rows
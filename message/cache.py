@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class LocMemLRUBackend:
+    """
+    Process-local cache holding at most `max_entries` values, evicting the least
+    recently used one first.
+
+    Only suitable when a single process serves all requests of a user: a write
+    handled by another process cannot invalidate this process's entries.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DjangoCacheBackend:
+    """
+    Shared backend storing entries in one of the project's Django `CACHES`
+    (e.g. Redis or Memcached), so every process sees the same versions.
+    """
+
+    def __init__(self, alias="default", timeout=300):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+
+class MessageCache:
+    """
+    Cache of serialized message responses, namespaced by user and a per-user version.
+
+    Every write to a mailbox replaces the user's version, which makes all entries
+    cached under the previous version unreachable; they age out of the backend on
+    their own. Versions are fresh timestamps rather than counters, so a version that
+    was evicted can never be recreated with a value that old entries were stored under.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self, user_id):
+        version = self.backend.get(f"messages:version:{user_id}")
+        if version is None:
+            version = self.bump(user_id)
+        return version
+
+    def bump(self, user_id):
+        version = time.time_ns()
+        self.backend.set(f"messages:version:{user_id}", version)
+        return version
+
+    def get(self, user_id, version, key):
+        value = self.backend.get(f"messages:{user_id}:{version}:{key}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, user_id, version, key, value):
+        self.backend.set(f"messages:{user_id}:{version}:{key}", value)
+
+    def stats(self):
+        """
+        Return the hit/miss counters of this process.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+@lru_cache(maxsize=None)
+def get_message_cache():
+    """
+    Return the configured message cache, or None if caching is disabled.
+    """
+    if not settings.MESSAGE_CACHE_ENABLED:
+        return None
+    backend = import_string(settings.MESSAGE_CACHE_BACKEND)
+    return MessageCache(backend(**settings.MESSAGE_CACHE_OPTIONS))
+
+
+@receiver(setting_changed)
+def reset_message_cache(setting, **kwargs):
+    if setting.startswith("MESSAGE_CACHE_"):
+        get_message_cache.cache_clear()
+
+
+def invalidate_mailboxes(user_ids):
+    """
+    Drop the cached responses of the given users once the current transaction commits.
+
+    Invalidating after the commit guarantees that a response computed from the old
+    data cannot be stored under the new version.
+
+    Parameters:
+    - user_ids (iterable): The users whose mailboxes changed.
+    """
+    message_cache = get_message_cache()
+    if message_cache is None:
+        return
+
+    user_ids = set(user_ids)
+
+    def bump_versions():
+        for user_id in user_ids:
+            message_cache.bump(user_id)
+
+    transaction.on_commit(bump_versions)
+
+
+def cached_response(request, get_response, is_reusable=None, data_version=None):
+    """
+    Serve a GET response from the cache, computing and storing it on a miss.
+
+    Parameters:
+    - request (Request): The request; the cache key is its user, host and full path.
+    - get_response (callable): Computes the response on a miss.
+    - is_reusable (callable): Optional check of cached data; returning False forces
+      the response to be recomputed, e.g. when serving it would skip a side effect.
+    - data_version: Optional version of the data the response is read from, e.g. the
+      mailbox change marker, added to the cache key. A response read from a lagging
+      replica is then stored under the replica's version, not under the newer one
+      the user's cache version was bumped for.
+
+    Returns:
+    - Response: The cached or freshly computed response.
+    """
+    message_cache = get_message_cache()
+    if message_cache is None:
+        return get_response()
+
+    user_id = request.user.id
+    version = message_cache.get_version(user_id)
+    key = f"{data_version}:{request.get_host()}{request.get_full_path()}"
+    data = message_cache.get(user_id, version, key)
+    if data is not None and (is_reusable is None or is_reusable(data)):
+        return Response(data)
+
+    response = get_response()
+    if response.status_code == status.HTTP_200_OK:
+        message_cache.set(user_id, version, key, response.data)
+    return response
+
+
+async def acached_response(request, get_response, is_reusable=None, data_version=None):
+    """
+    Async version of `cached_response`, where `get_response` is a coroutine function.
+    """
+    message_cache = get_message_cache()
+    if message_cache is None:
+        return await get_response()
+
+    user_id = request.user.id
+    version = message_cache.get_version(user_id)
+    key = f"{data_version}:{request.get_host()}{request.get_full_path()}"
+    data = message_cache.get(user_id, version, key)
+    if data is not None and (is_reusable is None or is_reusable(data)):
+        return Response(data)
+
+    response = await get_response()
+    if response.status_code == status.HTTP_200_OK:
+        message_cache.set(user_id, version, key, response.data)
+    return response
@@ -0,0 +1,138 @@
+from django.db import models
+
+from .models import ColdMailboxEntry, ColdMessage, MailboxEntry, Message
+from .utils import ENTRY_ROW_FIELDS, record_entries_changed
+
+COLD_MESSAGE_FIELDS = [
+    "sender_id",
+    "receiver_id",
+    "subject",
+    "content",
+    "created_at",
+    "updated_at",
+    "is_read",
+    "thread_id",
+]
+
+
+def get_user_cold_messages(user, archived=None):
+    """
+    Retrieve the cold messages in the specified user's mailbox.
+
+    The queryset has the same shape as `get_user_related_messages`, including the
+    `mailbox_created_at` and `mailbox_message_id` aliases, so the same filters and
+    orderings apply to both storage tiers.
+
+    Parameters:
+    - user (User): The user for whom to retrieve messages.
+    - archived (bool): Only return archived (`True`) or unarchived (`False`) messages;
+      both if omitted.
+
+    Returns:
+    - QuerySet: The user's cold messages.
+    """
+    entry = {"mailbox_entries__user_id": user.id}
+    if archived is not None:
+        entry["mailbox_entries__is_archived"] = archived
+    return ColdMessage.objects.filter(**entry).alias(
+        mailbox_created_at=models.F("mailbox_entries__created_at"),
+        mailbox_message_id=models.F("mailbox_entries__message_id"),
+    )
+
+
+def move_messages_to_cold_storage(message_ids):
+    """
+    Move messages and their live mailbox entries from the hot tables to cold storage.
+
+    The mailbox counters, thread summaries and sync state are unchanged, since the
+    messages stay in their participants' mailboxes. Messages that every participant
+    already deleted are dropped instead of moved. Must be called inside a transaction.
+
+    Parameters:
+    - message_ids (list): The messages to move.
+
+    Returns:
+    - int: The number of messages moved.
+    """
+    messages = Message.objects.filter(id__in=message_ids).select_for_update()
+    entries = list(
+        MailboxEntry.objects.filter(message_id__in=message_ids, is_deleted=False)
+    )
+    kept = {entry.message_id for entry in entries}
+    ColdMessage.objects.bulk_create(
+        [
+            ColdMessage(id=row[0], **dict(zip(COLD_MESSAGE_FIELDS, row[1:])))
+            for row in messages.values_list("id", *COLD_MESSAGE_FIELDS)
+            if row[0] in kept
+        ],
+        ignore_conflicts=True,
+    )
+    ColdMailboxEntry.objects.bulk_create(
+        [
+            ColdMailboxEntry(
+                user_id=entry.user_id,
+                message_id=entry.message_id,
+                created_at=entry.created_at,
+                is_archived=entry.is_archived,
+            )
+            for entry in entries
+        ],
+        ignore_conflicts=True,
+    )
+    messages.delete()
+    return len(kept)
+
+
+def delete_cold_messages(queryset):
+    """
+    Delete cold messages for all of their participants and update their mailboxes,
+    see `delete_messages`.
+
+    Parameters:
+    - queryset (QuerySet): The cold messages to delete.
+
+    Returns:
+    - int: The number of deleted messages.
+    """
+    ids = list(queryset.select_for_update().values_list("id", flat=True))
+    if not ids:
+        return 0
+
+    rows = list(
+        ColdMailboxEntry.objects.filter(message_id__in=ids).values_list(
+            *ENTRY_ROW_FIELDS
+        )
+    )
+    ColdMessage.objects.filter(id__in=ids).delete()
+    record_entries_changed(removed=rows)
+    return len(ids)
+
+
+def delete_cold_messages_for_user(user, message_ids):
+    """
+    Remove cold messages from one participant's mailbox, leaving them in the other's,
+    see `delete_messages_for_user`.
+
+    The user's entries are deleted right away, and so are the messages no participant
+    has left. Must be called inside a transaction.
+
+    Parameters:
+    - user (User): The user deleting the messages.
+    - message_ids (list): The messages to delete; ids outside the user's cold mailbox
+      are ignored.
+
+    Returns:
+    - int: The number of messages removed from the mailbox.
+    """
+    entries = ColdMailboxEntry.objects.filter(
+        user_id=user.id, message_id__in=message_ids
+    )
+    rows = list(entries.select_for_update().values_list(*ENTRY_ROW_FIELDS))
+    if not rows:
+        return 0
+
+    ids = [row[0] for row in rows]
+    entries.filter(message_id__in=ids).delete()
+    ColdMessage.objects.filter(id__in=ids, mailbox_entries__isnull=True).delete()
+    record_entries_changed(removed=rows)
+    return len(rows)
@@ -0,0 +1,79 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+
+def mailbox_etag(request, stats):
+    """
+    Build the ETag of a message list response from the mailbox change marker.
+
+    The response also depends on the requested page, filters and host (for the
+    pagination links), so those are folded into the tag as well.
+
+    Parameters:
+    - request (Request): The list request.
+    - stats (MailboxStats): The mailbox counters of the requesting user.
+
+    Returns:
+    - str: A quoted strong ETag.
+    """
+    representation = f"{request.get_host()}{request.get_full_path()}"
+    digest = md5(representation.encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(f"{stats.user_id}-{stats.version}-{digest}")
+
+
+def message_etag(message_id, updated_at):
+    """
+    Build the ETag of a single message from its id and last update time.
+
+    Returns:
+    - str: A quoted strong ETag.
+    """
+    return quote_etag(f"{message_id}-{int(updated_at.timestamp() * 1_000_000)}")
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Answer a conditional GET without building the response body.
+
+    Parameters:
+    - request (Request): The request carrying `If-None-Match`/`If-Modified-Since`.
+    - etag (str): The current ETag of the resource.
+    - last_modified (datetime): The current modification time, if known.
+
+    Returns:
+    - HttpResponse: A 304 response carrying the validators, or None if the client's
+      copy is stale and the full response must be sent.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Attach the `ETag` and `Last-Modified` headers to a response.
+    """
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def if_match_etags(request):
+    """
+    Return the ETags listed in the request's `If-Match` header.
+
+    Returns:
+    - list: The quoted ETags, `["*"]` for a wildcard, or None if there is no header.
+    """
+    header = request.META.get("HTTP_IF_MATCH")
+    if header is None:
+        return None
+    return parse_etags(header)
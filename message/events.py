@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+MESSAGE_CREATED = "message.created"
+MESSAGE_READ = "message.read"
+
+
+class Subscription:
+    """
+    A connected client's queue of pending events, owned by the event loop serving it.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """
+        Queue an event for this subscriber. Safe to call from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The connection's event loop has already shut down.
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client must not grow memory without bound; it is told to resync.
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """
+        Wait for the next event.
+
+        Raises:
+        - asyncio.TimeoutError: If no event arrived within `timeout` seconds.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class BaseEventBroker(ABC):
+    """
+    Interface between the request code publishing mailbox events and the connections
+    streaming them to users.
+
+    `publish` is called from ordinary (sync) request handling after the write has
+    committed; `subscribe` is used by async views on the event loop. A multi-node
+    broker would forward `publish` to a shared bus (e.g. Redis pub/sub) and have each
+    process fan out the events it receives to its local subscriptions.
+    """
+
+    @abstractmethod
+    def publish(self, user_id, event_type, data):
+        """
+        Deliver an event to every connection of a user.
+        """
+
+    @abstractmethod
+    def subscribe(self, user_id):
+        """
+        Return a context manager registering a connection for a user's events and
+        yielding its `Subscription`.
+        """
+
+
+class InProcessEventBroker(BaseEventBroker):
+    """
+    Single-process broker keeping one bounded queue per connected client.
+
+    Only clients connected to the same process receive the events it publishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, user_id, event_type, data):
+        """
+        Deliver an event to every connection of a user.
+
+        Parameters:
+        - user_id (int): The user to notify.
+        - event_type (str): The event name, e.g. `message.created`.
+        - data (dict): The JSON-serializable event payload.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        if not subscriptions:
+            return
+
+        event = (event_type, json.dumps(data, cls=JSONEncoder))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    @contextmanager
+    def subscribe(self, user_id):
+        """
+        Register the calling event loop's connection for a user's events.
+
+        Yields:
+        - Subscription: The queue of events for the connection.
+        """
+        subscription = Subscription(
+            asyncio.get_running_loop(), settings.MESSAGE_EVENTS_QUEUE_SIZE
+        )
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[user_id].discard(subscription)
+                if not self._subscriptions[user_id]:
+                    del self._subscriptions[user_id]
+
+
+@lru_cache(maxsize=None)
+def get_event_broker():
+    """
+    Return the broker configured by the `MESSAGE_EVENT_BROKER` setting.
+    """
+    return import_string(settings.MESSAGE_EVENT_BROKER)()
+
+
+@receiver(setting_changed)
+def reset_event_broker(setting, **kwargs):
+    if setting == "MESSAGE_EVENT_BROKER":
+        get_event_broker.cache_clear()
+
+
+def publish_on_commit(user_id, event_type, data):
+    """
+    Publish an event once the current transaction commits, so that clients never
+    hear about writes that were rolled back.
+    """
+    transaction.on_commit(lambda: get_event_broker().publish(user_id, event_type, data))
+
+
+def publish_messages_created(rows):
+    """
+    Notify the receivers of newly created messages once the transaction commits.
+
+    The events only carry the message ids, and the whole batch is published by a
+    single commit callback, so a large bulk send does not keep its messages in
+    memory until the commit. Subscribers fetch the messages themselves.
+
+    Parameters:
+    - rows (iterable): `(message_id, receiver_id)` tuples of the new messages.
+    """
+    rows = list(rows)
+
+    def publish():
+        broker = get_event_broker()
+        for message_id, receiver_id in rows:
+            broker.publish(receiver_id, MESSAGE_CREATED, {"id": message_id})
+
+    transaction.on_commit(publish)
+
+
+def publish_messages_read(rows, receiver_id):
+    """
+    Send read receipts to the senders of messages that were just read.
+
+    Parameters:
+    - rows (iterable): `(message_id, sender_id)` tuples of the read messages.
+    - receiver_id (int): The user who read the messages.
+    """
+    ids_by_sender = defaultdict(list)
+    for message_id, sender_id in rows:
+        ids_by_sender[sender_id].append(message_id)
+    for sender_id, message_ids in ids_by_sender.items():
+        publish_on_commit(
+            sender_id, MESSAGE_READ, {"ids": message_ids, "receiver": receiver_id}
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from message.threads import THREAD_UPDATE_BATCH_SIZE, backfill_threads
+
+
+class Command(BaseCommand):
+    help = (
+        "Attach messages without a thread to the thread of their sender and "
+        "receiver, and compute the summaries of the affected threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=THREAD_UPDATE_BATCH_SIZE,
+            help="Number of user pairs handled per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        count = backfill_threads(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Attached {count} messages to their threads.")
+        )
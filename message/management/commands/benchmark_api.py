@@ -0,0 +1,164 @@
+import json
+import platform
+import random
+import subprocess
+import sys
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from message.benchmark import WORKLOADS, APIBenchmark, compare_results, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with users and messages, run scripted workloads "
+        "against the message endpoints and report the p50/p95/p99 latency, "
+        "throughput and queries per request of each workload as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=100, help="Number of users to seed."
+        )
+        parser.add_argument(
+            "--messages", type=int, default=10000, help="Number of messages to seed."
+        )
+        parser.add_argument(
+            "--actors",
+            type=int,
+            default=20,
+            help="Number of seeded users sending the requests.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests timed per workload."
+        )
+        parser.add_argument(
+            "--workload",
+            action="append",
+            dest="workloads",
+            choices=WORKLOADS,
+            help="Only run this workload (repeatable; defaults to all of them).",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed for the dataset and run."
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument(
+            "--compare",
+            help="JSON report of an earlier run to compare this run against.",
+        )
+        parser.add_argument(
+            "--db-file",
+            help="SQLite file for the benchmark database (defaults to in-memory).",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database so later runs can skip seeding. "
+            "Write workloads change it, so later runs are not identical.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+
+        if options["db_file"] and connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = options["db_file"]
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"]
+        )
+        try:
+            rng = random.Random(options["seed"])
+            user_ids = seed_dataset(options["users"], options["messages"], rng=rng)
+            benchmark = APIBenchmark(user_ids, options["actors"], rng=rng)
+            results = benchmark.run(
+                options["workloads"] or WORKLOADS, options["requests"]
+            )
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+
+        report = {
+            "environment": self.get_environment(),
+            "dataset": {
+                "users": options["users"],
+                "messages": options["messages"],
+                "actors": options["actors"],
+                "seed": options["seed"],
+            },
+            "workloads": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.write_comparison(baseline.get("workloads", {}), results)
+
+    def get_environment(self):
+        """
+        Describe what was benchmarked, so reports of different commits can be told
+        apart.
+        """
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            commit = ""
+        return {
+            "commit": commit or None,
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "platform": sys.platform,
+            "settings": {
+                name: getattr(settings, name)
+                for name in (
+                    "MESSAGE_ASYNC_VIEWS",
+                    "MESSAGE_CACHE_ENABLED",
+                    "MESSAGE_AUTH_ACTIVE_CACHE_SECONDS",
+                    "LOG_QUEUE_ENABLED",
+                    "DATABASE_CONN_MAX_AGE",
+                    "DATABASE_POOL_ENABLED",
+                    "DATABASE_REPLICAS",
+                )
+            },
+        }
+
+    def write_comparison(self, baseline, results):
+        """
+        Print how each metric changed since the baseline run, flagging regressions.
+        """
+        self.stderr.write(self.style.MIGRATE_HEADING("Compared with the baseline:"))
+        regressions = 0
+        for name, metric, old, new, change, regressed in compare_results(
+            baseline, results
+        ):
+            line = f"{name:<8} {metric:<8} {old:>10} -> {new:<10} ({change:+.1%})"
+            if regressed:
+                regressions += 1
+                self.stderr.write(self.style.ERROR(f"{line} regression"))
+            else:
+                self.stderr.write(line)
+        if regressions:
+            self.stderr.write(self.style.ERROR(f"{regressions} metrics regressed."))
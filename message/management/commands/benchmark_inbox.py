@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from message.models import MailboxEntry, Message
+from message.pagination import MailboxCursorPagination, MessageCursorPagination
+from message.utils import get_user_related_messages
+
+SEED_BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with messages and compare the query plans and "
+        "latency of the inbox queries read through mailbox entries with the same "
+        "queries filtering messages by `sender OR receiver`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=1000000, help="Number of messages to seed."
+        )
+        parser.add_argument(
+            "--users", type=int, default=1000, help="Number of users to seed."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Timed runs per query."
+        )
+        parser.add_argument(
+            "--page-size", type=int, default=50, help="Rows fetched per query."
+        )
+        parser.add_argument(
+            "--db-file",
+            help="SQLite file for the benchmark database (defaults to in-memory).",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database so later runs can skip seeding.",
+        )
+
+    def handle(self, *args, **options):
+        if options["db_file"] and connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = options["db_file"]
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"]
+        )
+        try:
+            self.seed(options["users"], options["rows"])
+            user = User.objects.order_by("id").first()
+            modes = {
+                "or": (
+                    Message.objects.filter(
+                        models.Q(sender=user) | models.Q(receiver=user)
+                    ),
+                    MessageCursorPagination.ordering,
+                ),
+                "entries": (
+                    get_user_related_messages(user),
+                    MailboxCursorPagination.ordering,
+                ),
+            }
+            for query_mode, (messages, ordering) in modes.items():
+                self.benchmark_mode(
+                    user,
+                    query_mode,
+                    messages,
+                    ordering,
+                    options["repeat"],
+                    options["page_size"],
+                )
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+
+    def seed(self, user_count, row_count):
+        """
+        Top up the benchmark database to the requested number of users and messages.
+        """
+        existing_users = User.objects.count()
+        User.objects.bulk_create(
+            User(username=f"bench_user_{i}", password="!")
+            for i in range(existing_users, user_count)
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+
+        existing_rows = Message.objects.count()
+        self.stdout.write(f"Seeding {max(row_count - existing_rows, 0)} messages...")
+        for start in range(existing_rows, row_count, SEED_BATCH_SIZE):
+            batch_size = min(SEED_BATCH_SIZE, row_count - start)
+            messages = Message.objects.bulk_create(
+                Message(
+                    sender_id=random.choice(user_ids),
+                    receiver_id=random.choice(user_ids),
+                    subject="Benchmark",
+                    content="Benchmark message body",
+                    is_read=random.random() < 0.8,
+                )
+                for _ in range(batch_size)
+            )
+            MailboxEntry.objects.create_for_messages(messages)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def benchmark_mode(self, user, query_mode, messages, ordering, repeat, page_size):
+        """
+        Print the plan and latency of the list and unread queries for one query mode.
+        """
+        queries = {
+            "list": messages.order_by(*ordering)[:page_size],
+            "unread": messages.filter(receiver=user, is_read=False).order_by(*ordering)[
+                :page_size
+            ],
+        }
+
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"[{query_mode}] {name}"))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f"median={statistics.median(timings):.2f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+                f"min={timings[0]:.2f}ms"
+            )
@@ -0,0 +1,129 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from message.models import MailboxEntry, Message
+from message.pagination import MailboxCursorPagination
+from message.serializers import MessageRowSerializer, MessageSerializer
+from message.utils import get_user_related_messages
+from messaging_system.renderers import FastJSONRenderer
+
+OVERVIEW_FIELDS = ["id", "subject", "sender", "created_at", "is_read"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with messages and time fetching, serializing and "
+        "rendering one page of the message list with model instances and DRF's "
+        "serializer and renderer, and with the row fast path, the fast JSON renderer "
+        "and a sparse fieldset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--messages", type=int, default=5000, help="Number of messages to seed."
+        )
+        parser.add_argument(
+            "--page-size", type=int, default=200, help="Messages per page."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200, help="Timed runs per mode."
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = self.seed(options["messages"])
+            messages = get_user_related_messages(user).order_by(
+                *MailboxCursorPagination.ordering
+            )[: options["page_size"]]
+            full = MessageRowSerializer()
+            overview = MessageRowSerializer(fields=OVERVIEW_FIELDS)
+            modes = {
+                "instances + DRF": (
+                    lambda: list(messages.all()),
+                    lambda page: MessageSerializer(page, many=True).data,
+                    JSONRenderer(),
+                ),
+                "rows + DRF renderer": (
+                    lambda: self.fetch_rows(messages, full),
+                    full.to_representation,
+                    JSONRenderer(),
+                ),
+                "rows + fast renderer": (
+                    lambda: self.fetch_rows(messages, full),
+                    full.to_representation,
+                    FastJSONRenderer(),
+                ),
+                "rows + fast renderer, sparse": (
+                    lambda: self.fetch_rows(messages, overview),
+                    overview.to_representation,
+                    FastJSONRenderer(),
+                ),
+            }
+            for mode, (fetch, serialize, renderer) in modes.items():
+                self.benchmark_mode(mode, fetch, serialize, renderer, options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, message_count):
+        """
+        Seed messages between two users.
+
+        Returns:
+        - User: The receiver of the messages.
+        """
+        sender = User.objects.create_user(username="bench_sender")
+        receiver = User.objects.create_user(username="bench_receiver")
+        messages = Message.objects.bulk_create(
+            Message(
+                sender=sender,
+                receiver=receiver,
+                subject=f"Benchmark subject {i}",
+                content="Benchmark message body " * 10,
+                is_read=random.random() < 0.8,
+            )
+            for i in range(message_count)
+        )
+        MailboxEntry.objects.create_for_messages(messages)
+        return receiver
+
+    def fetch_rows(self, messages, serializer):
+        """
+        Read messages as rows, with the columns the list view reads for a page.
+        """
+        columns = {"id", "created_at", *serializer.columns}
+        return list(messages.values_list(*sorted(columns), named=True))
+
+    def benchmark_mode(self, mode, fetch, serialize, renderer, repeat):
+        """
+        Print the median time of each step of building a page in one mode.
+        """
+        timings = {"fetch": [], "serialize": [], "render": [], "total": []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            page = fetch()
+            fetched = time.perf_counter()
+            data = serialize(page)
+            serialized = time.perf_counter()
+            content = renderer.render(data)
+            rendered = time.perf_counter()
+            timings["fetch"].append((fetched - start) * 1000)
+            timings["serialize"].append((serialized - fetched) * 1000)
+            timings["render"].append((rendered - serialized) * 1000)
+            timings["total"].append((rendered - start) * 1000)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(mode))
+        self.stdout.write(
+            " ".join(
+                f"{step}={statistics.median(values):.2f}ms"
+                for step, values in timings.items()
+            )
+            + f" size={len(content)}B"
+        )
@@ -0,0 +1,203 @@
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from message.benchmark import percentile, seed_dataset
+
+# Scenario name: (database settings, or None to keep the previous ones, and whether
+# the write queue is enabled)
+SCENARIOS = {
+    "default SQLite": ({"ENGINE": "django.db.backends.sqlite3", "OPTIONS": {}}, False),
+    "production profile": (
+        {
+            "ENGINE": "messaging_system.db.sqlite3",
+            "OPTIONS": settings.SQLITE_PRODUCTION_OPTIONS,
+        },
+        False,
+    ),
+    "production profile + write queue": (None, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent writes (message creation and mark-read) and reads against "
+        "an SQLite database file with the default settings, the production SQLite "
+        "profile (SQLITE_PROFILE=production), and the profile plus the write queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--writers", type=int, default=8, help="Threads sending writes."
+        )
+        parser.add_argument(
+            "--readers", type=int, default=4, help="Threads listing messages."
+        )
+        parser.add_argument(
+            "--writes", type=int, default=50, help="Writes sent by each writer."
+        )
+        parser.add_argument(
+            "--messages", type=int, default=5000, help="Number of messages to seed."
+        )
+
+    def handle(self, *args, **options):
+        old_settings = dict(connections.settings["default"])
+        directory = tempfile.mkdtemp()
+        try:
+            template = os.path.join(directory, "template.sqlite3")
+            self.use_database(
+                {"ENGINE": "django.db.backends.sqlite3", "OPTIONS": {}}, template
+            )
+            call_command("migrate", verbosity=0)
+            rng = random.Random(0)
+            user_ids = seed_dataset(
+                options["writers"] + options["readers"], options["messages"], rng=rng
+            )
+            users = list(User.objects.filter(id__in=user_ids).order_by("id"))
+
+            database = None
+            for number, (name, (scenario_database, queue_enabled)) in enumerate(
+                SCENARIOS.items()
+            ):
+                database = scenario_database or database
+                path = os.path.join(directory, f"scenario{number}.sqlite3")
+                connections.close_all()
+                shutil.copy(template, path)
+                self.use_database(database, path)
+                with override_settings(MESSAGE_WRITE_QUEUE_ENABLED=queue_enabled):
+                    self.run_scenario(name, users, options)
+        finally:
+            connections.close_all()
+            connections.settings["default"].clear()
+            connections.settings["default"].update(old_settings)
+            shutil.rmtree(directory)
+
+    def use_database(self, database, path):
+        """
+        Point the default database alias at an SQLite file with the given settings.
+        """
+        connections.close_all()
+        connections.settings["default"].update({**database, "NAME": path})
+        try:
+            # Drop this thread's connection, so the next one uses the new settings
+            del connections["default"]
+        except AttributeError:
+            pass
+
+    def run_scenario(self, name, users, options):
+        """
+        Run the writer and reader threads and print their latency and errors.
+        """
+        writers = users[: options["writers"]]
+        readers = users[options["writers"] :]
+        results = {"write": [], "read": []}
+        errors = {"write": 0, "read": 0}
+        lock = threading.Lock()
+        writing = threading.Barrier(len(writers) + len(readers) + 1)
+        done = threading.Event()
+
+        def client_for(user):
+            return Client(
+                SERVER_NAME="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}",
+                raise_request_exception=False,
+            )
+
+        def send(kind, request, expected_status):
+            start = time.perf_counter()
+            response = request()
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                results[kind].append(elapsed)
+                if response.status_code != expected_status:
+                    errors[kind] += 1
+
+        def write(user):
+            client = client_for(user)
+            receiver = random.Random(user.id).choice(users)
+            writing.wait()
+            try:
+                for i in range(options["writes"]):
+                    if i % 2:
+                        send(
+                            "write",
+                            lambda: client.post(
+                                reverse("message:message-mark-read"),
+                                {"all": True},
+                                content_type="application/json",
+                            ),
+                            status.HTTP_200_OK,
+                        )
+                    else:
+                        send(
+                            "write",
+                            lambda: client.post(
+                                reverse("message:message-list-create"),
+                                {
+                                    "receiver": receiver.id,
+                                    "subject": "Benchmark",
+                                    "content": "Benchmark message body",
+                                },
+                                content_type="application/json",
+                            ),
+                            status.HTTP_201_CREATED,
+                        )
+            finally:
+                connections.close_all()
+
+        def read(user):
+            client = client_for(user)
+            writing.wait()
+            try:
+                while not done.is_set():
+                    send(
+                        "read",
+                        lambda: client.get(reverse("message:message-list-create")),
+                        status.HTTP_200_OK,
+                    )
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=write, args=(user,)) for user in writers]
+        reader_threads = [
+            threading.Thread(target=read, args=(user,)) for user in readers
+        ]
+        for thread in threads + reader_threads:
+            thread.start()
+        writing.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        for thread in reader_threads:
+            thread.join()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        for kind, timings in results.items():
+            if not timings:
+                continue
+            timings.sort()
+            succeeded = len(timings) - errors[kind]
+            self.stdout.write(
+                f"{kind + 's':<7} {succeeded / elapsed:8.1f} succeeded/s "
+                f"median={statistics.median(timings):.2f}ms "
+                f"p95={percentile(timings, 0.95):.2f}ms "
+                f"max={timings[-1]:.2f}ms "
+                f"errors={errors[kind]}"
+            )
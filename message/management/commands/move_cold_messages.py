@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from message.cold import move_messages_to_cold_storage
+from message.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Move messages older than MESSAGE_COLD_AFTER_DAYS from the hot messages table "
+        "to cold storage, oldest first, in small primary-key batches, each in its own "
+        "short transaction. The list and detail endpoints keep serving moved messages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            help="Move messages created more than this many days ago "
+            "(defaults to MESSAGE_COLD_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Messages moved per batch."
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches.",
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Stop after moving this many messages."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many messages would be moved.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["older_than_days"]
+        if days is None:
+            days = settings.MESSAGE_COLD_AFTER_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+        queryset = Message.objects.filter(created_at__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{queryset.count()} messages would be moved.")
+            return
+
+        # Ids grow with creation time, so walking them moves the oldest messages first
+        # and every cold message stays older than every hot one.
+        total = 0
+        limit = options["limit"]
+        while limit is None or total < limit:
+            batch_size = options["batch_size"]
+            if limit is not None:
+                batch_size = min(batch_size, limit - total)
+            pks = list(
+                queryset.order_by("pk").values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+
+            with transaction.atomic():
+                move_messages_to_cold_storage(pks)
+            total += len(pks)
+            self.stdout.write(f"Moved {total} messages (up to id {pks[-1]})")
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {total} messages."))
@@ -0,0 +1,208 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from message.cold import delete_cold_messages
+from message.models import ColdMessage, MailboxEntry, Message, MessageTombstone
+from message.utils import delete_messages
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete messages by age and/or participant, or the messages all their "
+        "participants deleted, in small primary-key batches, each in its own short "
+        "transaction, so live traffic is not blocked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            help="Delete messages created more than this many days ago.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Delete messages sent or received by this user id (repeatable).",
+        )
+        parser.add_argument(
+            "--expired-tombstones",
+            action="store_true",
+            help="Also delete sync tombstones older than MESSAGE_SYNC_TOMBSTONE_DAYS.",
+        )
+        parser.add_argument(
+            "--sweep-deleted",
+            action="store_true",
+            help="Also remove messages that every participant has deleted.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Messages deleted per batch."
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches.",
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Stop after deleting this many messages."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many messages would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        if options["expired_tombstones"]:
+            self.purge_tombstones(options)
+        if options["sweep_deleted"]:
+            self.sweep_deleted_messages(options)
+        if options["older_than_days"] is None and not options["user_ids"]:
+            if options["expired_tombstones"] or options["sweep_deleted"]:
+                return
+            raise CommandError(
+                "Provide --older-than-days, --user, --expired-tombstones "
+                "and/or --sweep-deleted."
+            )
+
+        # Old messages are mostly in cold storage, so both tiers are purged
+        tiers = [
+            (self.get_queryset(Message, options), delete_messages),
+            (self.get_queryset(ColdMessage, options), delete_cold_messages),
+        ]
+        if options["dry_run"]:
+            count = sum(queryset.count() for queryset, _ in tiers)
+            self.stdout.write(f"{count} messages would be deleted.")
+            return
+
+        total = 0
+        for queryset, delete in tiers:
+            total += self.purge(queryset, delete, options, total)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} messages."))
+
+    def purge(self, queryset, delete, options, total):
+        """
+        Delete the messages of one storage tier in primary-key batches.
+
+        Parameters:
+        - queryset (QuerySet): The messages to delete.
+        - delete (callable): Deletes a batch, e.g. `delete_messages`.
+        - options (dict): The command options.
+        - total (int): The messages already deleted, counted towards `--limit`.
+
+        Returns:
+        - int: The number of messages deleted.
+        """
+        deleted = 0
+        last_pk = 0
+        limit = options["limit"]
+        while limit is None or total + deleted < limit:
+            batch_size = options["batch_size"]
+            if limit is not None:
+                batch_size = min(batch_size, limit - total - deleted)
+            pks = list(
+                queryset.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+
+            with transaction.atomic():
+                deleted += delete(queryset.filter(pk__in=pks))
+            last_pk = pks[-1]
+            self.stdout.write(
+                f"Deleted {total + deleted} messages (up to id {last_pk})"
+            )
+            time.sleep(options["sleep"])
+        return deleted
+
+    def get_queryset(self, model, options):
+        """
+        Build the queryset of messages (hot or cold) selected by the command options.
+        """
+        queryset = model.objects.all()
+        if options["older_than_days"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+            queryset = queryset.filter(created_at__lt=cutoff)
+        if options["user_ids"]:
+            queryset = queryset.filter(
+                models.Q(sender_id__in=options["user_ids"])
+                | models.Q(receiver_id__in=options["user_ids"])
+            )
+        return queryset
+
+    def purge_tombstones(self, options):
+        """
+        Delete sync tombstones past their retention, in primary-key batches.
+        """
+        cutoff = timezone.now() - timedelta(days=settings.MESSAGE_SYNC_TOMBSTONE_DAYS)
+        queryset = MessageTombstone.objects.filter(deleted_at__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{queryset.count()} tombstones would be deleted.")
+            return
+
+        total = 0
+        while True:
+            pks = list(
+                queryset.order_by("pk").values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not pks:
+                break
+            total += MessageTombstone.objects.filter(pk__in=pks).delete()[0]
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} tombstones."))
+
+    def sweep_deleted_messages(self, options):
+        """
+        Delete the messages left in no participant's mailbox, in primary-key batches.
+
+        Candidates are read from the index of deleted mailbox entries; a candidate is
+        only removed if none of its entries is still live.
+        """
+        deleted_entries = MailboxEntry.objects.filter(is_deleted=True)
+        if options["dry_run"]:
+            count = (
+                Message.objects.filter(id__in=deleted_entries.values("message_id"))
+                .exclude(mailbox_entries__is_deleted=False)
+                .count()
+            )
+            self.stdout.write(f"{count} deleted messages would be swept.")
+            return
+
+        total = 0
+        last_id = 0
+        while True:
+            candidates = list(
+                deleted_entries.filter(message_id__gt=last_id)
+                .order_by("message_id")
+                .values_list("message_id", flat=True)
+                .distinct()[: options["batch_size"]]
+            )
+            if not candidates:
+                break
+
+            with transaction.atomic():
+                ids = list(
+                    Message.objects.filter(id__in=candidates)
+                    .exclude(mailbox_entries__is_deleted=False)
+                    .select_for_update()
+                    .values_list("id", flat=True)
+                )
+                Message.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            last_id = candidates[-1]
+            time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Swept {total} deleted messages."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from message.stats import rebuild_mailbox_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user mailbox counters from the messages table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild the counters of this user id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_mailbox_stats(options["user_ids"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt mailbox stats for {count} users.")
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from message.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the full-text search index over messages and re-index every "
+        "message, e.g. after a migration rebuilt the SQLite messages table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to rebuild the index on.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        install_search_index(connection, rebuild=True)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt the search index on {connection.vendor}.")
+        )
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("message", "0002_rename_messaging_message"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["receiver", "is_read", "created_at"],
+                name="message_receiver_read_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "created_at"], name="message_sender_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:11
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_mailbox_stats(apps, schema_editor):
+    # Counts the messages as they are at this migration, so later changes to the
+    # app's own counting code cannot change what it does
+    Message = apps.get_model("message", "Message")
+    MailboxStats = apps.get_model("message", "MailboxStats")
+    messages = Message.objects.all()
+
+    counts = defaultdict(Counter)
+    for user_id, count in messages.values_list("sender").annotate(c=models.Count("id")):
+        counts[user_id]["sent_count"] += count
+        counts[user_id]["total_count"] += count
+    for user_id, count in (
+        messages.exclude(sender=models.F("receiver"))
+        .values_list("receiver")
+        .annotate(c=models.Count("id"))
+    ):
+        counts[user_id]["total_count"] += count
+    for user_id, count in (
+        messages.filter(is_read=False)
+        .values_list("receiver")
+        .annotate(c=models.Count("id"))
+    ):
+        counts[user_id]["unread_count"] += count
+
+    MailboxStats.objects.bulk_create(
+        (MailboxStats(user_id=user_id, **values) for user_id, values in counts.items()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("message", "0003_message_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailboxStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="mailbox_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("unread_count", models.IntegerField(default=0)),
+                ("total_count", models.IntegerField(default=0)),
+                ("sent_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_mailbox_stats, migrations.RunPython.noop),
+    ]
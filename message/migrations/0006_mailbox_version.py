@@ -0,0 +1,22 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("message", "0005_message_sync"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailboxstats",
+            name="last_modified",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="mailboxstats",
+            name="version",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
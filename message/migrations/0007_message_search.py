@@ -0,0 +1,71 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:42
+
+from django.db import migrations
+
+# The full-text index as created by this migration; `message.search` installs the
+# current version of it, e.g. from `rebuild_search_index`
+CREATE_SEARCH_INDEX = {
+    "sqlite": [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+            subject, content, content='message_message', content_rowid='id'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS message_search_insert
+        AFTER INSERT ON message_message BEGIN
+            INSERT INTO message_search(rowid, subject, content)
+            VALUES (new.id, new.subject, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS message_search_delete
+        AFTER DELETE ON message_message BEGIN
+            INSERT INTO message_search(message_search, rowid, subject, content)
+            VALUES ('delete', old.id, old.subject, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS message_search_update
+        AFTER UPDATE OF subject, content ON message_message BEGIN
+            INSERT INTO message_search(message_search, rowid, subject, content)
+            VALUES ('delete', old.id, old.subject, old.content);
+            INSERT INTO message_search(rowid, subject, content)
+            VALUES (new.id, new.subject, new.content);
+        END""",
+        "INSERT INTO message_search(message_search) VALUES ('rebuild')",
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS message_search_idx ON message_message "
+        "USING gin ((to_tsvector('english', "
+        "coalesce(subject, '') || ' ' || coalesce(content, ''))))",
+    ],
+}
+
+DROP_SEARCH_INDEX = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS message_search_insert",
+        "DROP TRIGGER IF EXISTS message_search_delete",
+        "DROP TRIGGER IF EXISTS message_search_update",
+        "DROP TABLE IF EXISTS message_search",
+    ],
+    "postgresql": ["DROP INDEX IF EXISTS message_search_idx"],
+}
+
+
+def run_statements(statements):
+    """
+    Return a migration function running the statements for the database's vendor;
+    other databases get no index.
+    """
+
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("message", "0006_mailbox_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements(CREATE_SEARCH_INDEX), run_statements(DROP_SEARCH_INDEX)
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def create_mailbox_entries(apps, schema_editor):
+    Message = apps.get_model("message", "Message")
+    MailboxEntry = apps.get_model("message", "MailboxEntry")
+    last_id = 0
+    while True:
+        rows = list(
+            Message.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "sender_id", "receiver_id", "created_at")[
+                :BACKFILL_BATCH_SIZE
+            ]
+        )
+        if not rows:
+            break
+        MailboxEntry.objects.bulk_create(
+            MailboxEntry(user_id=user_id, message_id=message_id, created_at=created_at)
+            for message_id, sender_id, receiver_id, created_at in rows
+            for user_id in {sender_id, receiver_id}
+        )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("message", "0008_message_threads"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailboxEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("is_archived", models.BooleanField(default=False)),
+                ("is_deleted", models.BooleanField(default=False)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "message",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mailbox_entries",
+                        to="message.message",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mailbox_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "mailbox entries",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("is_deleted", False)),
+                        fields=["user", "created_at", "message"],
+                        name="mailbox_entry_user_live_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("is_deleted", True)),
+                        fields=["message"],
+                        name="mailbox_entry_deleted_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="mailboxentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "message"), name="mailbox_entry_unique"
+            ),
+        ),
+        migrations.RunPython(create_mailbox_entries, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class Message(models.Model):
@@ -12,4 +13,275 @@ class Message(models.Model):
     subject = models.CharField(max_length=100)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
+    thread = models.ForeignKey(
+        "Thread",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="messages",
+        # Covered by message_thread_created_idx
+        db_index=False,
+    )
+
+    class Meta:
+        indexes = [
+            # Inbox and unread filter: receiver=user [AND is_read=...] ORDER BY created_at
+            models.Index(
+                fields=["receiver", "is_read", "created_at"],
+                name="message_receiver_read_idx",
+            ),
+            # Outbox: sender=user ORDER BY created_at
+            models.Index(
+                fields=["sender", "created_at"], name="message_sender_created_idx"
+            ),
+            # Delta sync: changes since a point in time
+            models.Index(
+                fields=["receiver", "updated_at"], name="message_receiver_updated_idx"
+            ),
+            models.Index(
+                fields=["sender", "updated_at"], name="message_sender_updated_idx"
+            ),
+            # Conversation view and thread summaries: thread=... ORDER BY created_at
+            models.Index(
+                fields=["thread", "created_at"], name="message_thread_created_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the message, placing a new message in its participants' mailboxes.
+        """
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            MailboxEntry.objects.create_for_messages([self])
+
+
+class MailboxEntryManager(models.Manager):
+    def create_for_messages(self, messages):
+        """
+        Create the mailbox entries of saved messages: one for the sender and one for
+        the receiver (a single one if they are the same user).
+
+        Parameters:
+        - messages (iterable): Saved `Message` instances.
+        """
+        return self.bulk_create(
+            [
+                MailboxEntry(
+                    user_id=user_id,
+                    message_id=message.id,
+                    created_at=message.created_at,
+                )
+                for message in messages
+                for user_id in {message.sender_id, message.receiver_id}
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class MailboxEntry(models.Model):
+    """
+    A message as it appears in one participant's mailbox, with that participant's
+    own state.
+
+    Deleting a message only flags the deleting user's entry; the message row is
+    removed once no participant has a live entry left (see `purge_messages
+    --sweep-deleted`). The read state stays on `Message`, since only the receiver has
+    one.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="mailbox_entries"
+    )
+    message = models.ForeignKey(
+        Message, on_delete=models.CASCADE, related_name="mailbox_entries"
+    )
+    # Copy of the message's creation time, so a mailbox is listed from this table's index
+    created_at = models.DateTimeField()
+    is_archived = models.BooleanField(default=False)
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = MailboxEntryManager()
+
+    class Meta:
+        verbose_name_plural = "mailbox entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "message"], name="mailbox_entry_unique"
+            ),
+        ]
+        indexes = [
+            # Mailbox list: user=... AND NOT is_deleted ORDER BY created_at, message
+            models.Index(
+                fields=["user", "created_at", "message"],
+                condition=models.Q(is_deleted=False),
+                name="mailbox_entry_user_live_idx",
+            ),
+            # Sweep of messages every participant deleted
+            models.Index(
+                fields=["message"],
+                condition=models.Q(is_deleted=True),
+                name="mailbox_entry_deleted_idx",
+            ),
+        ]
+
+
+class MailboxStats(models.Model):
+    """
+    Denormalized per-user message counters, kept in step with every message write so
+    that badge counts can be served without counting rows.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="mailbox_stats",
+    )
+    unread_count = models.IntegerField(default=0)
+    total_count = models.IntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    # Change marker of the whole mailbox: a fresh nanosecond timestamp on every write,
+    # used to derive ETag/Last-Modified of the message list without reading messages.
+    version = models.BigIntegerField(default=0)
+    last_modified = models.DateTimeField(null=True)
+
+
+class MessageTombstone(models.Model):
+    """
+    Record of a message that left a user's mailbox, so that delta sync can tell
+    clients which messages to drop.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="message_tombstones"
+    )
+    message_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "deleted_at"], name="tombstone_user_deleted_idx"
+            ),
+        ]
+
+
+class Thread(models.Model):
+    """
+    Conversation between two users; every message exchanged between them belongs to it.
+
+    `user_a` is always the participant with the lower id, so each pair of users has
+    exactly one thread.
+    """
+
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_a", "user_b"], name="thread_participants_unique"
+            ),
+        ]
+
+
+class ThreadParticipant(models.Model):
+    """
+    A user's view of a thread, carrying the denormalized summary shown in their
+    thread list, so that listing threads never reads messages.
+    """
+
+    thread = models.ForeignKey(
+        Thread, on_delete=models.CASCADE, related_name="participants"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="thread_participations"
+    )
+    other_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message_id = models.BigIntegerField(null=True)
+    last_snippet = models.CharField(max_length=100, blank=True)
+    last_at = models.DateTimeField(null=True)
+    unread_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["thread", "user"], name="thread_participant_unique"
+            ),
+        ]
+        indexes = [
+            # Thread list: user=... ORDER BY last_at DESC
+            models.Index(
+                fields=["user", "last_at"], name="thread_participant_last_idx"
+            ),
+        ]
+
+
+class ColdMessage(models.Model):
+    """
+    A message moved out of `Message` into cold storage once it got old, keeping its
+    id and contents, so that the hot messages table and its indexes stay small.
+
+    Cold messages are read through by the list and detail endpoints and can be read
+    and deleted, but no longer edited. See `move_cold_messages`.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    receiver = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    subject = models.CharField(max_length=100)
+    content = models.TextField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+    thread = models.ForeignKey(
+        Thread,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        db_index=False,
+    )
+
+
+class ColdMailboxEntry(models.Model):
+    """
+    A cold message as it appears in one participant's mailbox, see `MailboxEntry`.
+
+    Only live entries are moved to cold storage, and deleting a cold message removes
+    the user's entry right away.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="cold_mailbox_entries"
+    )
+    message = models.ForeignKey(
+        ColdMessage, on_delete=models.CASCADE, related_name="mailbox_entries"
+    )
+    created_at = models.DateTimeField()
+    is_archived = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = "cold mailbox entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "message"], name="cold_mailbox_entry_unique"
+            ),
+        ]
+        indexes = [
+            # Mailbox list read-through: user=... ORDER BY created_at, message
+            models.Index(
+                fields=["user", "created_at", "message"],
+                name="cold_mailbox_entry_user_idx",
+            ),
+        ]
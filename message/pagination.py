@@ -0,0 +1,294 @@
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class MessageCursorPagination(CursorPagination):
+    """
+    Keyset pagination over messages ordered newest first by `(created_at, id)`.
+
+    Unlike DRF's stock cursor pagination, the cursor position carries both the
+    timestamp and the primary key of the boundary row, so every page is fetched
+    with a single `WHERE (created_at, id) < (...) ORDER BY ... LIMIT n` query and
+    never needs an offset, no matter how deep into the mailbox the client is.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request):
+        """
+        Return the requested page size, capped by `MESSAGE_MAX_PAGE_SIZE`.
+        """
+        self.page_size = settings.MESSAGE_PAGE_SIZE
+        self.max_page_size = settings.MESSAGE_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return a single page of messages positioned by the request cursor.
+
+        Parameters:
+        - queryset (QuerySet): The messages to paginate.
+        - request (Request): The current request.
+        - view (APIView): The view requesting pagination.
+
+        Returns:
+        - list: The messages on the requested page, newest first.
+        """
+        position, reverse = self.start_page(request, view)
+        # Fetch one extra row to find out whether there is another page.
+        results = self.get_rows(queryset, position, reverse, self.page_size + 1)
+        return self.end_page(results, position, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of `paginate_queryset`, reading the rows with the async ORM.
+        """
+        position, reverse = self.start_page(request, view)
+        results = await self.aget_rows(queryset, position, reverse, self.page_size + 1)
+        return self.end_page(results, position, reverse)
+
+    def start_page(self, request, view):
+        """
+        Read the page size and cursor of the request.
+
+        Returns:
+        - tuple: The decoded cursor position (None on the first page), and whether
+          the cursor walks backwards.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = None
+        if self.cursor is not None:
+            position = self.decode_position(self.cursor.position)
+        return position, reverse
+
+    def end_page(self, results, position, reverse):
+        """
+        Keep one page of the fetched rows and work out the next and previous links.
+        """
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_rows(self, queryset, position, reverse, limit):
+        """
+        Return up to `limit` rows following the position, in walking order.
+        """
+        return list(self.get_page_queryset(queryset, position, reverse)[:limit])
+
+    async def aget_rows(self, queryset, position, reverse, limit):
+        """
+        Async version of `get_rows`.
+        """
+        queryset = self.get_page_queryset(queryset, position, reverse)
+        return [row async for row in queryset[:limit]]
+
+    def get_page_queryset(self, queryset, position, reverse):
+        """
+        Restrict the queryset to the rows following the position, in walking order.
+        """
+        queryset = self.filter_queryset_by_position(queryset, position, reverse)
+        if reverse:
+            return queryset.order_by(*self.get_reversed_ordering())
+        return queryset.order_by(*self.ordering)
+
+    def get_reversed_ordering(self):
+        """
+        Return `ordering` with every direction flipped, for walking backwards.
+        """
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+
+    def filter_queryset_by_position(self, queryset, position, reverse):
+        """
+        Restrict the queryset to rows strictly after (or before) the cursor position.
+
+        The position is the value of the first `ordering` field and the id, which is
+        ordered in the same direction by the second field as a tie-breaker.
+        """
+        if position is None:
+            return queryset
+
+        value, pk = position
+        field, tie_breaker = (field.lstrip("-") for field in self.ordering)
+        descending = self.ordering[0].startswith("-")
+        lookup = "gt" if descending == reverse else "lt"
+        return queryset.filter(
+            models.Q(**{f"{field}__{lookup}": value})
+            | models.Q(**{field: value, f"{tie_breaker}__{lookup}": pk})
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(
+                offset=0, reverse=False, position=self.encode_position(self.page[-1])
+            )
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0]))
+        )
+
+    def encode_position(self, instance):
+        """
+        Encode the `(timestamp, id)` keyset position of a row, e.g. `(created_at, id)`.
+        """
+        value = getattr(instance, self.ordering[0].lstrip("-"))
+        return f"{value.isoformat()}|{instance.id}"
+
+    def decode_position(self, position):
+        """
+        Decode a keyset position produced by `encode_position`.
+
+        Raises:
+        - NotFound: If the position is missing or malformed.
+        """
+        try:
+            created_at, pk = position.split("|")
+            created_at = datetime.fromisoformat(created_at)
+            pk = int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if timezone.is_naive(created_at):
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+class MailboxCursorPagination(MessageCursorPagination):
+    """
+    Keyset pagination over `get_user_related_messages`, newest first.
+
+    Pages are ordered by the copies of `(created_at, id)` on the user's mailbox
+    entries, so the database walks `mailbox_entry_user_live_idx` in order and stops
+    after one page instead of sorting the whole mailbox.
+    """
+
+    ordering = ("-mailbox_created_at", "-mailbox_message_id")
+
+    def start_page(self, request, view):
+        """
+        Read the page size and cursor of the request, and the view's cold messages
+        (`get_cold_queryset`) to read through to when the page reaches past the hot
+        ones.
+        """
+        self.cold_queryset = None
+        if view is not None and hasattr(view, "get_cold_queryset"):
+            self.cold_queryset = view.get_cold_queryset()
+        return super().start_page(request, view)
+
+    def get_rows(self, queryset, position, reverse, limit):
+        """
+        Return up to `limit` rows following the position, from the hot messages and
+        then the cold ones (the other way round when walking backwards).
+
+        Messages are moved to cold storage oldest first, so every cold message is
+        older than every hot one and the two tiers never need to be merged; the cold
+        table is only queried once the hot one runs out of rows.
+        """
+        rows = []
+        for tier in self.get_tiers(queryset, reverse):
+            rows += super().get_rows(tier, position, reverse, limit - len(rows))
+            if len(rows) == limit:
+                break
+        return rows
+
+    async def aget_rows(self, queryset, position, reverse, limit):
+        """
+        Async version of `get_rows`.
+        """
+        rows = []
+        for tier in self.get_tiers(queryset, reverse):
+            rows += await super().aget_rows(tier, position, reverse, limit - len(rows))
+            if len(rows) == limit:
+                break
+        return rows
+
+    def get_tiers(self, queryset, reverse):
+        """
+        Return the hot and cold querysets in the order a page walks through them.
+        """
+        if self.cold_queryset is None:
+            return [queryset]
+        tiers = [queryset, self.cold_queryset]
+        if reverse:
+            tiers.reverse()
+        return tiers
+
+    def encode_position(self, instance):
+        """
+        Encode the `(created_at, id)` keyset position of a message; the mailbox
+        entry holds the same values.
+        """
+        return f"{instance.created_at.isoformat()}|{instance.id}"
+
+
+class ThreadCursorPagination(MessageCursorPagination):
+    """
+    Keyset pagination over a user's threads, most recently active first.
+    """
+
+    ordering = ("-last_at", "-id")
+
+
+class MessageSearchPagination(MessageCursorPagination):
+    """
+    Keyset pagination over search results, best match first by `(search_rank, id)`.
+
+    Ranks depend on the whole mailbox, so results shift slightly if messages are
+    written between two pages.
+    """
+
+    ordering = ("search_rank", "id")
+
+    def encode_position(self, instance):
+        """
+        Encode the `(search_rank, id)` keyset position of a search result.
+        """
+        return f"{instance.search_rank!r}|{instance.id}"
+
+    def decode_position(self, position):
+        """
+        Decode a keyset position produced by `encode_position`.
+
+        Raises:
+        - NotFound: If the position is missing or malformed.
+        """
+        try:
+            rank, pk = position.split("|")
+            rank = float(rank)
+            pk = int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not math.isfinite(rank):
+            raise NotFound(self.invalid_cursor_message)
+        return rank, pk
@@ -0,0 +1,177 @@
+import re
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+from .models import Message
+
+SEARCH_TABLE = "message_search"
+SEARCH_CONFIG = "english"
+
+
+def postgres_search_vector(table=""):
+    """
+    Return the document expression indexed on PostgreSQL. Queries must repeat it for
+    the planner to use the index; `table` qualifies the columns.
+    """
+    prefix = f"{table}." if table else ""
+    return (
+        f"to_tsvector('{SEARCH_CONFIG}', "
+        f"coalesce({prefix}subject, '') || ' ' || coalesce({prefix}content, ''))"
+    )
+
+
+SQLITE_SEARCH_INDEX = [
+    # External content table: the index stores only the terms, the text stays in
+    # the messages table.
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        subject, content, content='message_message', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON message_message BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, subject, content)
+        VALUES (new.id, new.subject, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete
+    AFTER DELETE ON message_message BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, subject, content)
+        VALUES ('delete', old.id, old.subject, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF subject, content ON message_message BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, subject, content)
+        VALUES ('delete', old.id, old.subject, old.content);
+        INSERT INTO {SEARCH_TABLE}(rowid, subject, content)
+        VALUES (new.id, new.subject, new.content);
+    END""",
+]
+
+POSTGRES_SEARCH_INDEX = [
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_idx ON message_message "
+    f"USING gin (({postgres_search_vector()}))",
+]
+
+
+def install_search_index(connection, rebuild=False):
+    """
+    Create the full-text index over message subjects and contents.
+
+    On SQLite this is an FTS5 table kept in sync by triggers, so every write path
+    (including bulk inserts, queryset updates and deletes) updates it. On PostgreSQL
+    it is a GIN expression index, maintained by the database itself. Other backends
+    get no index and fall back to unindexed substring matching.
+
+    SQLite drops the triggers whenever Django rebuilds the messages table during a
+    migration; run `python manage.py rebuild_search_index` afterwards to restore them.
+
+    Parameters:
+    - connection: The database connection to create the index on.
+    - rebuild (bool): Whether to re-read every message into the SQLite index.
+    """
+    if connection.vendor == "sqlite":
+        statements = list(SQLITE_SEARCH_INDEX)
+        if rebuild:
+            statements.append(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"
+            )
+    elif connection.vendor == "postgresql":
+        statements = list(POSTGRES_SEARCH_INDEX)
+        if rebuild:
+            statements.append(f"REINDEX INDEX {SEARCH_TABLE}_idx")
+    else:
+        return
+
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_index(connection):
+    """
+    Remove the full-text index created by `install_search_index`.
+    """
+    if connection.vendor == "sqlite":
+        statements = [
+            f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert",
+            f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+            f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+            f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+        ]
+    elif connection.vendor == "postgresql":
+        statements = [f"DROP INDEX IF EXISTS {SEARCH_TABLE}_idx"]
+    else:
+        return
+
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def search_terms(query):
+    """
+    Split a search query into words, dropping punctuation and query operators.
+    """
+    return re.findall(r"\w+", query)
+
+
+def search_messages(queryset, query):
+    """
+    Restrict a message queryset to the messages matching a full-text query.
+
+    Every word of the query must appear in the subject or the content. Matches are
+    annotated with `search_rank`, where lower values are better matches.
+
+    Parameters:
+    - queryset (QuerySet): The messages to search, e.g. `get_user_related_messages`.
+    - query (str): The user's search query.
+
+    Returns:
+    - QuerySet: The matching messages, annotated with `search_rank`.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=models.Value(0.0)).none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        # Quoting every word makes FTS5 treat it as a literal, not as syntax
+        match = " ".join(f'"{term}"' for term in terms)
+        # Join the index once, so the full-text query runs a single time and every
+        # match carries its score
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f"{SEARCH_TABLE}.rowid = {Message._meta.db_table}.id",
+                f"{SEARCH_TABLE} MATCH %s",
+            ],
+            params=[match],
+        ).annotate(
+            # FTS5's `rank` is the bm25 score, negative and lowest for the best match
+            search_rank=RawSQL(
+                f"{SEARCH_TABLE}.rank", [], output_field=models.FloatField()
+            )
+        )
+
+    if vendor == "postgresql":
+        vector = postgres_search_vector(Message._meta.db_table)
+        tsquery = f"plainto_tsquery('{SEARCH_CONFIG}', %s)"
+        query = " ".join(terms)
+        return queryset.filter(
+            RawSQL(
+                f"{vector} @@ {tsquery}",
+                [query],
+                output_field=models.BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"-ts_rank({vector}, {tsquery})",
+                [query],
+                output_field=models.FloatField(),
+            )
+        )
+
+    for term in terms:
+        queryset = queryset.filter(
+            models.Q(subject__icontains=term) | models.Q(content__icontains=term)
+        )
+    return queryset.annotate(search_rank=models.Value(0.0))
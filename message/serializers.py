@@ -1,9 +1,26 @@
+import copy
+from operator import attrgetter
+
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import Message
+from .models import MailboxStats, Message, ThreadParticipant
 
 
 class MessageSerializer(serializers.ModelSerializer):
+    """
+    Representation of a message.
+
+    `fields` restricts the representation to a subset of the fields (a sparse
+    fieldset), e.g. `MessageSerializer(message, fields=["id", "subject"])`.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Message
         fields = [
@@ -16,3 +33,186 @@ class MessageSerializer(serializers.ModelSerializer):
             "is_read",
         ]
         read_only_fields = ["sender", "is_read"]
+
+
+class MessageRowSerializer:
+    """
+    Fast path of `MessageSerializer` for listing many messages.
+
+    Serializes messages read as `values_list(..., named=True)` rows of `columns`
+    instead of model instances, so a page of messages skips building model instances
+    and running every DRF field per message. The output is the same as
+    `MessageSerializer(messages, many=True, fields=fields).data`: the sender and
+    receiver are represented by the ids read from their `_id` columns, and only the
+    date fields go through their DRF field for timezone conversion and formatting.
+
+    Parameters:
+    - fields (list): The sparse fieldset to serialize; all fields if omitted.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = []
+        for name, field in MessageSerializer(fields=fields).fields.items():
+            column = Message._meta.get_field(field.source).attname
+            if not isinstance(field, serializers.DateTimeField):
+                field = None
+            self.fields.append((name, column, field))
+
+    @property
+    def columns(self):
+        """
+        The columns to read for the serialized fields.
+        """
+        return [column for _, column, _ in self.fields]
+
+    def to_representation(self, rows):
+        """
+        Serialize message rows.
+
+        Parameters:
+        - rows (list): Named rows holding at least `columns`.
+
+        Returns:
+        - list: The serialized messages, one dict per row.
+        """
+        getters = []
+        for name, column, field in self.fields:
+            convert = None
+            if field is not None:
+                # Look the current timezone up once per page instead of per value
+                field = copy.deepcopy(field)
+                field.timezone = field.default_timezone()
+                convert = field.to_representation
+            getters.append((name, attrgetter(column), convert))
+        data = []
+        for row in rows:
+            item = {}
+            for name, getter, convert in getters:
+                value = getter(row)
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+class MailboxStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MailboxStats
+        fields = ["unread_count", "total_count", "sent_count"]
+
+
+class ThreadSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="thread_id", read_only=True)
+    last_message = serializers.IntegerField(source="last_message_id", read_only=True)
+
+    class Meta:
+        model = ThreadParticipant
+        fields = [
+            "id",
+            "other_user",
+            "last_message",
+            "last_snippet",
+            "last_at",
+            "unread_count",
+        ]
+        read_only_fields = fields
+
+
+class BulkMessageItemSerializer(serializers.Serializer):
+    receiver = serializers.IntegerField()
+    subject = serializers.CharField(max_length=100)
+    content = serializers.CharField()
+
+
+class MessageBulkCreateSerializer(serializers.Serializer):
+    """
+    Request body of the bulk send endpoint.
+
+    `receivers` broadcasts one `subject`/`content` to many users; `messages` carries
+    individual messages. Both may be combined in a single request. Items of `messages`
+    are validated one by one so that a bad item doesn't reject the whole request.
+    """
+
+    receivers = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    subject = serializers.CharField(max_length=100, required=False)
+    content = serializers.CharField(required=False)
+    messages = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list
+    )
+
+    def validate(self, attrs):
+        if not attrs["receivers"] and not attrs["messages"]:
+            raise serializers.ValidationError(
+                "Provide at least one of `receivers` or `messages`."
+            )
+        if attrs["receivers"] and ("subject" not in attrs or "content" not in attrs):
+            raise serializers.ValidationError(
+                "`subject` and `content` are required when sending to `receivers`."
+            )
+        item_count = len(attrs["receivers"]) + len(attrs["messages"])
+        if item_count > settings.MESSAGE_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"A bulk request may contain at most {settings.MESSAGE_BULK_MAX_ITEMS} messages."
+            )
+        return attrs
+
+
+class MessageMarkReadSerializer(serializers.Serializer):
+    """
+    Request body of the bulk mark-as-read endpoint.
+
+    Exactly one selector must be given: `ids`, `before` (messages created before a
+    timestamp) or `all`. `is_read` is the state to set and defaults to read.
+    """
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    before = serializers.DateTimeField(required=False)
+    all = serializers.BooleanField(required=False, default=False)
+    is_read = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, attrs):
+        selectors = [
+            attrs.get("ids") is not None,
+            attrs.get("before") is not None,
+            attrs["all"],
+        ]
+        if sum(selectors) != 1:
+            raise serializers.ValidationError(
+                "Provide exactly one of `ids`, `before` or `all`."
+            )
+        if len(attrs.get("ids") or []) > settings.MESSAGE_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {settings.MESSAGE_BULK_MAX_ITEMS} ids may be given."
+            )
+        return attrs
+
+
+class MessageArchiveSerializer(serializers.Serializer):
+    """
+    Request body of the archive endpoint: the messages to move and whether to
+    archive (the default) or unarchive them.
+    """
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    archived = serializers.BooleanField(required=False, default=True)
+
+    def validate_ids(self, value):
+        if len(value) > settings.MESSAGE_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {settings.MESSAGE_BULK_MAX_ITEMS} ids may be given."
+            )
+        return value
+
+
+class MessageBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, value):
+        if len(value) > settings.MESSAGE_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {settings.MESSAGE_BULK_MAX_ITEMS} ids may be given."
+            )
+        return value
@@ -0,0 +1,242 @@
+import time
+from collections import Counter, defaultdict
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from messaging_system.db.routers import REPLICA_USER_HINT
+
+from .models import ColdMailboxEntry, MailboxEntry, MailboxStats
+
+STATS_UPDATE_BATCH_SIZE = 500
+
+
+def get_mailbox_stats(user):
+    """
+    Retrieve the mailbox counters of the specified user.
+
+    The counters are a mailbox read (see `REPLICA_USER_HINT`), so in GET requests
+    they come from the same database as the user's messages, and the change marker
+    never claims a newer mailbox than the page read after it.
+
+    Parameters:
+    - user (User): The user whose counters to retrieve.
+
+    Returns:
+    - MailboxStats: The user's counters; an unsaved all-zero instance if the user has
+      never sent or received a message.
+    """
+    return mailbox_stats(user).first() or MailboxStats(user_id=user.id)
+
+
+async def aget_mailbox_stats(user):
+    """
+    Async version of `get_mailbox_stats`.
+    """
+    return await mailbox_stats(user).afirst() or MailboxStats(user_id=user.id)
+
+
+def mailbox_stats(user):
+    """
+    Return the queryset of the user's counter row, read like the user's messages.
+    """
+    return MailboxStats.objects.db_manager(hints={REPLICA_USER_HINT: user.id}).filter(
+        user_id=user.id
+    )
+
+
+def entry_stats_deltas(rows, sign):
+    """
+    Compute the counter changes caused by messages entering (`sign=1`) or leaving
+    (`sign=-1`) their participants' mailboxes.
+
+    Parameters:
+    - rows (iterable): `(user_id, sender_id, receiver_id, is_read)` tuples, one per
+      mailbox entry.
+    - sign (int): `1` for added entries, `-1` for removed ones.
+
+    Returns:
+    - dict: Counter deltas keyed by user id.
+    """
+    deltas = defaultdict(Counter)
+    for user_id, sender_id, receiver_id, is_read in rows:
+        deltas[user_id]["total_count"] += sign
+        if user_id == sender_id:
+            deltas[user_id]["sent_count"] += sign
+        if user_id == receiver_id and not is_read:
+            deltas[user_id]["unread_count"] += sign
+    return deltas
+
+
+def apply_stats_deltas(deltas):
+    """
+    Apply counter deltas with atomic `F()` updates.
+
+    Users that share the same delta are updated with a single UPDATE statement.
+    Counter rows are created on first use.
+
+    Parameters:
+    - deltas (dict): Counter deltas keyed by user id, as built by `entry_stats_deltas`.
+    """
+    groups = defaultdict(list)
+    for user_id, delta in deltas.items():
+        key = tuple(sorted((field, value) for field, value in delta.items() if value))
+        if key:
+            groups[key].append(user_id)
+
+    for key, user_ids in groups.items():
+        updates = {field: models.F(field) + value for field, value in key}
+        for start in range(0, len(user_ids), STATS_UPDATE_BATCH_SIZE):
+            batch = user_ids[start : start + STATS_UPDATE_BATCH_SIZE]
+            updated = MailboxStats.objects.filter(user_id__in=batch).update(**updates)
+            if updated == len(batch):
+                continue
+
+            # Some users have no counter row yet: create it, then apply their delta.
+            existing = set(
+                MailboxStats.objects.filter(user_id__in=batch).values_list(
+                    "user_id", flat=True
+                )
+            )
+            missing = [user_id for user_id in batch if user_id not in existing]
+            MailboxStats.objects.bulk_create(
+                [MailboxStats(user_id=user_id) for user_id in missing],
+                ignore_conflicts=True,
+            )
+            MailboxStats.objects.filter(user_id__in=missing).update(**updates)
+
+
+def touch_mailboxes(user_ids):
+    """
+    Stamp the mailboxes of the given users as changed now.
+
+    Parameters:
+    - user_ids (iterable): The users whose mailboxes changed.
+    """
+    user_ids = list(set(user_ids))
+    marker = {"version": time.time_ns(), "last_modified": timezone.now()}
+    for start in range(0, len(user_ids), STATS_UPDATE_BATCH_SIZE):
+        batch = user_ids[start : start + STATS_UPDATE_BATCH_SIZE]
+        stats = MailboxStats.objects.filter(user_id__in=batch)
+        if stats.update(**marker) < len(batch):
+            MailboxStats.objects.bulk_create(
+                [MailboxStats(user_id=user_id, **marker) for user_id in batch],
+                ignore_conflicts=True,
+            )
+            # A row created concurrently without the marker may have won the insert
+            stats.update(**marker)
+
+
+def record_entries_created(rows):
+    """
+    Update the counters after messages were added to mailboxes.
+
+    Parameters:
+    - rows (iterable): `(user_id, sender_id, receiver_id, is_read)` tuples of the
+      new mailbox entries.
+    """
+    apply_stats_deltas(entry_stats_deltas(rows, 1))
+
+
+def record_entries_deleted(rows):
+    """
+    Update the counters after messages were removed from mailboxes.
+
+    Parameters:
+    - rows (iterable): `(user_id, sender_id, receiver_id, is_read)` tuples of the
+      removed mailbox entries.
+    """
+    apply_stats_deltas(entry_stats_deltas(rows, -1))
+
+
+def record_messages_read(receiver_id, count, is_read=True):
+    """
+    Update the unread counter after messages changed their read state.
+
+    Parameters:
+    - receiver_id (int): The receiver of the messages.
+    - count (int): How many messages actually changed state.
+    - is_read (bool): The new read state of the messages.
+    """
+    if count:
+        apply_stats_deltas(
+            {receiver_id: Counter(unread_count=-count if is_read else count)}
+        )
+
+
+def compute_mailbox_entry_stats(entry_model, user_ids=None):
+    """
+    Count every user's live mailbox entries from scratch.
+
+    Parameters:
+    - entry_model (Model): The mailbox entry model to count.
+    - user_ids (list): Restrict the counts to these users; all users if omitted.
+
+    Returns:
+    - dict: Counters keyed by user id.
+    """
+    entries = entry_model.objects.filter(is_deleted=False)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    return count_mailbox_entries(entries)
+
+
+def count_mailbox_entries(entries, counts=None):
+    """
+    Add up the counters of a queryset of mailbox entries (hot or cold) per user.
+
+    Parameters:
+    - entries (QuerySet): The entries to count.
+    - counts (dict): Counters to add to; a new dict if omitted.
+
+    Returns:
+    - dict: Counters keyed by user id.
+    """
+    if counts is None:
+        counts = defaultdict(Counter)
+    queries = {
+        "total_count": entries,
+        "sent_count": entries.filter(message__sender_id=models.F("user_id")),
+        "unread_count": entries.filter(
+            message__receiver_id=models.F("user_id"), message__is_read=False
+        ),
+    }
+    for field, queryset in queries.items():
+        for user_id, count in queryset.values_list("user_id").annotate(
+            c=models.Count("id")
+        ):
+            counts[user_id][field] += count
+    return counts
+
+
+@transaction.atomic
+def rebuild_mailbox_stats(user_ids=None):
+    """
+    Recompute the mailbox counters from the hot and cold mailbox entries.
+
+    Parameters:
+    - user_ids (list): Rebuild only these users; all users if omitted.
+
+    Returns:
+    - int: The number of counter rows written.
+    """
+    counts = compute_mailbox_entry_stats(MailboxEntry, user_ids)
+    cold_entries = ColdMailboxEntry.objects.all()
+    if user_ids is not None:
+        cold_entries = cold_entries.filter(user_id__in=user_ids)
+    count_mailbox_entries(cold_entries, counts)
+    stats = MailboxStats.objects.all()
+    if user_ids is not None:
+        stats = stats.filter(user_id__in=user_ids)
+    stats.delete()
+
+    # Rebuilt rows get a fresh change marker so no earlier ETag can match them
+    marker = {"version": time.time_ns(), "last_modified": timezone.now()}
+    MailboxStats.objects.bulk_create(
+        (
+            MailboxStats(user_id=user_id, **values, **marker)
+            for user_id, values in counts.items()
+        ),
+        batch_size=STATS_UPDATE_BATCH_SIZE,
+    )
+    return len(counts)
@@ -0,0 +1,154 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .models import MessageTombstone
+from .utils import get_user_related_messages
+
+# Position in a `(timestamp, id)` ordered change log
+SyncPosition = namedtuple("SyncPosition", ["timestamp", "pk"])
+
+SyncChanges = namedtuple(
+    "SyncChanges",
+    ["changed", "deleted", "messages_position", "tombstones_position", "has_more"],
+)
+
+
+def encode_sync_token(messages_position, tombstones_position):
+    """
+    Encode the change-log positions reached by a client into an opaque sync token.
+    """
+    payload = {"d": [tombstones_position.timestamp.isoformat(), tombstones_position.pk]}
+    if messages_position is not None:
+        payload["m"] = [messages_position.timestamp.isoformat(), messages_position.pk]
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_sync_token(token):
+    """
+    Decode a sync token produced by `encode_sync_token`.
+
+    Returns:
+    - tuple: The `(messages_position, tombstones_position)` pair.
+
+    Raises:
+    - ValueError: If the token is malformed.
+    """
+    try:
+        payload = json.loads(urlsafe_b64decode(token.encode()))
+        positions = [
+            (
+                SyncPosition(
+                    datetime.fromisoformat(payload[key][0]), int(payload[key][1])
+                )
+                if key in payload
+                else None
+            )
+            for key in ("m", "d")
+        ]
+    except (TypeError, ValueError, KeyError, IndexError, AttributeError):
+        raise ValueError("Invalid sync token.")
+
+    if positions[1] is None or any(
+        position is not None and timezone.is_naive(position.timestamp)
+        for position in positions
+    ):
+        raise ValueError("Invalid sync token.")
+    return positions[0], positions[1]
+
+
+def get_sync_horizon():
+    """
+    Return the newest change time that is safe to hand out to clients.
+    """
+    return timezone.now() - timedelta(seconds=settings.MESSAGE_SYNC_SETTLE_SECONDS)
+
+
+def initial_tombstones_position():
+    """
+    Return the deletion-log position of a client starting a full sync.
+    """
+    return SyncPosition(get_sync_horizon(), 0)
+
+
+def is_sync_token_expired(tombstones_position):
+    """
+    Tell whether tombstones the client still needs may already have been purged.
+    """
+    retention = timedelta(days=settings.MESSAGE_SYNC_TOMBSTONE_DAYS)
+    return tombstones_position.timestamp < timezone.now() - retention
+
+
+def after_position(queryset, field, position):
+    """
+    Restrict a queryset to rows strictly after a `(field, id)` position.
+    """
+    if position is None:
+        return queryset
+    return queryset.filter(
+        models.Q(**{f"{field}__gt": position.timestamp})
+        | models.Q(**{field: position.timestamp, "id__gt": position.pk})
+    )
+
+
+def get_sync_changes(user, messages_position, tombstones_position, limit):
+    """
+    Collect the messages changed and deleted in a user's mailbox since the given positions.
+
+    Only changes older than `MESSAGE_SYNC_SETTLE_SECONDS` are returned, so that writes
+    still committing with an earlier timestamp are not skipped by the next sync.
+
+    Parameters:
+    - user (User): The user whose mailbox is synced.
+    - messages_position (SyncPosition): Last message change seen, or None for a full sync.
+    - tombstones_position (SyncPosition): Last deletion seen.
+    - limit (int): Maximum number of changed messages and of deleted ids to return.
+
+    Returns:
+    - SyncChanges: The changes, the new positions and whether more changes are pending.
+    """
+    horizon = get_sync_horizon()
+
+    messages = after_position(
+        get_user_related_messages(user).filter(updated_at__lte=horizon),
+        "updated_at",
+        messages_position,
+    )
+    changed = list(messages.order_by("updated_at", "id")[: limit + 1])
+
+    tombstones = after_position(
+        MessageTombstone.objects.filter(user_id=user.id, deleted_at__lte=horizon),
+        "deleted_at",
+        tombstones_position,
+    )
+    deleted = list(
+        tombstones.order_by("deleted_at", "id").values_list(
+            "deleted_at", "id", "message_id"
+        )[: limit + 1]
+    )
+
+    # Whether the deletion log has been read up to the horizon
+    tombstones_drained = len(deleted) <= limit
+    has_more = len(changed) > limit or not tombstones_drained
+    changed, deleted = changed[:limit], deleted[:limit]
+    if changed:
+        messages_position = SyncPosition(changed[-1].updated_at, changed[-1].id)
+    if deleted:
+        tombstones_position = SyncPosition(deleted[-1][0], deleted[-1][1])
+    if tombstones_drained:
+        # Move the position up to the horizon, so the token of a client that never
+        # sees a deletion doesn't fall behind the tombstone retention
+        tombstones_position = max(tombstones_position, SyncPosition(horizon, 0))
+
+    return SyncChanges(
+        changed,
+        [message_id for _, _, message_id in deleted],
+        messages_position,
+        tombstones_position,
+        has_more,
+    )
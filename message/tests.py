@@ -1,10 +1,51 @@
+import asyncio
+import contextvars
+import json
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction
 from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Message
+from .async_views import (
+    AsyncMessageListCreateView,
+    AsyncMessageMarkReadView,
+    AsyncMessageRetrieveUpdateDestroyView,
+)
+from .authentication import get_active_status_cache
+from .benchmark import WORKLOADS, APIBenchmark, compare_results, seed_dataset
+from .cache import LocMemLRUBackend, get_message_cache
+from .events import InProcessEventBroker, get_event_broker
+from .models import (
+    ColdMessage,
+    MailboxEntry,
+    MailboxStats,
+    Message,
+    MessageTombstone,
+)
+from .pagination import MailboxCursorPagination
+from .serializers import MessageSerializer
+from .utils import delete_messages_for_user, get_user_related_messages
+from .views import long_poll
+from .write_queue import WriteQueue, run_write
 
 
 class MessageModelTests(TestCase):
@@ -110,7 +151,7 @@ class MessageAPITests(TestCase):
         url = reverse("message:message-list-create")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data["results"]), 3)
 
     def test_filter_messages_api(self):
         # Test retrieving unread messages (which the receiver is the authenticated user)
@@ -118,7 +159,7 @@ class MessageAPITests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            len(response.data), 1
+            len(response.data["results"]), 1
         )  # Ensure only one unread message is returned
 
     def test_read_message_api_success(self):
@@ -196,9 +237,13 @@ class MessageAPITests(TestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
-        # Ensure the message is deleted
-        with self.assertRaises(Message.DoesNotExist):
-            Message.objects.get(id=message_id)
+        # Ensure the message is gone from the deleter's mailbox only
+        self.assertFalse(
+            get_user_related_messages(self.user_a).filter(id=message_id).exists()
+        )
+        self.assertTrue(
+            get_user_related_messages(self.user_b).filter(id=message_id).exists()
+        )
 
     def test_delete_message_api_message_not_found(self):
         # Test deleting a message that doesn't exist
@@ -225,3 +270,1395 @@ class MessageAPITests(TestCase):
         url = reverse("message:message-detail", kwargs={"pk": message_id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MessageAuthenticationTests(TestCase):
+    def setUp(self):
+        get_active_status_cache.cache_clear()
+        self.user = User.objects.create_user(username="alice")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.url = reverse("message:message-list-create")
+
+    def test_user_row_is_not_loaded_per_request(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("auth_user" in query["sql"] for query in queries))
+
+    @override_settings(MESSAGE_AUTH_ACTIVE_CACHE_SECONDS=0)
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MessagePaginationTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.messages = [
+            Message.objects.create(
+                sender=self.user_a,
+                receiver=self.user_b,
+                subject=f"Subject {i}",
+                content=f"Content {i}",
+            )
+            for i in range(5)
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_b)
+        self.url = reverse("message:message-list-create")
+
+    def test_pages_follow_next_and_previous_cursors(self):
+        # Walk forward through the mailbox two messages at a time, then back again
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["previous"])
+        first_page = [m["id"] for m in response.data["results"]]
+        self.assertEqual(first_page, [self.messages[4].id, self.messages[3].id])
+
+        response = self.client.get(response.data["next"])
+        second_page = [m["id"] for m in response.data["results"]]
+        self.assertEqual(second_page, [self.messages[2].id, self.messages[1].id])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [m["id"] for m in response.data["results"]], [self.messages[0].id]
+        )
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([m["id"] for m in response.data["results"]], second_page)
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([m["id"] for m in response.data["results"]], first_page)
+        self.assertIsNone(response.data["previous"])
+
+    def test_page_size_is_capped(self):
+        with self.settings(MESSAGE_MAX_PAGE_SIZE=3):
+            response = self.client.get(self.url, {"page_size": 100})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MessageSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.messages = [
+            Message.objects.create(
+                sender=self.user_a,
+                receiver=self.user_b,
+                subject=f"Subject {i}",
+                content=f"Content {i}\u2028",
+            )
+            for i in range(3)
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_b)
+        self.url = reverse("message:message-list-create")
+
+    def test_list_matches_message_serializer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = MessageSerializer(reversed(self.messages), many=True).data
+        self.assertEqual(response.data["results"], expected)
+        self.assertEqual(
+            json.loads(response.content)["results"], json.loads(json.dumps(expected))
+        )
+
+    def test_sparse_fieldset(self):
+        fields = ["id", "subject", "sender", "created_at", "is_read"]
+        response = self.client.get(self.url, {"fields": ",".join(fields)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            MessageSerializer(reversed(self.messages), many=True, fields=fields).data,
+        )
+        self.assertEqual(set(response.data["results"][0]), set(fields))
+
+    def test_sparse_fieldset_pages_without_id(self):
+        response = self.client.get(self.url, {"fields": "subject", "page_size": 2})
+        self.assertEqual(
+            response.data["results"],
+            [{"subject": "Subject 2"}, {"subject": "Subject 1"}],
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"], [{"subject": "Subject 0"}])
+
+    def test_sparse_fieldset_of_search_results(self):
+        response = self.client.get(self.url, {"fields": "subject", "q": "subject 1"})
+        self.assertEqual(response.data["results"], [{"subject": "Subject 1"}])
+
+    def test_invalid_fields(self):
+        for fields in ["subject,password", ""]:
+            response = self.client.get(self.url, {"fields": fields})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("fields", response.data)
+
+
+class UserRelatedMessagesTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.user_c = User.objects.create_user(username="carol")
+        Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="1", content="1"
+        )
+        Message.objects.create(
+            sender=self.user_b, receiver=self.user_a, subject="2", content="2"
+        )
+        Message.objects.create(
+            sender=self.user_a, receiver=self.user_a, subject="3", content="3"
+        )
+        Message.objects.create(
+            sender=self.user_b, receiver=self.user_c, subject="4", content="4"
+        )
+
+    def test_returns_sent_and_received_messages(self):
+        self.assertEqual(
+            sorted(
+                get_user_related_messages(self.user_a).values_list("subject", flat=True)
+            ),
+            ["1", "2", "3"],
+        )
+
+    def test_deleted_and_archived_entries(self):
+        MailboxEntry.objects.filter(user=self.user_a, message__subject="1").update(
+            is_deleted=True
+        )
+        MailboxEntry.objects.filter(user=self.user_a, message__subject="2").update(
+            is_archived=True
+        )
+        self.assertEqual(
+            list(
+                get_user_related_messages(self.user_a, archived=False).values_list(
+                    "subject", flat=True
+                )
+            ),
+            ["3"],
+        )
+        self.assertEqual(
+            list(
+                get_user_related_messages(self.user_a, archived=True).values_list(
+                    "subject", flat=True
+                )
+            ),
+            ["2"],
+        )
+        self.assertEqual(get_user_related_messages(self.user_b).count(), 3)
+
+    @skipUnless(connection.vendor == "sqlite", "Checks SQLite's query plan")
+    def test_page_reads_mailbox_index_in_order(self):
+        page = get_user_related_messages(self.user_a).order_by(
+            *MailboxCursorPagination.ordering
+        )[:50]
+        plan = page.explain()
+        self.assertIn("mailbox_entry_user_live_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class MailboxStatsTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+
+        self.client = APIClient()
+        self.stats_url = reverse("message:message-stats")
+
+    def send_message(self, sender, receiver):
+        self.client.force_authenticate(user=sender)
+        response = self.client.post(
+            reverse("message:message-list-create"),
+            {"receiver": receiver.id, "subject": "Subject", "content": "Content"},
+        )
+        return response.data["id"]
+
+    def get_stats(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_stats_for_empty_mailbox(self):
+        self.assertEqual(
+            self.get_stats(self.user_a),
+            {"unread_count": 0, "total_count": 0, "sent_count": 0},
+        )
+
+    def test_counters_follow_create_read_and_delete(self):
+        first_id = self.send_message(self.user_a, self.user_b)
+        self.send_message(self.user_a, self.user_b)
+        self.assertEqual(
+            self.get_stats(self.user_b),
+            {"unread_count": 2, "total_count": 2, "sent_count": 0},
+        )
+        self.assertEqual(
+            self.get_stats(self.user_a),
+            {"unread_count": 0, "total_count": 2, "sent_count": 2},
+        )
+
+        # Reading the message twice only decrements the unread counter once
+        self.client.force_authenticate(user=self.user_b)
+        detail_url = reverse("message:message-detail", kwargs={"pk": first_id})
+        self.client.get(detail_url)
+        self.client.get(detail_url)
+        self.assertEqual(self.get_stats(self.user_b)["unread_count"], 1)
+
+        # Deleting only removes the message from the deleter's mailbox
+        self.client.force_authenticate(user=self.user_b)
+        self.client.delete(detail_url)
+        self.assertEqual(
+            self.get_stats(self.user_b),
+            {"unread_count": 1, "total_count": 1, "sent_count": 0},
+        )
+        self.assertEqual(
+            self.get_stats(self.user_a),
+            {"unread_count": 0, "total_count": 2, "sent_count": 2},
+        )
+
+    def test_rebuild_command_repairs_drift(self):
+        self.send_message(self.user_a, self.user_b)
+        self.send_message(self.user_b, self.user_b)
+        expected = self.get_stats(self.user_b)
+        MailboxStats.objects.all().delete()
+
+        call_command("rebuild_mailbox_stats", stdout=StringIO())
+
+        self.assertEqual(
+            expected, {"unread_count": 2, "total_count": 2, "sent_count": 1}
+        )
+        self.assertEqual(self.get_stats(self.user_b), expected)
+
+
+class MessageBulkCreateTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.user_c = User.objects.create_user(username="carol")
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.url = reverse("message:message-bulk-create")
+
+    def test_bulk_create_reports_per_item_results(self):
+        data = {
+            "receivers": [self.user_b.id, self.user_c.id, 99999],
+            "subject": "Notice",
+            "content": "Broadcast content",
+            "messages": [
+                {"receiver": self.user_b.id, "subject": "Hi", "content": "Direct"},
+                {"receiver": self.user_c.id, "content": "Missing subject"},
+            ],
+        }
+        with self.settings(MESSAGE_BULK_BATCH_SIZE=2):
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(response.data["failed"], 2)
+
+        results = response.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            [r["status"] for r in results],
+            ["created", "created", "error", "created", "error"],
+        )
+        self.assertIn("receiver", results[2]["errors"])
+        self.assertIn("subject", results[4]["errors"])
+
+        direct = Message.objects.get(id=results[3]["id"])
+        self.assertEqual(direct.sender, self.user_a)
+        self.assertEqual(direct.receiver, self.user_b)
+        self.assertEqual(direct.content, "Direct")
+        self.assertEqual(
+            Message.objects.filter(sender=self.user_a, subject="Notice").count(), 2
+        )
+
+        self.assertEqual(MailboxStats.objects.get(user=self.user_a).sent_count, 3)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 2)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_c).unread_count, 1)
+
+    def test_bulk_create_without_valid_items(self):
+        response = self.client.post(
+            self.url,
+            {"receivers": [99999], "subject": "Notice", "content": "Content"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["created"], 0)
+        self.assertFalse(Message.objects.exists())
+
+    def test_bulk_create_requires_subject_for_receivers(self):
+        response = self.client.post(
+            self.url, {"receivers": [self.user_b.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MessageMarkReadTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.received = [
+            Message.objects.create(
+                sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+            )
+            for _ in range(3)
+        ]
+        self.sent = Message.objects.create(
+            sender=self.user_b, receiver=self.user_a, subject="S", content="C"
+        )
+        call_command("rebuild_mailbox_stats", stdout=StringIO())
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_b)
+        self.url = reverse("message:message-mark-read")
+
+    def test_mark_ids_as_read_and_unread(self):
+        ids = [self.received[0].id, self.received[1].id, self.sent.id]
+        response = self.client.post(self.url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The sent message belongs to another receiver and is left alone
+        self.assertEqual(response.data["updated"], 2)
+        self.assertFalse(Message.objects.get(id=self.sent.id).is_read)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 1)
+
+        response = self.client.post(
+            self.url, {"ids": ids, "is_read": False}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 3)
+
+    def test_mark_all_as_read_uses_a_single_update(self):
+        # The SELECT feeding read receipts, the messages UPDATE, the cold messages
+        # SELECT, the counter UPDATE and the change marker UPDATE, inside a savepoint
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, {"all": True}, format="json")
+        self.assertEqual(response.data["updated"], 3)
+        self.assertFalse(
+            Message.objects.filter(receiver=self.user_b, is_read=False).exists()
+        )
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 0)
+
+    def test_mark_before_timestamp(self):
+        before = self.received[2].created_at
+        response = self.client.post(
+            self.url, {"before": before.isoformat()}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 2)
+        self.assertFalse(Message.objects.get(id=self.received[2].id).is_read)
+
+    def test_requires_exactly_one_selector(self):
+        response = self.client.post(
+            self.url, {"all": True, "ids": [self.received[0].id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MessageBulkDeleteTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.user_c = User.objects.create_user(username="carol")
+        self.own = [
+            Message.objects.create(
+                sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+            ),
+            Message.objects.create(
+                sender=self.user_b, receiver=self.user_a, subject="S", content="C"
+            ),
+        ]
+        self.foreign = Message.objects.create(
+            sender=self.user_b, receiver=self.user_c, subject="S", content="C"
+        )
+        call_command("rebuild_mailbox_stats", stdout=StringIO())
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+
+    def test_bulk_delete_only_own_messages(self):
+        ids = [message.id for message in self.own] + [self.foreign.id, 99999]
+        with self.settings(MESSAGE_BULK_BATCH_SIZE=1):
+            response = self.client.post(
+                reverse("message:message-bulk-delete"), {"ids": ids}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["deleted"], 2)
+        self.assertFalse(get_user_related_messages(self.user_a).exists())
+        self.assertEqual(get_user_related_messages(self.user_b).count(), 3)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_a).total_count, 0)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).total_count, 3)
+
+    def test_purge_by_age_and_user(self):
+        Message.objects.filter(id=self.own[0].id).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        call_command(
+            "purge_messages",
+            "--older-than-days=365",
+            "--batch-size=1",
+            "--sleep=0",
+            stdout=StringIO(),
+        )
+        self.assertFalse(Message.objects.filter(id=self.own[0].id).exists())
+        self.assertEqual(Message.objects.count(), 2)
+
+        call_command(
+            "purge_messages", f"--user={self.user_c.id}", "--sleep=0", stdout=StringIO()
+        )
+        self.assertEqual(list(Message.objects.all()), [self.own[1]])
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).total_count, 1)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_c).total_count, 0)
+
+    def test_archive_only_hides_own_entries(self):
+        ids = [self.own[0].id, self.foreign.id]
+        response = self.client.post(
+            reverse("message:message-archive"), {"ids": ids}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 1)
+        response = self.client.get(
+            reverse("message:message-list-create"), {"archived": "false"}
+        )
+        self.assertEqual(
+            [message["id"] for message in response.data["results"]], [self.own[1].id]
+        )
+        self.assertEqual(
+            get_user_related_messages(self.user_b, archived=False).count(), 3
+        )
+
+        response = self.client.post(
+            reverse("message:message-archive"),
+            {"ids": ids, "archived": False},
+            format="json",
+        )
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(
+            get_user_related_messages(self.user_a, archived=False).count(), 2
+        )
+
+    def test_sweep_removes_messages_deleted_by_every_participant(self):
+        delete_messages_for_user(self.user_a, [message.id for message in self.own])
+        delete_messages_for_user(self.user_b, [self.own[0].id])
+        call_command(
+            "purge_messages",
+            "--sweep-deleted",
+            "--batch-size=1",
+            "--sleep=0",
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            set(Message.objects.values_list("id", flat=True)),
+            {self.own[1].id, self.foreign.id},
+        )
+        self.assertEqual(get_user_related_messages(self.user_b).count(), 2)
+
+
+@override_settings(MESSAGE_SYNC_SETTLE_SECONDS=0)
+class MessageSyncTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.messages = [
+            Message.objects.create(
+                sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+            )
+            for _ in range(3)
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_b)
+        self.url = reverse("message:message-sync")
+
+    def sync(self, token=None, **params):
+        if token is not None:
+            params["token"] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sync_returns_only_changes_since_token(self):
+        data = self.sync()
+        self.assertEqual(
+            [m["id"] for m in data["changed"]], [m.id for m in self.messages]
+        )
+        self.assertFalse(data["has_more"])
+
+        data = self.sync(data["token"])
+        self.assertEqual((data["changed"], data["deleted"]), ([], []))
+
+        # Read one message, delete another and receive a new one
+        self.client.get(
+            reverse("message:message-detail", kwargs={"pk": self.messages[0].id})
+        )
+        self.client.delete(
+            reverse("message:message-detail", kwargs={"pk": self.messages[1].id})
+        )
+        new_message = Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+
+        data = self.sync(data["token"])
+        self.assertEqual(
+            [m["id"] for m in data["changed"]], [self.messages[0].id, new_message.id]
+        )
+        self.assertTrue(data["changed"][0]["is_read"])
+        self.assertEqual(data["deleted"], [self.messages[1].id])
+
+    def test_sync_pages_through_changes(self):
+        data = self.sync(page_size=2)
+        self.assertEqual(len(data["changed"]), 2)
+        self.assertTrue(data["has_more"])
+
+        data = self.sync(data["token"], page_size=2)
+        self.assertEqual([m["id"] for m in data["changed"]], [self.messages[2].id])
+        self.assertFalse(data["has_more"])
+
+    def test_invalid_and_expired_tokens(self):
+        response = self.client.get(self.url, {"token": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        token = self.sync()["token"]
+        with self.settings(MESSAGE_SYNC_TOMBSTONE_DAYS=0):
+            response = self.client.get(self.url, {"token": token})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_token_without_deletions_outlives_the_retention(self):
+        token = self.sync()["token"]
+        now = timezone.now()
+        with self.settings(MESSAGE_SYNC_TOMBSTONE_DAYS=30):
+            for days in (20, 40, 60):
+                with mock.patch(
+                    "django.utils.timezone.now",
+                    return_value=now + timedelta(days=days),
+                ):
+                    token = self.sync(token)["token"]
+
+    def test_purge_expired_tombstones(self):
+        self.client.delete(
+            reverse("message:message-detail", kwargs={"pk": self.messages[0].id})
+        )
+        self.assertEqual(MessageTombstone.objects.count(), 1)
+        MessageTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+
+        call_command(
+            "purge_messages", "--expired-tombstones", "--sleep=0", stdout=StringIO()
+        )
+        self.assertFalse(MessageTombstone.objects.exists())
+        self.assertEqual(Message.objects.count(), 3)
+
+
+class RecordingEventBroker(InProcessEventBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, user_id, event_type, data):
+        self.published.append((user_id, event_type, data))
+        super().publish(user_id, event_type, data)
+
+
+@override_settings(MESSAGE_EVENT_BROKER="message.tests.RecordingEventBroker")
+class MessageEventTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        get_event_broker().published.clear()
+
+    @override_settings(MESSAGE_BULK_BATCH_SIZE=2)
+    def test_bulk_create_publishes_ids_once_per_batch(self):
+        receivers = [self.user_b.id, self.user_a.id, self.user_b.id]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                reverse("message:message-bulk-create"),
+                {"receivers": receivers, "subject": "Hi", "content": "Hello"},
+                format="json",
+            )
+        ids = [result["id"] for result in response.data["results"]]
+        self.assertEqual(
+            get_event_broker().published,
+            [
+                (receiver, "message.created", {"id": message_id})
+                for receiver, message_id in zip(receivers, ids)
+            ],
+        )
+        publish_callbacks = [c for c in callbacks if c.__name__ == "publish"]
+        self.assertEqual(len(publish_callbacks), 2)
+
+    def test_create_and_read_publish_events_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("message:message-list-create"),
+                {"receiver": self.user_b.id, "subject": "Hi", "content": "Hello"},
+            )
+        message_id = response.data["id"]
+        self.assertEqual(
+            get_event_broker().published,
+            [(self.user_b.id, "message.created", {"id": message_id})],
+        )
+
+        self.client.force_authenticate(user=self.user_b)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(
+                reverse("message:message-detail", kwargs={"pk": message_id})
+            )
+            # Reading it again sends no second receipt
+            self.client.get(
+                reverse("message:message-detail", kwargs={"pk": message_id})
+            )
+        self.assertEqual(
+            get_event_broker().published[1:],
+            [
+                (
+                    self.user_a.id,
+                    "message.read",
+                    {"ids": [message_id], "receiver": self.user_b.id},
+                )
+            ],
+        )
+
+    def test_stream_requires_authentication(self):
+        response = self.client.get(reverse("message:message-events"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_delivers_published_events(self):
+        token = await asyncio.to_thread(AccessToken.for_user, self.user_b)
+        response = await self.async_client.get(
+            reverse("message:message-events"),
+            headers={"authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        get_event_broker().publish(self.user_b.id, "message.created", {"id": 1})
+        self.assertEqual(
+            await anext(stream), b'event: message.created\ndata: {"id": 1}\n\n'
+        )
+        await stream.aclose()
+
+
+@override_settings(MESSAGE_EVENT_BROKER="message.tests.RecordingEventBroker")
+class MessageLongPollTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.message = Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+        self.url = reverse("message:message-list-create")
+
+    async def get_list(self, **params):
+        token = await asyncio.to_thread(AccessToken.for_user, self.user_b)
+        return await self.async_client.get(
+            self.url, params, headers={"authorization": f"Bearer {token}"}
+        )
+
+    async def test_returns_at_once_when_newer_message_exists(self):
+        response = await asyncio.wait_for(
+            self.get_list(wait=30, since_id=self.message.id - 1), timeout=5
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    async def test_wakes_up_on_new_message(self):
+        request = asyncio.ensure_future(
+            self.get_list(wait=30, since_id=self.message.id)
+        )
+        await asyncio.sleep(0.2)
+        self.assertFalse(request.done())
+
+        get_event_broker().publish(self.user_b.id, "message.created", {"id": 0})
+        response = await asyncio.wait_for(request, timeout=5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_times_out(self):
+        with self.settings(MESSAGE_LONG_POLL_MAX_WAIT=0.1):
+            response = await asyncio.wait_for(self.get_list(wait=30), timeout=5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_invalid_wait(self):
+        response = await self.get_list(wait="soon")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MESSAGE_LONG_POLL_RECHECK_INTERVAL=0.1)
+    async def test_notices_messages_without_an_event(self):
+        # E.g. created by another process with an in-process broker
+        request = asyncio.ensure_future(self.get_list(wait=30))
+        await asyncio.sleep(0.2)
+        self.assertFalse(request.done())
+
+        await Message.objects.acreate(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+        response = await asyncio.wait_for(request, timeout=5)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_sync_view_stays_sync(self):
+        # Requests without `wait` must not pay for an event loop under WSGI
+        self.assertFalse(iscoroutinefunction(resolve(self.url).func))
+
+
+class LocMemLRUBackendTests(TestCase):
+    def test_evicts_least_recently_used_entries(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        self.assertEqual(backend.get("a"), 1)
+        backend.set("c", 3)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual((backend.get("a"), backend.get("c")), (1, 3))
+
+
+@override_settings(MESSAGE_CACHE_ENABLED=True)
+class MessageCacheTests(TestCase):
+    def setUp(self):
+        get_message_cache.cache_clear()
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.message = Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.list_url = reverse("message:message-list-create")
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get(self.list_url)
+        # Only the mailbox change marker backing the ETag is read
+        with self.assertNumQueries(1):
+            second = self.client.get(self.list_url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_message_cache().stats(), {"hits": 1, "misses": 1})
+
+    def test_writes_invalidate_participants(self):
+        self.client.get(self.list_url)
+        self.client.force_authenticate(user=self.user_b)
+        self.client.get(self.list_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                self.list_url,
+                {"receiver": self.user_a.id, "subject": "Re", "content": "Reply"},
+            )
+
+        self.assertEqual(len(self.client.get(self.list_url).data["results"]), 2)
+        self.client.force_authenticate(user=self.user_a)
+        self.assertEqual(len(self.client.get(self.list_url).data["results"]), 2)
+
+    def test_cached_detail_still_marks_message_as_read(self):
+        detail_url = reverse("message:message-detail", kwargs={"pk": self.message.id})
+        # The sender caches the unread message...
+        self.assertFalse(self.client.get(detail_url).data["is_read"])
+
+        # ...but the receiver's own read goes through and updates the sender's copy
+        self.client.force_authenticate(user=self.user_b)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.get(detail_url).data["is_read"])
+        self.assertTrue(Message.objects.get(id=self.message.id).is_read)
+
+        self.client.force_authenticate(user=self.user_a)
+        self.assertTrue(self.client.get(detail_url).data["is_read"])
+
+    def test_cached_detail_without_probed_message(self):
+        detail_url = reverse("message:message-detail", kwargs={"pk": self.message.id})
+        # The probe misses the message, as when it is deleted or moved to cold
+        # storage between the probe and the cache lookup
+        with mock.patch("django.db.models.query.QuerySet.first", return_value=None):
+            self.assertIn("ETag", self.client.get(detail_url))
+            response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+        self.assertEqual(get_message_cache().stats(), {"hits": 1, "misses": 1})
+
+
+class MessageConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.message = Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.list_url = reverse("message:message-list-create")
+        self.detail_url = reverse(
+            "message:message-detail", kwargs={"pk": self.message.id}
+        )
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.list_url)["ETag"]
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        # Other pages and filters have their own tag
+        response = self.client.get(
+            self.list_url, {"page_size": 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_new_message_changes_list_etag(self):
+        etag = self.client.get(self.list_url)["ETag"]
+
+        self.client.force_authenticate(user=self.user_b)
+        self.client.post(
+            self.list_url,
+            {"receiver": self.user_a.id, "subject": "Re", "content": "Reply"},
+        )
+
+        self.client.force_authenticate(user=self.user_a)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_unchanged_message_is_not_modified(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_receiver_fetch_of_unread_message_is_never_not_modified(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        self.client.force_authenticate(user=self.user_b)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["is_read"])
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_update_with_current_etag(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        response = self.client.patch(
+            self.detail_url, {"subject": "Edited"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["subject"], "Edited")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_update_with_stale_etag_is_rejected(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.client.patch(self.detail_url, {"subject": "First"})
+
+        response = self.client.patch(
+            self.detail_url, {"subject": "Second"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Message.objects.get(id=self.message.id).subject, "First")
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.user_c = User.objects.create_user(username="carol")
+        self.best = Message.objects.create(
+            sender=self.user_a,
+            receiver=self.user_b,
+            subject="Quarterly budget",
+            content="The budget draft and the budget appendix.",
+        )
+        self.other = Message.objects.create(
+            sender=self.user_b,
+            receiver=self.user_a,
+            subject="Lunch",
+            content="Can we talk about the budget over lunch today?",
+        )
+        Message.objects.create(
+            sender=self.user_b,
+            receiver=self.user_c,
+            subject="Budget",
+            content="Not visible to alice.",
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.url = reverse("message:message-list-create")
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {"q": query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_results_are_ranked_and_scoped_to_user(self):
+        results = self.search("budget").data["results"]
+        self.assertEqual(
+            [message["id"] for message in results], [self.best.id, self.other.id]
+        )
+
+    def test_every_word_must_match(self):
+        results = self.search("budget lunch").data["results"]
+        self.assertEqual([message["id"] for message in results], [self.other.id])
+
+    def test_query_syntax_is_treated_as_text(self):
+        # NEAR is an FTS5 operator but, unlike OR, not a PostgreSQL stop word
+        self.assertEqual(len(self.search('budget" NEAR "lunch').data["results"]), 0)
+        self.assertEqual(len(self.search("!!!").data["results"]), 0)
+
+    def test_results_are_paginated(self):
+        first = self.search("budget", page_size=1)
+        self.assertEqual(first.data["results"][0]["id"], self.best.id)
+
+        second = self.client.get(first.data["next"])
+        self.assertEqual(
+            [message["id"] for message in second.data["results"]], [self.other.id]
+        )
+        self.assertIsNone(second.data["next"])
+
+    def test_index_follows_updates_and_deletes(self):
+        detail_url = reverse("message:message-detail", kwargs={"pk": self.best.id})
+        self.client.patch(detail_url, {"subject": "Forecast", "content": "Numbers"})
+        results = self.search("forecast").data["results"]
+        self.assertEqual([message["id"] for message in results], [self.best.id])
+        self.assertEqual(
+            [message["id"] for message in self.search("budget").data["results"]],
+            [self.other.id],
+        )
+
+        self.client.delete(detail_url)
+        self.assertEqual(len(self.search("forecast").data["results"]), 0)
+
+
+class ThreadTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.user_c = User.objects.create_user(username="carol")
+
+        self.client = APIClient()
+        self.messages_url = reverse("message:message-list-create")
+        self.threads_url = reverse("message:thread-list")
+
+    def send(self, sender, receiver, content):
+        self.client.force_authenticate(user=sender)
+        response = self.client.post(
+            self.messages_url,
+            {"receiver": receiver.id, "subject": "S", "content": content},
+        )
+        return response.data["id"]
+
+    def threads(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.get(self.threads_url).data["results"]
+
+    def test_thread_summaries_follow_the_conversation(self):
+        self.send(self.user_a, self.user_b, "Hi Bob")
+        last_id = self.send(self.user_b, self.user_a, "Hi Alice")
+        self.send(self.user_c, self.user_a, "Hello from Carol")
+
+        threads = self.threads(self.user_a)
+        self.assertEqual(
+            [thread["other_user"] for thread in threads],
+            [self.user_c.id, self.user_b.id],
+        )
+        self.assertEqual(threads[1]["last_message"], last_id)
+        self.assertEqual(threads[1]["last_snippet"], "Hi Alice")
+        self.assertEqual(threads[1]["unread_count"], 1)
+        self.assertEqual(self.threads(self.user_b)[0]["unread_count"], 1)
+
+        response = self.client.get(self.messages_url, {"thread": threads[1]["id"]})
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_thread_list_is_a_single_query(self):
+        self.send(self.user_a, self.user_b, "Hi")
+        self.send(self.user_c, self.user_a, "Hi")
+        self.client.force_authenticate(user=self.user_a)
+        with self.assertNumQueries(1):
+            self.client.get(self.threads_url)
+
+    def test_reading_updates_unread_counts(self):
+        first = self.send(self.user_b, self.user_a, "One")
+        self.send(self.user_b, self.user_a, "Two")
+
+        self.client.force_authenticate(user=self.user_a)
+        self.client.get(reverse("message:message-detail", kwargs={"pk": first}))
+        self.assertEqual(self.threads(self.user_a)[0]["unread_count"], 1)
+
+        self.client.post(reverse("message:message-mark-read"), {"all": True})
+        self.assertEqual(self.threads(self.user_a)[0]["unread_count"], 0)
+
+    def test_deleting_a_cold_message_keeps_the_summaries(self):
+        ids = [self.send(self.user_a, self.user_b, f"Message {i}") for i in range(3)]
+        created_at = timezone.now() - timedelta(days=200)
+        Message.objects.filter(id__in=ids).update(created_at=created_at)
+        MailboxEntry.objects.filter(message_id__in=ids).update(created_at=created_at)
+        call_command("move_cold_messages", "--sleep=0", stdout=StringIO())
+        self.assertEqual(ColdMessage.objects.count(), 3)
+
+        self.client.force_authenticate(user=self.user_a)
+        response = self.client.delete(
+            reverse("message:message-detail", kwargs={"pk": ids[2]})
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        thread_a = self.threads(self.user_a)[0]
+        self.assertEqual(thread_a["last_message"], ids[1])
+        self.assertEqual(thread_a["last_snippet"], "Message 1")
+        thread_b = self.threads(self.user_b)[0]
+        self.assertEqual(thread_b["last_message"], ids[2])
+        self.assertEqual(thread_b["unread_count"], 3)
+
+    def test_deletes_refresh_the_summary(self):
+        first = self.send(self.user_a, self.user_b, "First")
+        second = self.send(self.user_a, self.user_b, "Second")
+
+        self.client.force_authenticate(user=self.user_b)
+        self.client.delete(reverse("message:message-detail", kwargs={"pk": second}))
+        thread = self.threads(self.user_b)[0]
+        self.assertEqual(thread["last_message"], first)
+        self.assertEqual(thread["unread_count"], 1)
+        # The sender's summary still shows the message
+        self.assertEqual(self.threads(self.user_a)[0]["last_message"], second)
+
+        self.client.force_authenticate(user=self.user_b)
+        self.client.delete(reverse("message:message-detail", kwargs={"pk": first}))
+        self.assertEqual(self.threads(self.user_b), [])
+
+    def test_changing_receiver_moves_message_between_threads(self):
+        message_id = self.send(self.user_a, self.user_b, "Oops")
+        self.client.patch(
+            reverse("message:message-detail", kwargs={"pk": message_id}),
+            {"receiver": self.user_c.id},
+        )
+
+        self.assertEqual(self.threads(self.user_b), [])
+        threads = self.threads(self.user_a)
+        self.assertEqual([thread["other_user"] for thread in threads], [self.user_c.id])
+        self.assertEqual(self.threads(self.user_c)[0]["unread_count"], 1)
+
+    def test_bulk_send_creates_threads(self):
+        self.client.force_authenticate(user=self.user_a)
+        self.client.post(
+            reverse("message:message-bulk-create"),
+            {
+                "receivers": [self.user_b.id, self.user_c.id],
+                "subject": "S",
+                "content": "Broadcast",
+            },
+            format="json",
+        )
+        self.assertEqual(len(self.threads(self.user_a)), 2)
+        self.assertEqual(self.threads(self.user_c)[0]["unread_count"], 1)
+
+    def test_backfill_groups_messages_by_participants(self):
+        Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="Old"
+        )
+        Message.objects.create(
+            sender=self.user_b, receiver=self.user_a, subject="S", content="Older reply"
+        )
+        self.assertEqual(self.threads(self.user_a), [])
+
+        call_command("backfill_threads", stdout=StringIO())
+
+        self.assertFalse(Message.objects.filter(thread__isnull=True).exists())
+        thread = self.threads(self.user_a)[0]
+        self.assertEqual(thread["other_user"], self.user_b.id)
+        self.assertEqual(thread["last_snippet"], "Older reply")
+        self.assertEqual(thread["unread_count"], 1)
+
+
+class AsyncMessageViewTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.messages = [
+            Message.objects.create(
+                sender=self.user_a, receiver=self.user_b, subject=f"S{i}", content="C"
+            )
+            for i in range(3)
+        ]
+        self.factory = AsyncRequestFactory()
+        self.headers = {"authorization": f"Bearer {AccessToken.for_user(self.user_b)}"}
+
+    async def test_list(self):
+        view = long_poll(AsyncMessageListCreateView.as_view())
+        response = await view(
+            self.factory.get("/api/v1/messages/", {"wait": 0}, headers=self.headers)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [message["id"] for message in json.loads(response.content)["results"]],
+            [message.id for message in reversed(self.messages)],
+        )
+
+        request = self.factory.get(
+            "/api/v1/messages/",
+            {"wait": 0},
+            headers={**self.headers, "if-none-match": response["ETag"]},
+        )
+        response = await view(request)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_list_sparse_fieldset(self):
+        view = AsyncMessageListCreateView.as_view()
+        response = await view(
+            self.factory.get(
+                "/api/v1/messages/", {"fields": "id,is_read"}, headers=self.headers
+            )
+        )
+        self.assertEqual(
+            json.loads(response.content)["results"],
+            [
+                {"id": message.id, "is_read": False}
+                for message in reversed(self.messages)
+            ],
+        )
+
+    async def test_retrieve_marks_as_read(self):
+        message = self.messages[0]
+        view = AsyncMessageRetrieveUpdateDestroyView.as_view()
+        response = await view(
+            self.factory.get("/", headers=self.headers), pk=message.id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(response.content)["is_read"])
+        await message.arefresh_from_db()
+        self.assertTrue(message.is_read)
+
+        response = await view(self.factory.get("/", headers=self.headers), pk=0)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MESSAGE_CACHE_ENABLED=True)
+    async def test_cached_retrieve_without_probed_message(self):
+        get_message_cache.cache_clear()
+        self.addCleanup(get_message_cache.cache_clear)
+        view = AsyncMessageRetrieveUpdateDestroyView.as_view()
+        # The probe misses the message, as when it is deleted in between
+        with mock.patch("django.db.models.query.QuerySet.afirst", return_value=None):
+            for _ in range(2):
+                response = await view(
+                    self.factory.get("/", headers=self.headers),
+                    pk=self.messages[0].id,
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+
+    async def test_create_and_mark_read(self):
+        view = AsyncMessageListCreateView.as_view()
+        request = self.factory.post(
+            "/",
+            {"receiver": self.user_a.id, "subject": "Reply", "content": "C"},
+            content_type="application/json",
+            headers=self.headers,
+        )
+        response = await view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)["sender"], self.user_b.id)
+
+        view = AsyncMessageMarkReadView.as_view()
+        request = self.factory.post(
+            "/", {"all": True}, content_type="application/json", headers=self.headers
+        )
+        response = await view(request)
+        self.assertEqual(json.loads(response.content), {"updated": 3})
+
+    async def test_requires_authentication(self):
+        view = AsyncMessageListCreateView.as_view()
+        response = await view(self.factory.get("/"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ColdStorageTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.messages = [
+            Message.objects.create(
+                sender=sender, receiver=receiver, subject=f"S{i}", content=f"C{i}"
+            )
+            for i, (sender, receiver) in enumerate(
+                [(self.user_a, self.user_b), (self.user_b, self.user_a)] * 3
+            )
+        ]
+        # The first four messages are old enough to move
+        old = [message.id for message in self.messages[:4]]
+        created_at = timezone.now() - timedelta(days=200)
+        Message.objects.filter(id__in=old).update(created_at=created_at)
+        MailboxEntry.objects.filter(message_id__in=old).update(created_at=created_at)
+        call_command("rebuild_mailbox_stats", stdout=StringIO())
+        call_command(
+            "move_cold_messages", "--batch-size=3", "--sleep=0", stdout=StringIO()
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.url = reverse("message:message-list-create")
+
+    def detail_url(self, message):
+        return reverse("message:message-detail", kwargs={"pk": message.id})
+
+    def test_list_reads_through_to_cold_messages(self):
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(ColdMessage.objects.count(), 4)
+        newest_first = [message.id for message in reversed(self.messages)]
+
+        pages = []
+        response = self.client.get(self.url, {"page_size": 4})
+        pages.append([m["id"] for m in response.data["results"]])
+        response = self.client.get(response.data["next"])
+        pages.append([m["id"] for m in response.data["results"]])
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(pages, [newest_first[:4], newest_first[4:]])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([m["id"] for m in response.data["results"]], pages[0])
+
+        response = self.client.get(self.url, {"is_read": "false"})
+        self.assertEqual(
+            [m["id"] for m in response.data["results"]],
+            [self.messages[i].id for i in (5, 3, 1)],
+        )
+        stats = MailboxStats.objects.get(user=self.user_a)
+        self.assertEqual((stats.total_count, stats.unread_count), (6, 3))
+
+    def test_detail_reads_and_marks_cold_messages(self):
+        cold = self.messages[1]
+        response = self.client.get(self.detail_url(cold))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["subject"], "S1")
+        self.assertTrue(ColdMessage.objects.get(id=cold.id).is_read)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_a).unread_count, 2)
+
+        response = self.client.patch(
+            self.detail_url(self.messages[0]), {"subject": "New"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_and_purge_cold_messages(self):
+        cold = self.messages[0]
+        response = self.client.delete(self.detail_url(cold))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_a).total_count, 5)
+        self.assertTrue(ColdMessage.objects.filter(id=cold.id).exists())
+
+        self.client.force_authenticate(user=self.user_b)
+        self.client.delete(self.detail_url(cold))
+        self.assertFalse(ColdMessage.objects.filter(id=cold.id).exists())
+
+        call_command(
+            "purge_messages", "--older-than-days=100", "--sleep=0", stdout=StringIO()
+        )
+        self.assertFalse(ColdMessage.objects.exists())
+        self.assertEqual(Message.objects.count(), 2)
+        stats = MailboxStats.objects.get(user=self.user_b)
+        call_command("rebuild_mailbox_stats", stdout=StringIO())
+        rebuilt = MailboxStats.objects.get(user=self.user_b)
+        self.assertEqual(
+            (stats.total_count, stats.unread_count, stats.sent_count),
+            (rebuilt.total_count, rebuilt.unread_count, rebuilt.sent_count),
+        )
+
+
+class APIBenchmarkTests(TestCase):
+    def test_runs_every_workload(self):
+        rng = random.Random(0)
+        user_ids = seed_dataset(4, 40, read_ratio=0.5, rng=rng)
+        self.assertEqual(MailboxEntry.objects.count(), 80)
+        self.assertFalse(Message.objects.filter(thread=None).exists())
+
+        results = APIBenchmark(user_ids, actor_count=2, rng=rng).run(requests=3)
+        self.assertEqual(list(results), list(WORKLOADS))
+        for result in results.values():
+            self.assertEqual((result["requests"], result["errors"]), (3, 0))
+            self.assertGreater(result["queries_per_request"]["mean"], 0)
+
+        slower = {
+            name: {**result, "latency_ms": {**result["latency_ms"], "p95": 1e6}}
+            for name, result in results.items()
+        }
+        regressed = {
+            (name, metric)
+            for name, metric, *_, is_regression in compare_results(results, slower)
+            if is_regression
+        }
+        self.assertEqual(regressed, {(name, "p95 ms") for name in WORKLOADS})
+
+
+class WriteQueueTests(TestCase):
+    def test_failed_write_does_not_abort_the_batch(self):
+        def fail():
+            User.objects.create_user(username="rolled_back")
+            raise ValueError("invalid")
+
+        batch = [
+            (Future(), contextvars.copy_context(), function, args)
+            for function, args in (
+                (User.objects.create_user, ("alice",)),
+                (fail, ()),
+                (User.objects.create_user, ("bob",)),
+            )
+        ]
+        write_queue = WriteQueue(batch_size=10, max_wait=0)
+        write_queue.stop()
+        write_queue.run_batch(batch)
+
+        self.assertEqual(batch[0][0].result().username, "alice")
+        with self.assertRaises(ValueError):
+            batch[1][0].result()
+        self.assertEqual(batch[2][0].result().username, "bob")
+        self.assertEqual(
+            set(User.objects.values_list("username", flat=True)), {"alice", "bob"}
+        )
+
+
+@override_settings(MESSAGE_WRITE_QUEUE_ENABLED=True)
+class WriteQueueAPITests(TransactionTestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+
+    def test_writes_run_in_the_writer_thread(self):
+        self.assertEqual(
+            run_write(lambda: threading.current_thread().name), "message-write-queue"
+        )
+
+    def test_concurrent_creates_and_mark_read(self):
+        def send(i):
+            client = APIClient()
+            client.force_authenticate(user=self.user_a)
+            try:
+                response = client.post(
+                    reverse("message:message-list-create"),
+                    {"receiver": self.user_b.id, "subject": f"S{i}", "content": "C"},
+                )
+            finally:
+                # Persistent connections outlive the request; don't leak this
+                # thread's into the test database teardown
+                connections.close_all()
+            return response.status_code
+
+        with ThreadPoolExecutor(4) as executor:
+            statuses = list(executor.map(send, range(8)))
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * 8)
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 8)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user_b)
+        response = client.post(
+            reverse("message:message-mark-read"), {"all": True}, format="json"
+        )
+        self.assertEqual(response.data, {"updated": 8})
+        self.assertEqual(MailboxStats.objects.get(user=self.user_b).unread_count, 0)
@@ -0,0 +1,311 @@
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Substr
+from django.db.models.lookups import GreaterThan, IsNull
+
+from .models import ColdMessage, Message, Thread, ThreadParticipant
+
+THREAD_UPDATE_BATCH_SIZE = 500
+
+SNIPPET_LENGTH = ThreadParticipant._meta.get_field("last_snippet").max_length
+
+
+def thread_pair(sender_id, receiver_id):
+    """
+    Return the `(user_a, user_b)` key of the thread between two users.
+    """
+    return (min(sender_id, receiver_id), max(sender_id, receiver_id))
+
+
+def get_threads(pairs):
+    """
+    Return the threads of the given user pairs, creating the missing ones.
+
+    Parameters:
+    - pairs (iterable): `(user_a, user_b)` tuples as returned by `thread_pair`.
+
+    Returns:
+    - dict: The thread id of every pair.
+    """
+    pairs = list(set(pairs))
+    threads = {}
+    for start in range(0, len(pairs), THREAD_UPDATE_BATCH_SIZE):
+        batch = pairs[start : start + THREAD_UPDATE_BATCH_SIZE]
+        threads.update(_get_thread_batch(batch))
+    return threads
+
+
+def _get_thread_batch(pairs):
+    lookup = reduce(or_, (models.Q(user_a_id=a, user_b_id=b) for a, b in pairs))
+    threads = {
+        (a, b): thread_id
+        for thread_id, a, b in Thread.objects.filter(lookup).values_list(
+            "id", "user_a_id", "user_b_id"
+        )
+    }
+    missing = [pair for pair in pairs if pair not in threads]
+    if not missing:
+        return threads
+
+    # A concurrent request may create the same thread; the unique constraint keeps
+    # one and the re-read below picks it up.
+    Thread.objects.bulk_create(
+        [Thread(user_a_id=a, user_b_id=b) for a, b in missing], ignore_conflicts=True
+    )
+    lookup = reduce(or_, (models.Q(user_a_id=a, user_b_id=b) for a, b in missing))
+    created = {
+        (a, b): thread_id
+        for thread_id, a, b in Thread.objects.filter(lookup).values_list(
+            "id", "user_a_id", "user_b_id"
+        )
+    }
+    ThreadParticipant.objects.bulk_create(
+        [
+            ThreadParticipant(thread_id=thread_id, user_id=user_id, other_user_id=other)
+            for (a, b), thread_id in created.items()
+            for user_id, other in {(a, b), (b, a)}
+        ],
+        ignore_conflicts=True,
+    )
+    threads.update(created)
+    return threads
+
+
+def assign_threads(messages):
+    """
+    Set the thread of unsaved messages from their sender and receiver.
+
+    Parameters:
+    - messages (iterable): `Message` instances with `sender_id` and `receiver_id` set.
+    """
+    messages = list(messages)
+    threads = get_threads(
+        thread_pair(message.sender_id, message.receiver_id) for message in messages
+    )
+    for message in messages:
+        message.thread_id = threads[thread_pair(message.sender_id, message.receiver_id)]
+
+
+def apply_unread_deltas(deltas):
+    """
+    Add per-participant unread count deltas with one UPDATE per distinct delta.
+
+    Parameters:
+    - deltas (dict): Maps `(thread_id, user_id)` to the change of the unread count.
+    """
+    keys_by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        if delta:
+            keys_by_delta[delta].append(key)
+
+    for delta, keys in keys_by_delta.items():
+        for start in range(0, len(keys), THREAD_UPDATE_BATCH_SIZE):
+            batch = keys[start : start + THREAD_UPDATE_BATCH_SIZE]
+            lookup = reduce(
+                or_,
+                (
+                    models.Q(thread_id=thread_id, user_id=user_id)
+                    for thread_id, user_id in batch
+                ),
+            )
+            ThreadParticipant.objects.filter(lookup).update(
+                unread_count=models.F("unread_count") + delta
+            )
+
+
+def summary_updates(recount_unread=False):
+    """
+    Return the `ThreadParticipant` updates recomputing the last message summary of
+    each participant from their hot and cold messages.
+
+    The newest visible message of each tier is read through
+    `message_thread_created_idx` and `cold_mailbox_entry_user_idx`, and the newer of
+    the two wins.
+
+    Parameters:
+    - recount_unread (bool): Whether to also recount the unread messages of every
+      participant instead of trusting the maintained counts.
+
+    Returns:
+    - dict: Expressions to pass to `update`.
+    """
+    # Each participant's summary skips the messages they deleted
+    visible = Message.objects.filter(
+        thread_id=models.OuterRef("thread_id"),
+        mailbox_entries__user_id=models.OuterRef("user_id"),
+        mailbox_entries__is_deleted=False,
+    )
+    # Cold entries are removed when their user deletes the message
+    cold_visible = ColdMessage.objects.filter(
+        thread_id=models.OuterRef("thread_id"),
+        mailbox_entries__user_id=models.OuterRef("user_id"),
+    )
+    hot = visible.order_by("-created_at", "-id").annotate(
+        snippet=Substr("content", 1, SNIPPET_LENGTH)
+    )
+    cold = cold_visible.order_by("-created_at", "-id").annotate(
+        snippet=Substr("content", 1, SNIPPET_LENGTH)
+    )
+    hot_at = models.Subquery(hot.values("created_at")[:1])
+    cold_at = models.Subquery(cold.values("created_at")[:1])
+
+    def newest(field, target):
+        return models.Case(
+            models.When(
+                IsNull(hot_at, True), then=models.Subquery(cold.values(field)[:1])
+            ),
+            models.When(
+                GreaterThan(cold_at, hot_at),
+                then=models.Subquery(cold.values(field)[:1]),
+            ),
+            default=models.Subquery(hot.values(field)[:1]),
+            output_field=ThreadParticipant._meta.get_field(target),
+        )
+
+    updates = {
+        "last_message_id": newest("id", "last_message_id"),
+        "last_snippet": Coalesce(newest("snippet", "last_snippet"), models.Value("")),
+        "last_at": newest("created_at", "last_at"),
+    }
+    if recount_unread:
+        updates["unread_count"] = count_unread(visible) + count_unread(cold_visible)
+    return updates
+
+
+def count_unread(messages):
+    """
+    Return the number of unread messages received by the outer participant, as an
+    expression for `summary_updates`.
+    """
+    unread = (
+        messages.filter(receiver_id=models.OuterRef("user_id"), is_read=False)
+        .order_by()
+        .values("thread_id")
+        .annotate(count=models.Count("id"))
+        .values("count")
+    )
+    return Coalesce(models.Subquery(unread), 0)
+
+
+def refresh_thread_summaries(thread_ids, recount_unread=False):
+    """
+    Recompute the last message summary of both participants of threads.
+
+    Parameters:
+    - thread_ids (iterable): The threads to refresh.
+    - recount_unread (bool): Whether to also recount the unread messages of every
+      participant instead of trusting the maintained counts.
+    """
+    thread_ids = list({thread_id for thread_id in thread_ids if thread_id is not None})
+    updates = summary_updates(recount_unread)
+    for start in range(0, len(thread_ids), THREAD_UPDATE_BATCH_SIZE):
+        batch = thread_ids[start : start + THREAD_UPDATE_BATCH_SIZE]
+        ThreadParticipant.objects.filter(thread_id__in=batch).update(**updates)
+
+
+def refresh_participant_summaries(participants):
+    """
+    Recompute the last message summary of individual thread participants, e.g. of
+    the users whose mailbox entries changed.
+
+    Parameters:
+    - participants (iterable): `(thread_id, user_id)` tuples.
+    """
+    participants = list(
+        {participant for participant in participants if participant[0] is not None}
+    )
+    updates = summary_updates()
+    for start in range(0, len(participants), THREAD_UPDATE_BATCH_SIZE):
+        batch = participants[start : start + THREAD_UPDATE_BATCH_SIZE]
+        lookup = reduce(
+            or_,
+            (
+                models.Q(thread_id=thread_id, user_id=user_id)
+                for thread_id, user_id in batch
+            ),
+        )
+        ThreadParticipant.objects.filter(lookup).update(**updates)
+
+
+def record_thread_messages(rows, sign):
+    """
+    Update the thread summaries after messages were added to or removed from
+    participants' mailboxes.
+
+    Parameters:
+    - rows (iterable): `(thread_id, user_id, is_read)` tuples of the mailbox entries,
+      where `is_read` is only false for the receiver's entry of an unread message.
+    - sign (int): 1 if the messages were added, -1 if they were removed.
+    """
+    rows = [row for row in rows if row[0] is not None]
+    deltas = Counter()
+    for thread_id, user_id, is_read in rows:
+        if not is_read:
+            deltas[(thread_id, user_id)] += sign
+    apply_unread_deltas(deltas)
+    refresh_participant_summaries(row[:2] for row in rows)
+
+
+def record_thread_messages_created(rows):
+    """
+    Update the thread summaries after messages were created.
+    """
+    record_thread_messages(rows, 1)
+
+
+def record_thread_messages_deleted(rows):
+    """
+    Update the thread summaries after messages were deleted or moved out of a thread.
+    """
+    record_thread_messages(rows, -1)
+
+
+def record_thread_messages_read(rows, is_read=True):
+    """
+    Update the participants' unread counts after messages were marked read or unread.
+
+    Parameters:
+    - rows (iterable): `(thread_id, receiver_id)` tuples of the updated messages.
+    - is_read (bool): The new read state of the messages.
+    """
+    deltas = Counter()
+    for thread_id, receiver_id in rows:
+        if thread_id is not None:
+            deltas[(thread_id, receiver_id)] += -1 if is_read else 1
+    apply_unread_deltas(deltas)
+
+
+def backfill_threads(batch_size=THREAD_UPDATE_BATCH_SIZE):
+    """
+    Attach messages created before threads existed to the thread of their
+    participants, and compute the summaries of the affected threads.
+
+    Parameters:
+    - batch_size (int): The number of user pairs handled per transaction.
+
+    Returns:
+    - int: The number of messages attached to a thread.
+    """
+    pairs = {
+        thread_pair(sender_id, receiver_id)
+        for sender_id, receiver_id in Message.objects.filter(thread__isnull=True)
+        .values_list("sender_id", "receiver_id")
+        .distinct()
+    }
+    pairs = sorted(pairs)
+    total = 0
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start : start + batch_size]
+        with transaction.atomic():
+            threads = get_threads(batch)
+            for (a, b), thread_id in threads.items():
+                total += Message.objects.filter(
+                    models.Q(sender_id=a, receiver_id=b)
+                    | models.Q(sender_id=b, receiver_id=a),
+                    thread__isnull=True,
+                ).update(thread_id=thread_id)
+            refresh_thread_summaries(threads.values(), recount_unread=True)
+    return total
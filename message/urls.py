@@ -1,16 +1,69 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import MessageListCreateView, MessageRetrieveUpdateDestroyView
+from .async_views import (
+    AsyncMessageListCreateView,
+    AsyncMessageMarkReadView,
+    AsyncMessageRetrieveUpdateDestroyView,
+)
+from .views import (
+    MailboxStatsView,
+    MessageArchiveView,
+    MessageBulkCreateView,
+    MessageBulkDeleteView,
+    MessageEventStreamView,
+    MessageListCreateView,
+    MessageMarkReadView,
+    MessageRetrieveUpdateDestroyView,
+    MessageSyncView,
+    ThreadListView,
+    long_poll,
+)
 
 app_name = "message"
 
+if settings.MESSAGE_ASYNC_VIEWS:
+    MessageListCreateView = AsyncMessageListCreateView
+    MessageRetrieveUpdateDestroyView = AsyncMessageRetrieveUpdateDestroyView
+    MessageMarkReadView = AsyncMessageMarkReadView
+
 urlpatterns = [
     path(
-        "api/v1/messages/", MessageListCreateView.as_view(), name="message-list-create"
+        "api/v1/messages/",
+        long_poll(MessageListCreateView.as_view()),
+        name="message-list-create",
     ),
     path(
         "api/v1/messages/<int:pk>/",
         MessageRetrieveUpdateDestroyView.as_view(),
         name="message-detail",
     ),
+    path(
+        "api/v1/messages/bulk/",
+        MessageBulkCreateView.as_view(),
+        name="message-bulk-create",
+    ),
+    path(
+        "api/v1/messages/bulk-delete/",
+        MessageBulkDeleteView.as_view(),
+        name="message-bulk-delete",
+    ),
+    path(
+        "api/v1/messages/mark-read/",
+        MessageMarkReadView.as_view(),
+        name="message-mark-read",
+    ),
+    path(
+        "api/v1/messages/archive/",
+        MessageArchiveView.as_view(),
+        name="message-archive",
+    ),
+    path("api/v1/messages/sync/", MessageSyncView.as_view(), name="message-sync"),
+    path(
+        "api/v1/messages/events/",
+        MessageEventStreamView.as_view(),
+        name="message-events",
+    ),
+    path("api/v1/messages/stats/", MailboxStatsView.as_view(), name="message-stats"),
+    path("api/v1/threads/", ThreadListView.as_view(), name="thread-list"),
 ]
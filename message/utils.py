@@ -1,16 +1,186 @@
 from django.db import models
+from django.utils import timezone
 
-from .models import Message
+from messaging_system.db.routers import REPLICA_USER_HINT
 
+from .cache import invalidate_mailboxes
+from .models import MailboxEntry, Message, MessageTombstone
+from .stats import record_entries_created, record_entries_deleted, touch_mailboxes
+from .threads import record_thread_messages_created, record_thread_messages_deleted
 
-def get_user_related_messages(user):
+ENTRY_ROW_FIELDS = (
+    "message_id",
+    "user_id",
+    "message__sender_id",
+    "message__receiver_id",
+    "message__is_read",
+    "message__thread_id",
+)
+
+
+def get_user_related_messages(user, archived=None):
     """
-    Retrieve messages either sent by or received by the specified user.
+    Retrieve the messages in the specified user's mailbox, either sent or received
+    by them and not deleted by them.
+
+    The messages are selected through the user's mailbox entries, so the database
+    reads a single index of the user's live entries instead of combining the sender
+    and receiver indexes. The entry's copies of `created_at` and the message id are
+    aliased as `mailbox_created_at` and `mailbox_message_id`; ordering by them, as
+    `MailboxCursorPagination` does, reads that index in order.
 
     Parameters:
     - user (User): The user for whom to retrieve messages.
+    - archived (bool): Only return archived (`True`) or unarchived (`False`) messages;
+      both if omitted.
 
     Returns:
     - QuerySet: A queryset containing messages associated with the user, either as sender or receiver.
     """
-    return Message.objects.filter(models.Q(sender=user) | models.Q(receiver=user))
+    # All conditions on the entry go in one filter() so they apply to the same entry
+    entry = {"mailbox_entries__user_id": user.id, "mailbox_entries__is_deleted": False}
+    if archived is not None:
+        entry["mailbox_entries__is_archived"] = archived
+    # Mailbox reads may be served by a read replica (see `ReplicaRouter`)
+    messages = Message.objects.db_manager(hints={REPLICA_USER_HINT: user.id})
+    return messages.filter(**entry).alias(
+        mailbox_created_at=models.F("mailbox_entries__created_at"),
+        mailbox_message_id=models.F("mailbox_entries__message_id"),
+    )
+
+
+def mailbox_entry_rows(messages):
+    """
+    Describe the mailbox entries of saved messages, see `live_entry_rows`.
+    """
+    return [
+        (
+            message.id,
+            user_id,
+            message.sender_id,
+            message.receiver_id,
+            message.is_read,
+            message.thread_id,
+        )
+        for message in messages
+        for user_id in {message.sender_id, message.receiver_id}
+    ]
+
+
+def live_entry_rows(entries):
+    """
+    Describe the entries of a queryset that were not deleted by their user.
+
+    Returns:
+    - list: `(message_id, user_id, sender_id, receiver_id, is_read, thread_id)` tuples.
+    """
+    return list(entries.filter(is_deleted=False).values_list(*ENTRY_ROW_FIELDS))
+
+
+def record_entries_changed(added=(), removed=()):
+    """
+    Update the mailbox counters, thread summaries, sync tombstones and change markers
+    after messages entered or left their participants' mailboxes.
+
+    Parameters:
+    - added (iterable): Rows of the new entries, as returned by `mailbox_entry_rows`.
+    - removed (iterable): Rows of the removed entries, as returned by `live_entry_rows`.
+    """
+    added = list(added)
+    removed = list(removed)
+    record_entries_created(row[1:5] for row in added)
+    record_entries_deleted(row[1:5] for row in removed)
+    # Only the receiver's entry carries the unread state into the thread summary
+    record_thread_messages_created(
+        (row[5], row[1], row[4] or row[1] != row[3]) for row in added
+    )
+    record_thread_messages_deleted(
+        (row[5], row[1], row[4] or row[1] != row[3]) for row in removed
+    )
+    # A message moved within a mailbox (e.g. to another thread) is not a deletion
+    kept = {row[:2] for row in added}
+    record_tombstones(row[:2] for row in removed if row[:2] not in kept)
+    mark_mailboxes_changed(row[1] for row in added + removed)
+
+
+def delete_messages(queryset):
+    """
+    Delete messages for all of their participants and update their mailboxes.
+
+    Must be called inside a transaction; the rows are locked (where the database
+    supports it) so that their read state cannot change between counting and deleting.
+
+    Parameters:
+    - queryset (QuerySet): The messages to delete.
+
+    Returns:
+    - int: The number of deleted messages.
+    """
+    ids = list(queryset.select_for_update().values_list("id", flat=True))
+    if not ids:
+        return 0
+
+    rows = live_entry_rows(MailboxEntry.objects.filter(message_id__in=ids))
+    Message.objects.filter(id__in=ids).delete()
+    record_entries_changed(removed=rows)
+    return len(ids)
+
+
+def delete_messages_for_user(user, message_ids):
+    """
+    Remove messages from one participant's mailbox, leaving them in the other's.
+
+    Only the user's mailbox entries are flagged as deleted; the messages themselves
+    are removed later by `purge_messages --sweep-deleted`, once no participant has
+    them anymore. Must be called inside a transaction.
+
+    Parameters:
+    - user (User): The user deleting the messages.
+    - message_ids (list): The messages to delete; ids outside the user's mailbox are
+      ignored.
+
+    Returns:
+    - int: The number of messages removed from the mailbox.
+    """
+    entries = MailboxEntry.objects.filter(
+        user_id=user.id, message_id__in=message_ids, is_deleted=False
+    )
+    rows = live_entry_rows(entries.select_for_update())
+    if not rows:
+        return 0
+
+    entries.filter(message_id__in=[row[0] for row in rows]).update(
+        is_deleted=True, deleted_at=timezone.now()
+    )
+    record_entries_changed(removed=rows)
+    return len(rows)
+
+
+def record_tombstones(rows):
+    """
+    Remember that messages left their participants' mailboxes, for delta sync.
+
+    Parameters:
+    - rows (iterable): `(message_id, *user_ids)` tuples, e.g. a message id with its
+      sender and receiver; a tombstone is written for every distinct user id.
+    """
+    MessageTombstone.objects.bulk_create(
+        MessageTombstone(user_id=user_id, message_id=message_id)
+        for message_id, *user_ids in rows
+        for user_id in set(user_ids)
+    )
+
+
+def mark_mailboxes_changed(user_ids):
+    """
+    Record that the mailboxes of the given users changed.
+
+    Updates the persisted change marker used for conditional requests and invalidates
+    the users' cached responses. Call it for every participant of a written message.
+
+    Parameters:
+    - user_ids (iterable): The users whose mailboxes changed.
+    """
+    user_ids = set(user_ids)
+    touch_mailboxes(user_ids)
+    invalidate_mailboxes(user_ids)
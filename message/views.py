@@ -1,18 +1,224 @@
+import asyncio
 import logging
+from functools import partial, wraps
 
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, status
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    ValidationError,
+)
+from rest_framework.fields import BooleanField
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from .authentication import MessageJWTAuthentication
+from .cache import cached_response
+from .cold import delete_cold_messages_for_user, get_user_cold_messages
+from .conditional import (
+    if_match_etags,
+    mailbox_etag,
+    message_etag,
+    not_modified_response,
+    set_validators,
+)
+from .events import (
+    MESSAGE_CREATED,
+    get_event_broker,
+    publish_messages_created,
+    publish_messages_read,
+)
 from .filters import MessageFilter
-from .models import Message
-from .serializers import MessageSerializer
-from .utils import get_user_related_messages
+from .models import (
+    ColdMailboxEntry,
+    ColdMessage,
+    MailboxEntry,
+    Message,
+    ThreadParticipant,
+)
+from .pagination import (
+    MailboxCursorPagination,
+    MessageCursorPagination,
+    MessageSearchPagination,
+    ThreadCursorPagination,
+)
+from .search import search_messages
+from .serializers import (
+    MessageArchiveSerializer,
+    BulkMessageItemSerializer,
+    MailboxStatsSerializer,
+    MessageBulkCreateSerializer,
+    MessageBulkDeleteSerializer,
+    MessageMarkReadSerializer,
+    MessageRowSerializer,
+    MessageSerializer,
+    ThreadSerializer,
+)
+from .stats import get_mailbox_stats, record_messages_read
+from .sync import (
+    decode_sync_token,
+    encode_sync_token,
+    get_sync_changes,
+    initial_tombstones_position,
+    is_sync_token_expired,
+)
+from .threads import (
+    assign_threads,
+    get_threads,
+    record_thread_messages_read,
+    refresh_thread_summaries,
+    thread_pair,
+)
+from .utils import (
+    delete_messages_for_user,
+    get_user_related_messages,
+    live_entry_rows,
+    mailbox_entry_rows,
+    mark_mailboxes_changed,
+    record_entries_changed,
+)
+from .write_queue import run_write
 
 logger = logging.getLogger(__name__)
 
 
+def authenticate_jwt(request):
+    """
+    Authenticate a plain Django request by the JWT access token in its headers.
+
+    Returns:
+    - TokenUser: The authenticated user, or None if the token is missing or invalid.
+    """
+    try:
+        result = MessageJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def wait_for_new_message(user_id, timeout, since_id=None):
+    """
+    Wait until a message is delivered to the user or the timeout expires.
+
+    Wakeups come from the event broker. Every `MESSAGE_LONG_POLL_RECHECK_INTERVAL`
+    seconds the database is checked too, so a message created by another process
+    ends the wait even when the broker is process-local.
+
+    Parameters:
+    - user_id (int): The receiver to wait for.
+    - timeout (float): Maximum number of seconds to wait.
+    - since_id (int): Return immediately if a message newer than this id already
+      exists; defaults to the user's newest received message.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    received = Message.objects.filter(receiver_id=user_id)
+    # Subscribe before checking, so a message arriving in between is not missed
+    with get_event_broker().subscribe(user_id) as subscription:
+        if since_id is None:
+            since_id = (await received.aaggregate(newest=Max("id")))["newest"] or 0
+        elif await received.filter(id__gt=since_id).aexists():
+            return
+        while not subscription.overflowed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event_type, _ = await subscription.get(
+                    min(remaining, settings.MESSAGE_LONG_POLL_RECHECK_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                if await received.filter(id__gt=since_id).aexists():
+                    return
+                continue
+            if event_type == MESSAGE_CREATED:
+                return
+
+
+def get_long_poll_params(request):
+    """
+    Read the long poll parameters of a message list request.
+
+    Returns:
+    - tuple: `(wait, since_id)`, or None if the request does not long-poll.
+
+    Raises:
+    - ValueError: If `wait` or `since_id` is not a number.
+    """
+    if request.method != "GET" or "wait" not in request.GET:
+        return None
+    wait = min(float(request.GET["wait"]), settings.MESSAGE_LONG_POLL_MAX_WAIT)
+    since_id = request.GET.get("since_id")
+    since_id = int(since_id) if since_id is not None else None
+    return (wait, since_id) if wait > 0 else None
+
+
+def invalid_long_poll_response():
+    return JsonResponse(
+        {"detail": "`wait` and `since_id` must be numbers."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def long_poll(view):
+    """
+    Add long polling to a message list view.
+
+    When a GET request carries `wait=<seconds>` (capped by `MESSAGE_LONG_POLL_MAX_WAIT`),
+    the response is held back until a new message arrives for the user or the time is
+    up, and then the wrapped view lists the messages as usual. With `since_id=<id>`,
+    a message newer than the given id ends the wait at once. Other requests go
+    straight to the view.
+
+    An async view (`MESSAGE_ASYNC_VIEWS`) waits in a suspended coroutine, which under
+    ASGI does not occupy a worker thread. A sync view waits in its worker, so `wait`
+    is only suited to ASGI deployments with async views. Wakeups across processes
+    need a shared `MESSAGE_EVENT_BROKER`; otherwise they are only noticed by the
+    periodic database check (see `wait_for_new_message`).
+    """
+    if iscoroutinefunction(view):
+
+        @csrf_exempt
+        @wraps(view)
+        async def async_long_poll_view(request, *args, **kwargs):
+            try:
+                params = get_long_poll_params(request)
+            except ValueError:
+                return invalid_long_poll_response()
+            if params is not None:
+                user = await sync_to_async(authenticate_jwt)(request)
+                # Unauthenticated requests fall through to the view, which rejects them
+                if user is not None:
+                    await wait_for_new_message(user.id, *params)
+            return await view(request, *args, **kwargs)
+
+        return async_long_poll_view
+
+    @csrf_exempt
+    @wraps(view)
+    def long_poll_view(request, *args, **kwargs):
+        try:
+            params = get_long_poll_params(request)
+        except ValueError:
+            return invalid_long_poll_response()
+        if params is not None:
+            user = authenticate_jwt(request)
+            if user is not None:
+                async_to_sync(wait_for_new_message)(user.id, *params)
+        return view(request, *args, **kwargs)
+
+    return long_poll_view
+
+
 class MessageListCreateView(generics.ListCreateAPIView):
     """
     API endpoint for listing and creating messages.
@@ -20,6 +226,18 @@ class MessageListCreateView(generics.ListCreateAPIView):
     GET /api/v1/messages/
     - List messages associated with the authenticated user.
     - Supports filtering by read/unread status using the `is_read` query parameter.
+    - Results are cursor-paginated newest first; follow the `next`/`previous` links
+      and use `page_size` to change the page size (capped by `MESSAGE_MAX_PAGE_SIZE`).
+    - With `wait=<seconds>`, long-polls until a new message arrives (see `long_poll`).
+    - With `archived=true` (or `false`), returns only the messages the user archived
+      (or did not archive).
+    - With `thread=<id>`, returns only the messages of that conversation thread.
+    - With `q=<words>`, returns only the messages whose subject or content contains
+      every word, best match first.
+    - With `fields=<names>`, returns only the given comma-separated message fields,
+      e.g. `fields=id,subject,sender,created_at,is_read` for an inbox overview.
+    - Messages moved to cold storage follow the hot ones once the cursor reaches them
+      (except in search results).
 
     POST /api/v1/messages/
     - Create a new message.
@@ -29,8 +247,9 @@ class MessageListCreateView(generics.ListCreateAPIView):
 
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [MessageJWTAuthentication]
     filter_class = MessageFilter
+    pagination_class = MailboxCursorPagination
 
     def get_queryset(self):
         """
@@ -44,25 +263,559 @@ class MessageListCreateView(generics.ListCreateAPIView):
             return Message.objects.none()
 
         user = self.request.user
-        logger.info(f"Retrieving messages for user: {user}")
-        is_read = self.request.query_params.get("is_read", None)
-        queryset = get_user_related_messages(user)
+        logger.info("Retrieving messages for user: %s", user.id)
+        queryset = self.filter_mailbox(
+            get_user_related_messages(user, archived=self.get_archived())
+        )
+
+        if self.get_search_query():
+            queryset = search_messages(queryset, self.get_search_query())
+
+        return queryset
+
+    def get_cold_queryset(self):
+        """
+        Get the user's cold messages matching the same query parameters, which the
+        paginator reads through to once the hot messages run out.
 
+        Returns:
+        - QuerySet: The user's matching cold messages.
+        """
+        return self.as_rows(
+            self.filter_mailbox(
+                get_user_cold_messages(self.request.user, archived=self.get_archived())
+            )
+        )
+
+    def get_fields(self):
+        """
+        Parse the `fields` query parameter.
+
+        Returns:
+        - list: The requested message fields, or None for all of them.
+        """
+        fields = self.request.query_params.get("fields")
+        if fields is None:
+            return None
+        fields = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in MessageSerializer.Meta.fields]
+        if not fields or unknown:
+            raise ValidationError(
+                {
+                    "fields": [
+                        "Expected a comma-separated list of: "
+                        f"{', '.join(MessageSerializer.Meta.fields)}."
+                    ]
+                }
+            )
+        return fields
+
+    def get_row_serializer(self):
+        """
+        Return the row serializer of the requested fields, see `MessageRowSerializer`.
+        """
+        if not hasattr(self, "_row_serializer"):
+            self._row_serializer = MessageRowSerializer(fields=self.get_fields())
+        return self._row_serializer
+
+    def as_rows(self, queryset):
+        """
+        Read a queryset of messages as named rows of the columns the row serializer
+        and the paginator need.
+
+        Returns:
+        - QuerySet: The messages as `values_list(..., named=True)` rows.
+        """
+        # The paginator positions its cursors by these
+        columns = {"id", "created_at", *self.get_row_serializer().columns}
+        if self.get_search_query():
+            columns.add("search_rank")
+        return queryset.values_list(*sorted(columns), named=True)
+
+    def get_archived(self):
+        """
+        Parse the `archived` query parameter.
+
+        Returns:
+        - bool: The requested archive state, or None to list both.
+        """
+        archived = self.request.query_params.get("archived")
+        if archived is None:
+            return None
+        try:
+            return BooleanField().to_internal_value(archived)
+        except ValidationError as error:
+            raise ValidationError({"archived": error.detail})
+
+    def filter_mailbox(self, queryset):
+        """
+        Apply the `is_read` and `thread` query parameters to the user's messages.
+        """
+        user = self.request.user
+        is_read = self.request.query_params.get("is_read", None)
         if is_read is not None:
             # Convert the 'is_read' parameter value to a boolean
             is_read_bool = is_read.lower() == "true/"
             # Filter the queryset based on whether the message is read or unread
-            queryset = queryset.filter(receiver=user, is_read=is_read_bool)
+            queryset = queryset.filter(receiver_id=user.id, is_read=is_read_bool)
 
+        thread = self.request.query_params.get("thread")
+        if thread is not None:
+            try:
+                queryset = queryset.filter(thread_id=int(thread))
+            except ValueError:
+                raise ValidationError({"thread": ["A valid integer is required."]})
         return queryset
 
+    def get_search_query(self):
+        """
+        Return the `q` search query parameter, or an empty string if not searching.
+        """
+        request = getattr(self, "request", None)
+        if request is None:
+            return ""
+        return request.query_params.get("q", "").strip()
+
+    @property
+    def paginator(self):
+        """
+        Return the paginator, ordering search results by rank instead of date.
+        """
+        if not hasattr(self, "_paginator"):
+            if self.get_search_query():
+                self._paginator = MessageSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        """
+        List the messages, serving repeated polls of an unchanged mailbox from the cache.
+
+        The response carries an `ETag` and `Last-Modified` derived from the mailbox
+        change marker, so a client polling with `If-None-Match`/`If-Modified-Since`
+        gets an empty 304 response until a message is sent, received, read or deleted.
+        """
+        stats = get_mailbox_stats(request.user)
+        etag = mailbox_etag(request, stats)
+        response = not_modified_response(request, etag, stats.last_modified)
+        if response is not None:
+            return response
+
+        response = cached_response(
+            request, partial(self.list_page, request), data_version=stats.version
+        )
+        if response.status_code == status.HTTP_200_OK:
+            set_validators(response, etag, stats.last_modified)
+        return response
+
+    def list_page(self, request):
+        """
+        Fetch and serialize one page of messages, read as rows rather than model
+        instances (see `MessageRowSerializer`).
+
+        Returns:
+        - Response: The paginated messages.
+        """
+        queryset = self.as_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginator.paginate_queryset(queryset, request, view=self)
+        return self.get_paginated_response(
+            self.get_row_serializer().to_representation(page)
+        )
+
     def perform_create(self, serializer):
         """
         Perform creation of a message and set the sender as the currently authenticated user.
         """
-        logger.info(f"Creating new message for user: {self.request.user}")
-        serializer.save(sender=self.request.user)
-        logger.info(f"New message created: {serializer.data}")
+        logger.info("Creating new message for user: %s", self.request.user.id)
+        message = run_write(self.create_message, serializer)
+        logger.info("New message created: %s", message.id)
+
+    def create_message(self, serializer):
+        """
+        Save a validated message with its thread, mailbox entries and counters.
+
+        Returns:
+        - Message: The created message.
+        """
+        with transaction.atomic():
+            pair = thread_pair(
+                self.request.user.id, serializer.validated_data["receiver"].id
+            )
+            message = serializer.save(
+                sender_id=self.request.user.id, thread_id=get_threads([pair])[pair]
+            )
+            record_entries_changed(added=mailbox_entry_rows([message]))
+            publish_messages_created([(message.id, message.receiver_id)])
+        return message
+
+
+class MessageBulkCreateView(generics.GenericAPIView):
+    """
+    API endpoint for sending many messages in a single request.
+
+    POST /api/v1/messages/bulk/
+    - Send one `subject`/`content` to every user id in `receivers`, and/or send the
+      individual `messages` (each with `receiver`, `subject` and `content`).
+    - Receivers are validated with one query and messages are written with batched
+      INSERTs inside a single transaction.
+    - Returns one result per message, in request order (`receivers` first, then
+      `messages`); invalid items are reported without rejecting the valid ones.
+    - Requires authentication.
+    - The `sender` field is automatically set to the authenticated user.
+    """
+
+    serializer_class = MessageBulkCreateSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validate the bulk request and create its messages.
+
+        Returns:
+        - Response: The number of created and failed messages and the per-item results.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = self.perform_bulk_create(serializer.validated_data)
+
+        created = sum(1 for result in results if result["status"] == "created")
+        logger.info(
+            "User %s sent %s of %s bulk messages",
+            request.user.id,
+            created,
+            len(results),
+        )
+        return Response(
+            {"created": created, "failed": len(results) - created, "results": results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def get_items(self, data):
+        """
+        Flatten the request into `(receiver_id, subject, content, errors)` tuples.
+        """
+        items = [
+            (receiver_id, data["subject"], data["content"], None)
+            for receiver_id in data["receivers"]
+        ]
+        for message in data["messages"]:
+            item_serializer = BulkMessageItemSerializer(data=message)
+            if item_serializer.is_valid():
+                item = item_serializer.validated_data
+                items.append((item["receiver"], item["subject"], item["content"], None))
+            else:
+                items.append(
+                    (message.get("receiver"), None, None, item_serializer.errors)
+                )
+        return items
+
+    def perform_bulk_create(self, data):
+        """
+        Create the valid messages of a bulk request in batches.
+
+        Returns:
+        - list: One result dictionary per requested message.
+        """
+        items = self.get_items(data)
+        receiver_ids = {item[0] for item in items if item[3] is None}
+        existing_ids = set(
+            User.objects.filter(id__in=receiver_ids).values_list("id", flat=True)
+        )
+
+        sender_id = self.request.user.id
+        batch_size = settings.MESSAGE_BULK_BATCH_SIZE
+        results = []
+        with transaction.atomic():
+            for start in range(0, len(items), batch_size):
+                batch_results = []
+                messages = []
+                for index, (receiver_id, subject, content, errors) in enumerate(
+                    items[start : start + batch_size], start
+                ):
+                    result = {"index": index, "receiver": receiver_id}
+                    if errors is None and receiver_id not in existing_ids:
+                        errors = {
+                            "receiver": [
+                                f'Invalid pk "{receiver_id}" - object does not exist.'
+                            ]
+                        }
+                    if errors is None:
+                        messages.append(
+                            Message(
+                                sender_id=sender_id,
+                                receiver_id=receiver_id,
+                                subject=subject,
+                                content=content,
+                            )
+                        )
+                        result["status"] = "created"
+                    else:
+                        result.update(status="error", errors=errors)
+                    batch_results.append(result)
+
+                assign_threads(messages)
+                created = iter(Message.objects.bulk_create(messages))
+                for result in batch_results:
+                    if result["status"] == "created":
+                        result["id"] = next(created).id
+                MailboxEntry.objects.create_for_messages(messages)
+                record_entries_changed(added=mailbox_entry_rows(messages))
+                publish_messages_created(
+                    (message.id, message.receiver_id) for message in messages
+                )
+                results.extend(batch_results)
+        return results
+
+
+class MessageBulkDeleteView(generics.GenericAPIView):
+    """
+    API endpoint for deleting many messages at once.
+
+    POST /api/v1/messages/bulk-delete/
+    - Delete the messages whose ids are listed in `ids`.
+    - Only the sender or the receiver of a message can delete it; other ids are ignored.
+    - Messages are deleted in short batches so no single transaction holds locks for long.
+    - Requires authentication.
+    """
+
+    serializer_class = MessageBulkDeleteSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Delete the selected messages.
+
+        Returns:
+        - Response: The number of deleted messages.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+
+        deleted = 0
+        batch_size = settings.MESSAGE_BULK_BATCH_SIZE
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start : start + batch_size]
+            with transaction.atomic():
+                deleted += delete_messages_for_user(request.user, batch)
+                deleted += delete_cold_messages_for_user(request.user, batch)
+        logger.info("User %s bulk deleted %s messages", request.user.id, deleted)
+
+        return Response({"deleted": deleted})
+
+
+class MessageMarkReadView(generics.GenericAPIView):
+    """
+    API endpoint for marking many received messages as read or unread at once.
+
+    POST /api/v1/messages/mark-read/
+    - Select the messages with exactly one of `ids`, `before` (created before the given
+      timestamp) or `all`.
+    - Set `is_read` to `false` to mark the messages as unread instead.
+    - Only messages received by the authenticated user are changed, with a single UPDATE
+      per storage tier (hot and cold messages).
+    - Requires authentication.
+    """
+
+    serializer_class = MessageMarkReadSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Change the read state of the selected messages.
+
+        Returns:
+        - Response: The number of messages whose read state changed.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = run_write(self.mark_read, request, serializer.validated_data)
+
+        return Response({"updated": updated})
+
+    def mark_read(self, request, data):
+        """
+        Change the read state of the messages selected by the validated request data.
+
+        Returns:
+        - int: The number of messages whose read state changed.
+        """
+        with transaction.atomic():
+            rows = []
+            updated = 0
+            # Messages the user deleted keep their read state
+            for messages in (
+                get_user_related_messages(request.user),
+                get_user_cold_messages(request.user),
+            ):
+                queryset = messages.filter(
+                    receiver_id=request.user.id, is_read=not data["is_read"]
+                )
+                if data.get("ids") is not None:
+                    queryset = queryset.filter(id__in=data["ids"])
+                elif data.get("before") is not None:
+                    queryset = queryset.filter(created_at__lt=data["before"])
+
+                # Read receipts and the senders' caches need the messages about to
+                # change
+                tier_rows = list(
+                    queryset.select_for_update().values_list(
+                        "id", "sender_id", "thread_id"
+                    )
+                )
+                if tier_rows:
+                    updated += queryset.update(
+                        is_read=data["is_read"], updated_at=timezone.now()
+                    )
+                    rows += tier_rows
+            record_messages_read(request.user.id, updated, is_read=data["is_read"])
+            record_thread_messages_read(
+                ((thread_id, request.user.id) for _, _, thread_id in rows),
+                is_read=data["is_read"],
+            )
+            if data["is_read"]:
+                publish_messages_read(
+                    [(message_id, sender_id) for message_id, sender_id, _ in rows],
+                    request.user.id,
+                )
+            mark_mailboxes_changed(
+                [request.user.id] + [sender_id for _, sender_id, _ in rows]
+            )
+        logger.info(
+            "User %s set is_read=%s on %s messages",
+            request.user.id,
+            data["is_read"],
+            updated,
+        )
+        return updated
+
+
+class MessageArchiveView(generics.GenericAPIView):
+    """
+    API endpoint for archiving messages.
+
+    POST /api/v1/messages/archive/
+    - Archive (or, with `archived: false`, unarchive) the messages listed in `ids`.
+    - Archiving only affects the authenticated user's mailbox; list the archive with
+      `GET /api/v1/messages/?archived=true`.
+    - Ids outside the user's mailbox are ignored.
+    - Requires authentication.
+    """
+
+    serializer_class = MessageArchiveSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Change the archived state of the selected messages.
+
+        Returns:
+        - Response: The number of messages whose archived state changed.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        with transaction.atomic():
+            updated = (
+                MailboxEntry.objects.filter(
+                    user_id=request.user.id,
+                    message_id__in=data["ids"],
+                    is_deleted=False,
+                )
+                .exclude(is_archived=data["archived"])
+                .update(is_archived=data["archived"])
+            )
+            updated += (
+                ColdMailboxEntry.objects.filter(
+                    user_id=request.user.id, message_id__in=data["ids"]
+                )
+                .exclude(is_archived=data["archived"])
+                .update(is_archived=data["archived"])
+            )
+            if updated:
+                mark_mailboxes_changed([request.user.id])
+        logger.info(
+            "User %s set archived=%s on %s messages",
+            request.user.id,
+            data["archived"],
+            updated,
+        )
+
+        return Response({"updated": updated})
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Sync token expired; fetch the full message list and sync again."
+    default_code = "sync_token_expired"
+
+
+class MessageSyncView(generics.GenericAPIView):
+    """
+    API endpoint for incremental ("changes since") mailbox synchronization.
+
+    GET /api/v1/messages/sync/?token=<token>
+    - Return the messages created or updated (`changed`) and the ids of messages
+      removed (`deleted`) from the authenticated user's mailbox since the sync `token`.
+    - Without a token, every message of the mailbox is returned as changed.
+    - Pass the returned `token` to the next call; while `has_more` is true, call again
+      right away to fetch the rest. `page_size` limits the size of each response.
+    - Responds with 410 Gone when the token is older than the tombstone retention.
+    - Requires authentication.
+    """
+
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+    filter_backends = []
+
+    def get(self, request, *args, **kwargs):
+        """
+        Return the changes since the given sync token.
+
+        Returns:
+        - Response: The changed messages, deleted ids, next token and `has_more` flag.
+        """
+        token = request.query_params.get("token")
+        if token is None:
+            messages_position, tombstones_position = None, initial_tombstones_position()
+        else:
+            try:
+                messages_position, tombstones_position = decode_sync_token(token)
+            except ValueError as error:
+                raise ValidationError({"token": [str(error)]})
+            if is_sync_token_expired(tombstones_position):
+                raise SyncTokenExpired()
+
+        changes = get_sync_changes(
+            request.user,
+            messages_position,
+            tombstones_position,
+            MessageCursorPagination().get_page_size(request),
+        )
+        logger.info(
+            "Synced %s changed and %s deleted messages for user %s",
+            len(changes.changed),
+            len(changes.deleted),
+            request.user.id,
+        )
+
+        return Response(
+            {
+                "changed": self.get_serializer(changes.changed, many=True).data,
+                "deleted": changes.deleted,
+                "token": encode_sync_token(
+                    changes.messages_position, changes.tombstones_position
+                ),
+                "has_more": changes.has_more,
+            }
+        )
 
 
 class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
@@ -70,7 +823,7 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     API endpoint for retrieving, updating, and deleting messages.
 
     GET /api/v1/messages/{id}/
-    - Retrieve a specific message.
+    - Retrieve a specific message, including one moved to cold storage.
     - If the authenticated user is the receiver, the message will be marked as read.
     - Requires authentication.
 
@@ -82,6 +835,7 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     PATCH /api/v1/messages/{id}/
     - Partially update a specific message.
     - Only the sender of the message can update it.
+    - Messages moved to cold storage cannot be updated.
     - Requires authentication.
 
     DELETE /api/v1/messages/{id}/
@@ -92,7 +846,7 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [MessageJWTAuthentication]
 
     def get_queryset(self):
         """
@@ -106,24 +860,121 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return Message.objects.none()
 
         user = self.request.user
-        logger.info(f"Retrieving messages for user: {user}")
+        logger.info("Retrieving messages for user: %s", user.id)
         return get_user_related_messages(user)
 
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve a message and mark it as read if the receiver is the currently authenticated user.
 
+        Returns:
+        - Response: A response containing the retrieved message, or an empty 304
+          response if the client's copy (`If-None-Match`) is still current.
+        """
+        row = None
+        for messages in (
+            get_user_related_messages(request.user),
+            get_user_cold_messages(request.user),
+        ):
+            row = (
+                messages.filter(pk=kwargs["pk"])
+                .values_list("updated_at", "receiver_id", "is_read")
+                .first()
+            )
+            if row is not None:
+                break
+        # An unread message must still be marked as read when its receiver fetches it
+        if row is not None and (row[1] != request.user.id or row[2]):
+            updated_at = row[0]
+            response = not_modified_response(
+                request, message_etag(kwargs["pk"], updated_at), updated_at
+            )
+            if response is not None:
+                return response
+
+        response = cached_response(
+            request,
+            partial(self.retrieve_and_mark_read, request, *args, **kwargs),
+            # A cached unread copy must not bypass marking the message as read
+            is_reusable=lambda data: data["is_read"]
+            or data["receiver"] != request.user.id,
+            data_version=row and row[0],
+        )
+        # A cached response carries no validators; they are only known if the probe
+        # found the message, which may have been deleted in between
+        if (
+            response.status_code == status.HTTP_200_OK
+            and "ETag" not in response
+            and row is not None
+        ):
+            set_validators(response, message_etag(kwargs["pk"], row[0]), row[0])
+        return response
+
+    def retrieve_and_mark_read(self, request, *args, **kwargs):
+        """
+        Load the message and mark it as read if the receiver is the authenticated user.
+
         Returns:
         - Response: A response containing the retrieved message.
         """
         instance = self.get_object()
-        if instance.receiver == request.user:
-            instance.is_read = True
-            instance.save()
-            logger.info(f"Marked message as read: {instance.id}")
+        if instance.receiver_id == request.user.id and not instance.is_read:
+            run_write(self.mark_read, instance)
+        return self.message_response(instance)
+
+    def mark_read(self, instance):
+        """
+        Mark a message fetched by its receiver as read, updating it in place.
+        """
+        # Only flip the flag if no concurrent request has done so already
+        with transaction.atomic():
+            instance.updated_at = timezone.now()
+            updated = (
+                type(instance)
+                .objects.filter(pk=instance.pk, is_read=False)
+                .update(is_read=True, updated_at=instance.updated_at)
+            )
+            record_messages_read(instance.receiver_id, updated)
+            if updated:
+                record_thread_messages_read(
+                    [(instance.thread_id, instance.receiver_id)]
+                )
+                publish_messages_read(
+                    [(instance.id, instance.sender_id)], instance.receiver_id
+                )
+                mark_mailboxes_changed([instance.sender_id, instance.receiver_id])
+        instance.is_read = True
+        logger.info("Marked message as read: %s", instance.id)
+
+    def message_response(self, instance):
+        """
+        Serialize a message with its validators.
+
+        Returns:
+        - Response: A response containing the message.
+        """
         serializer = self.get_serializer(instance)
-        logger.info(f"Retrieved message: {serializer.data}")
-        return Response(serializer.data)
+        logger.info("Retrieved message: %s", instance.id)
+        response = Response(serializer.data)
+        return set_validators(
+            response,
+            message_etag(instance.id, instance.updated_at),
+            instance.updated_at,
+        )
+
+    def get_object(self):
+        """
+        Return the message, reading through to the user's cold messages for reads
+        and deletes; cold messages cannot be edited.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method in ("PUT", "PATCH"):
+                raise
+            return generics.get_object_or_404(
+                get_user_cold_messages(self.request.user), pk=self.kwargs["pk"]
+            )
 
     def update(self, request, *args, **kwargs):
         """
@@ -134,21 +985,104 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         """
         instance = self.get_object()
 
-        if instance.sender != request.user:
+        if instance.sender_id != request.user.id:
             logger.warning(
-                f"User {request.user} attempted to update message {instance.id} but is not authorized."
+                "User %s attempted to update message %s but is not authorized.",
+                request.user.id,
+                instance.id,
             )
             return Response(
                 {"message": "You are not authorized to update this message."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
+        etags = if_match_etags(request)
+        if etags is not None and not self.matches_etags(instance, etags):
+            return self.precondition_failed(instance)
+
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-        logger.info(f"Message {instance.id} updated by user {request.user}")
+        with transaction.atomic():
+            receiver = serializer.validated_data.get("receiver")
+            moving = receiver is not None and receiver.id != instance.receiver_id
+            if moving:
+                # The message moves to the thread with the new receiver
+                pair = thread_pair(instance.sender_id, receiver.id)
+                serializer.validated_data["thread_id"] = get_threads([pair])[pair]
+                removed = live_entry_rows(
+                    MailboxEntry.objects.filter(message_id=instance.id)
+                )
+            if etags is None:
+                self.perform_update(serializer)
+            elif not self.compare_and_update(instance, serializer.validated_data):
+                # Another request changed the message after it was loaded
+                return self.precondition_failed(instance)
+            if moving:
+                # The message leaves the old receiver's mailbox for the new one's
+                MailboxEntry.objects.filter(message_id=instance.id).exclude(
+                    user_id=instance.sender_id
+                ).delete()
+                MailboxEntry.objects.create_for_messages([instance])
+                record_entries_changed(
+                    added=mailbox_entry_rows([instance]), removed=removed
+                )
+            else:
+                if "content" in serializer.validated_data:
+                    refresh_thread_summaries([instance.thread_id])
+                mark_mailboxes_changed([instance.sender_id, instance.receiver_id])
+        logger.info("Message %s updated by user %s", instance.id, request.user.id)
+
+        response = Response(serializer.data)
+        return set_validators(
+            response,
+            message_etag(instance.id, instance.updated_at),
+            instance.updated_at,
+        )
+
+    def matches_etags(self, instance, etags):
+        """
+        Check whether the message's current ETag satisfies an `If-Match` header.
+        """
+        return "*" in etags or message_etag(instance.id, instance.updated_at) in etags
+
+    def compare_and_update(self, instance, validated_data):
+        """
+        Apply an update only if the message is unchanged since it was loaded.
+
+        Parameters:
+        - instance (Message): The loaded message; updated in place on success.
+        - validated_data (dict): The validated fields to write.
+
+        Returns:
+        - bool: False if a concurrent write changed the message first.
+        """
+        updated_at = timezone.now()
+        updated = Message.objects.filter(
+            pk=instance.pk, updated_at=instance.updated_at
+        ).update(updated_at=updated_at, **validated_data)
+        if not updated:
+            return False
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.updated_at = updated_at
+        return True
 
-        return Response(serializer.data)
+    def precondition_failed(self, instance):
+        """
+        Reject a conditional update whose `If-Match` ETag is stale.
+        """
+        logger.warning(
+            "Rejected update of message %s: the client's copy is stale.", instance.id
+        )
+        response = Response(
+            {"message": "The message has been modified since it was retrieved."},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+        return set_validators(
+            response,
+            message_etag(instance.id, instance.updated_at),
+            instance.updated_at,
+        )
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -159,10 +1093,132 @@ class MessageRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         """
 
         instance = self.get_object()
-        logger.info(f"Deleting message {instance.id} by user {request.user}")
-        self.perform_destroy(instance)
+        logger.info("Deleting message %s by user %s", instance.id, request.user.id)
+        with transaction.atomic():
+            self.perform_destroy(instance)
 
         return Response(
             {"message": "Message deleted successfully."},
             status=status.HTTP_204_NO_CONTENT,
         )
+
+    def perform_destroy(self, instance):
+        """
+        Remove the message from the user's mailbox; the other participant keeps it.
+        """
+        if isinstance(instance, ColdMessage):
+            delete_cold_messages_for_user(self.request.user, [instance.pk])
+        else:
+            delete_messages_for_user(self.request.user, [instance.pk])
+
+
+class MessageEventStreamView(View):
+    """
+    Server-Sent Events stream of the authenticated user's mailbox events.
+
+    GET /api/v1/messages/events/
+    - Streams `message.created` events (with the new message's id, to be fetched
+      from the detail endpoint) to its receiver and
+      `message.read` read receipts (with the read message ids) to the sender.
+    - Sends a comment line every `MESSAGE_EVENTS_KEEPALIVE_SECONDS` to keep proxies
+      from closing idle connections, and a `resync` event before closing the stream
+      if the client fell too far behind.
+    - Requires a JWT access token in the `Authorization` header.
+    - Must be served by an ASGI server: each idle connection is a suspended coroutine
+      rather than an occupied worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        user = await sync_to_async(authenticate_jwt)(request)
+        if user is None:
+            return JsonResponse(
+                {
+                    "detail": "Authentication credentials were not provided or are invalid."
+                },
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        logger.info("Opening event stream for user: %s", user.id)
+        response = StreamingHttpResponse(
+            self.stream(user.id), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user_id):
+        """
+        Yield the user's events in Server-Sent Events format until the client leaves.
+        """
+        with get_event_broker().subscribe(user_id) as subscription:
+            yield "retry: 5000\n\n"
+            while not subscription.overflowed:
+                try:
+                    event_type, data = await subscription.get(
+                        settings.MESSAGE_EVENTS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event_type}\ndata: {data}\n\n"
+            yield "event: resync\ndata: {}\n\n"
+
+
+class MailboxStatsView(generics.RetrieveAPIView):
+    """
+    API endpoint for the mailbox counters of the authenticated user.
+
+    GET /api/v1/messages/stats/
+    - Retrieve the number of unread, total and sent messages.
+    - Served from a maintained counter row, without counting messages.
+    - Requires authentication.
+    """
+
+    serializer_class = MailboxStatsSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+
+    def get_object(self):
+        """
+        Get the mailbox counters of the currently authenticated user.
+
+        Returns:
+        - MailboxStats: The counters of the authenticated user.
+        """
+        return get_mailbox_stats(self.request.user)
+
+
+class ThreadListView(generics.ListAPIView):
+    """
+    API endpoint for the conversation threads of the authenticated user.
+
+    GET /api/v1/threads/
+    - List one entry per user the authenticated user has exchanged messages with,
+      most recently active first.
+    - Each entry carries the last message (`last_message`, `last_snippet`, `last_at`)
+      and the number of unread messages, read from a maintained summary row.
+    - Fetch the messages of a thread with `GET /api/v1/messages/?thread=<id>`.
+    - Results are cursor-paginated; use `page_size` to change the page size.
+    - Requires authentication.
+    """
+
+    serializer_class = ThreadSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [MessageJWTAuthentication]
+    pagination_class = ThreadCursorPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        """
+        Get the thread summaries of the currently authenticated user.
+
+        Returns:
+        - QuerySet: The user's threads that still contain messages.
+        """
+        # Check if this is a swagger_fake_view
+        if getattr(self, "swagger_fake_view", False):
+            return ThreadParticipant.objects.none()
+
+        return ThreadParticipant.objects.filter(
+            user_id=self.request.user.id, last_at__isnull=False
+        )
@@ -0,0 +1,170 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connection, transaction
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Run small write transactions from a single background thread, committing the
+    writes queued up together in one transaction.
+
+    Writes from the request threads of a process no longer compete for the
+    database write lock (on SQLite, one writer at a time per file), and a burst of
+    writes pays for one commit instead of one each. Every write runs in its own
+    savepoint, so a failing write is rolled back and reported to its caller without
+    affecting the others in the batch.
+    """
+
+    def __init__(self, batch_size, max_wait):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self.run, name="message-write-queue", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """
+        Run `function(*args)` in the writer thread and wait for its result.
+
+        The function runs in a copy of the caller's context, so the request id and
+        metrics of the calling request still apply.
+        """
+        future = Future()
+        self.queue.put((future, contextvars.copy_context(), function, args))
+        return future.result()
+
+    def stop(self):
+        """
+        Run the writes already queued, then stop the writer thread and close its
+        database connection.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        try:
+            try:
+                # Connect before any request waits on a write: with a connection
+                # pool, waiting request threads could otherwise hold every
+                # connection the writer needs
+                connection.ensure_connection()
+            except DatabaseError:
+                logger.exception("Write queue could not connect; retrying per batch")
+            while self.run_next_batch():
+                pass
+        finally:
+            connection.close()
+
+    def run_next_batch(self):
+        """
+        Wait for writes and run up to `batch_size` of them, including those queued
+        within `max_wait` seconds of the first.
+
+        Returns:
+        - bool: False once the queue has been stopped.
+        """
+        item = self.queue.get()
+        if item is None:
+            return False
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                self.run_batch(batch)
+                return False
+            batch.append(item)
+        self.run_batch(batch)
+        return True
+
+    def run_batch(self, batch):
+        results = []
+        try:
+            with transaction.atomic():
+                for future, context, function, args in batch:
+                    try:
+                        with transaction.atomic():
+                            result = context.run(function, *args)
+                    except Exception as error:
+                        results.append((future, None, error))
+                    else:
+                        results.append((future, result, None))
+        except Exception as error:
+            # The commit itself failed, so none of the writes happened
+            logger.exception("Write batch of %s failed", len(batch))
+            # Start the next batch on a fresh connection, in case this one broke
+            connection.close()
+            for future, *_ in batch:
+                future.set_exception(error)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+# Held while the write queue is created, so that concurrent first writes don't
+# each start a writer thread
+write_queue_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_write_queue():
+    """
+    Return the write queue, or None if `MESSAGE_WRITE_QUEUE_ENABLED` is off.
+    """
+    if not settings.MESSAGE_WRITE_QUEUE_ENABLED:
+        return None
+    with write_queue_lock:
+        return _create_write_queue()
+
+
+@lru_cache(maxsize=None)
+def _create_write_queue():
+    return WriteQueue(
+        settings.MESSAGE_WRITE_QUEUE_BATCH_SIZE, settings.MESSAGE_WRITE_QUEUE_MAX_WAIT
+    )
+
+
+@receiver(setting_changed)
+def reset_write_queue(setting, **kwargs):
+    if setting.startswith("MESSAGE_WRITE_QUEUE_"):
+        with write_queue_lock:
+            if _create_write_queue.cache_info().currsize:
+                _create_write_queue().stop()
+            _create_write_queue.cache_clear()
+        get_write_queue.cache_clear()
+
+
+def run_write(function, *args):
+    """
+    Run a small write, `function(*args)`, through the write queue if it is enabled.
+
+    Writes requested inside a transaction run inline, as the writer thread could
+    not see that transaction's changes and would wait for its lock.
+
+    Returns:
+    - The return value of `function`.
+    """
+    write_queue = get_write_queue()
+    if write_queue is None or connection.in_atomic_block:
+        return function(*args)
+    return write_queue.submit(function, *args)
@@ -0,0 +1,109 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking its connections from a per-process connection pool.
+
+    With a `pool` option (a dict of `psycopg_pool.ConnectionPool` arguments such as
+    `min_size` and `max_size`, or True for the defaults), the threads of a worker
+    process share a pool of open connections: a request borrows one on its first
+    query and hands it back when Django closes the connection at the end of the
+    request, instead of connecting and disconnecting every time. Without the option
+    this is Django's PostgreSQL backend. Django 5.1 ships the same option; this
+    backend can be dropped once the project upgrades.
+    """
+
+    creation_class = DatabaseCreation
+
+    # One pool per alias, shared by the threads of the process
+    _connection_pools = {}
+    # The pool the open connection was borrowed from, if any
+    checkout_pool = None
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict["OPTIONS"].get("pool")
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        if self.alias not in self._connection_pools:
+            if self.settings_dict["CONN_MAX_AGE"] != 0:
+                raise ImproperlyConfigured(
+                    "Pooled connections can't be persistent; set CONN_MAX_AGE to 0."
+                )
+            if pool_options is True:
+                pool_options = {}
+            try:
+                from psycopg_pool import ConnectionPool
+            except ImportError as error:
+                raise ImproperlyConfigured(
+                    "The pool option requires the psycopg-pool package."
+                ) from error
+
+            kwargs = self.get_connection_params()
+            # Connections are handed out in autocommit mode; Django sets it anyway
+            kwargs["autocommit"] = True
+            pool = ConnectionPool(
+                kwargs=kwargs,
+                # Opened on first use, so processes that never query don't connect
+                open=False,
+                check=(
+                    ConnectionPool.check_connection
+                    if self.settings_dict["CONN_HEALTH_CHECKS"]
+                    else None
+                ),
+                **pool_options,
+            )
+            # Two threads may build a pool at once; the first one stored is used
+            self._connection_pools.setdefault(self.alias, pool)
+
+        return self._connection_pools[self.alias]
+
+    def close_pool(self):
+        """
+        Close the pool of this alias and all of its connections.
+        """
+        pool = self._connection_pools.pop(self.alias, None)
+        if pool is not None:
+            pool.close()
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop("pool", None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = base.IsolationLevel(
+                options.get("isolation_level", base.IsolationLevel.READ_COMMITTED)
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {options['isolation_level']} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+        pool.open()
+        connection = pool.getconn()
+        connection.isolation_level = self.isolation_level
+        self.checkout_pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.checkout_pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # Return it to the pool it came from, which is no longer this alias'
+            # pool if the settings changed in between (e.g. in tests)
+            self.checkout_pool.putconn(self.connection)
+        # The connection may now be handed to another thread; never touch it again
+        self.connection = None
+        self.checkout_pool = None
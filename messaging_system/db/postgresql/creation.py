@@ -0,0 +1,14 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        # Pooled connections are bound to the database they were opened on; the
+        # pool is rebuilt for the test database on the next query
+        self.connection.close_pool()
+        return super()._create_test_db(verbosity, autoclobber, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Release the pooled connections, which would keep the database in use
+        self.connection.close_pool()
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,101 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Hint naming the user whose mailbox a queryset reads (see
+# `message.utils.get_user_related_messages`); only such reads may use a replica
+REPLICA_USER_HINT = "replica_user_id"
+
+# The routing state of the request being handled (see `ReplicaRoutingMiddleware`)
+request_routing_var = ContextVar("request_routing", default=None)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RequestRouting:
+    """
+    Where the reads of one request go, and whether it wrote to the primary.
+    """
+
+    def __init__(self, method):
+        self.read_only = method in SAFE_METHODS
+        self.wrote = False
+        # One replica per request, so all its reads see the same replication lag
+        self.replica = random.choice(settings.DATABASE_REPLICA_ALIASES)
+        self.pinned_users = {}
+
+    def is_pinned(self, user_id):
+        if user_id not in self.pinned_users:
+            self.pinned_users[user_id] = is_pinned_to_primary(user_id)
+        return self.pinned_users[user_id]
+
+
+def pin_to_primary(user_id):
+    """
+    Send the user's mailbox reads to the primary for `DATABASE_REPLICA_PIN_SECONDS`,
+    until the replicas have caught up with the user's writes.
+    """
+    caches[settings.DATABASE_REPLICA_PIN_CACHE].set(
+        f"replica-pin:{user_id}", True, settings.DATABASE_REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned_to_primary(user_id):
+    return bool(
+        caches[settings.DATABASE_REPLICA_PIN_CACHE].get(f"replica-pin:{user_id}")
+    )
+
+
+class ReplicaRouter:
+    """
+    Send mailbox reads to a read replica and everything else to the primary.
+
+    Only querysets carrying the `replica_user_id` hint, i.e. those built by
+    `get_user_related_messages`, are read from one of `DATABASE_REPLICA_ALIASES`,
+    and only while handling a GET/HEAD/OPTIONS request. They stay on the primary:
+    - in requests that write (POST/PUT/PATCH/DELETE), so updates, deletes and
+      mark-read load the rows they change from the primary;
+    - inside a transaction on the primary, which must read its own writes;
+    - while the user is pinned to the primary after writing (see `pin_to_primary`),
+      so they read their own writes despite replication lag.
+
+    Without replicas configured the router has no opinion.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            return None
+        routing = request_routing_var.get()
+        user_id = hints.get(REPLICA_USER_HINT)
+        if (
+            user_id is None
+            or routing is None
+            or not routing.read_only
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or routing.is_pinned(user_id)
+        ):
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            return None
+        routing = request_routing_var.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICA_ALIASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICA_ALIASES:
+            return False
+        return None
@@ -0,0 +1,28 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for several worker processes sharing one database file.
+
+    The `PRAGMA` statements listed in the `pragmas` option (e.g. `journal_mode=wal`,
+    so readers don't block behind a writer) are run on every new connection, and
+    transactions start with `BEGIN IMMEDIATE`. A deferred `BEGIN` only takes the
+    write lock at the first write, and a transaction that fails to upgrade its read
+    lock gets "database is locked" at once, without waiting for the busy `timeout`;
+    taking the lock up front makes writers queue on the busy timeout instead.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop("pragmas", None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -0,0 +1,128 @@
+import copy
+import json
+import logging
+import queue
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# The id of the request being handled, attached to every record logged while
+# handling it (see `messaging_system.middleware.RequestIDMiddleware`)
+request_id_var = ContextVar("request_id", default=None)
+
+# Attributes every `LogRecord` has; anything else on a record came from `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class RequestIDFilter(logging.Filter):
+    """
+    Stamp records with the id of the current request, as `request_id`.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a random `rate` fraction of the records at or below INFO.
+
+    Warnings and errors are always kept. A record logged with
+    `extra={"sampled": False}` is always kept too.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not getattr(record, "sampled", True):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Besides the time, level, logger, message and request id, the object carries the
+    fields passed to the logging call with `extra`.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    Log to a file from a background thread.
+
+    The calling thread merges the message with its arguments and puts a copy of the
+    record on a bounded in-memory queue; formatting the entry and writing the file
+    happen in a listener thread. When the queue is full the record is dropped and
+    counted in `dropped`, rather than blocking the caller.
+    """
+
+    def __init__(self, filename, queue_size=10000):
+        # Created first, so that `logging.shutdown` closes this handler (and drains
+        # the queue into the file) before it closes the file handler
+        self.file_handler = logging.FileHandler(filename)
+        super().__init__(queue.Queue(queue_size))
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # Records are formatted in the listener thread, by the file handler
+        self.file_handler.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Return a copy of the record with its message and traceback rendered.
+
+        Unlike `QueueHandler.prepare`, the record is not formatted here: only
+        `getMessage` runs in the calling thread, so arguments are rendered as they
+        were when logged, while the file handler's formatter still sees the
+        record's other attributes.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                formatter = self.file_handler.formatter or logging.Formatter()
+                record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.file_handler.close()
+        super().close()
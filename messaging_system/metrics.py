@@ -0,0 +1,209 @@
+import bisect
+import hmac
+import ipaddress
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+
+# The metrics of the request being handled (see `MetricsMiddleware`)
+request_metrics_var = ContextVar("request_metrics", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values, as exposed by Prometheus.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-local request metrics, keyed by metric name and label values.
+
+    Each worker process keeps its own registry, so a deployment with several workers
+    exposes the metrics of whichever worker answers the scrape.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = Counter()
+        self.help = {}
+
+    def observe(self, name, labels, value, buckets, help_text):
+        with self.lock:
+            self.help[name] = help_text
+            key = (name, tuple(sorted(labels.items())))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels, help_text):
+        with self.lock:
+            self.help[name] = help_text
+            self.counters[(name, tuple(sorted(labels.items())))] += 1
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines += [f"# HELP {name} {self.help[name]}", f"# TYPE {name} counter"]
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines += [
+                    f"# HELP {name} {self.help[name]}",
+                    f"# TYPE {name} histogram",
+                ]
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    bounds = [*map(str, histogram.buckets), "+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        bucket_labels = format_labels(labels + (("le", bound),))
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(
+                        f"{name}_count{format_labels(labels)} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    escaped = (
+        (key, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """
+    Queries and timings collected while handling one request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        # Identical SQL run many times in one request is the mark of an N+1 query
+        self.statements = Counter()
+
+
+def render_response(response):
+    """
+    Render a response, adding the time it takes to the current request's metrics.
+
+    For responses rendered inside the view, e.g. by the async views, which the
+    middleware's post-render hook never sees.
+    """
+    metrics = request_metrics_var.get()
+    start = time.perf_counter()
+    try:
+        return response.render()
+    finally:
+        if metrics is not None:
+            metrics.render_time += time.perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting and timing the queries of the current request.
+    """
+    metrics = request_metrics_var.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.query_count += 1
+        metrics.statements[sql] += 1
+
+
+def instrument_connection(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    # Connections are per thread, so those opened by worker threads (e.g. for the
+    # async views' ORM calls) are instrumented as they are created
+    instrument_connection(connection)
+
+
+def instrument_connections():
+    """
+    Instrument the database connections of the current thread.
+    """
+    for connection in connections.all():
+        instrument_connection(connection)
+
+
+def is_scraper(request):
+    """
+    Whether the request comes from an allowed network or carries `METRICS_TOKEN`.
+    """
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in network for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """
+    Expose the request metrics of this process to Prometheus.
+
+    GET /metrics
+    - Only served when `METRICS_ENABLED` is on, to clients in
+      `METRICS_ALLOWED_NETWORKS` or sending `Authorization: Bearer <METRICS_TOKEN>`;
+      others get 403.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not is_scraper(request):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
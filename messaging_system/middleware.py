@@ -0,0 +1,244 @@
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .db.routers import RequestRouting, pin_to_primary, request_routing_var
+from .log import request_id_var
+from .metrics import (
+    DURATION_BUCKETS,
+    QUERY_COUNT_BUCKETS,
+    RequestMetrics,
+    instrument_connections,
+    registry,
+    request_metrics_var,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Ids passed in by a proxy are only trusted if they look like ids
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIDMiddleware:
+    """
+    Give every request an id, attached to the records it logs and returned in the
+    `X-Request-ID` response header.
+
+    A well-formed `X-Request-ID` request header (e.g. set by a load balancer) is
+    reused, so the logs of the proxy and the app can be joined.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    def start(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return request_id_var.set(request_id)
+
+
+class MetricsMiddleware:
+    """
+    Measure the database queries and time spent on every request.
+
+    Enabled by `METRICS_ENABLED`. The query count, database time, response
+    rendering time and total time of a request are returned in the
+    `Server-Timing` header and added to per-view histograms served at `/metrics`.
+    A request running more than `METRICS_QUERY_BUDGET` queries is logged as a
+    warning, with the statement it repeated most, to catch N+1 queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        instrument_connections()
+        metrics = RequestMetrics()
+        token = request_metrics_var.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_metrics_var.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = request_metrics_var.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_metrics_var.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time the rendering.
+        # Views rendering their own responses time it with `render_response`
+        metrics = request_metrics_var.get()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, metrics):
+        """
+        Attach the `Server-Timing` header and update the histograms.
+        """
+        total = time.perf_counter() - metrics.started
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.query_count} queries"',
+                f"render;dur={metrics.render_time * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unmatched"
+        labels = {"view": view, "method": request.method}
+        registry.increment(
+            "http_requests_total",
+            {**labels, "status": response.status_code},
+            "Requests handled.",
+        )
+        for name, value, buckets, help_text in (
+            (
+                "http_request_duration_seconds",
+                total,
+                DURATION_BUCKETS,
+                "Time spent handling requests.",
+            ),
+            (
+                "http_request_db_duration_seconds",
+                metrics.db_time,
+                DURATION_BUCKETS,
+                "Time spent in database queries per request.",
+            ),
+            (
+                "http_request_render_duration_seconds",
+                metrics.render_time,
+                DURATION_BUCKETS,
+                "Time spent rendering responses.",
+            ),
+            (
+                "http_request_db_queries",
+                metrics.query_count,
+                QUERY_COUNT_BUCKETS,
+                "Database queries per request.",
+            ),
+        ):
+            registry.observe(name, labels, value, buckets, help_text)
+
+        if metrics.query_count > settings.METRICS_QUERY_BUDGET:
+            registry.increment(
+                "http_request_query_budget_exceeded_total",
+                {"view": view},
+                "Requests running more queries than METRICS_QUERY_BUDGET.",
+            )
+            statement, repeats = metrics.statements.most_common(1)[0]
+            logger.warning(
+                "%s %s ran %s queries (budget %s); most repeated (%s times): %s",
+                request.method,
+                view,
+                metrics.query_count,
+                settings.METRICS_QUERY_BUDGET,
+                repeats,
+                statement,
+                extra={"query_count": metrics.query_count, "view": view},
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track the reads and writes of every request for `ReplicaRouter`.
+
+    Enabled when `DATABASE_REPLICAS` configures read replicas. A request that
+    wrote to the primary pins its user's mailbox reads to the primary for
+    `DATABASE_REPLICA_PIN_SECONDS`, so the user reads their own writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request.method)
+        token = request_routing_var.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_routing_var.reset(token)
+        self.pin_writer(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request.method)
+        token = request_routing_var.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_routing_var.reset(token)
+        self.pin_writer(request, routing)
+        return response
+
+    def pin_writer(self, request, routing):
+        # The user is only known once the view has authenticated the request
+        user = getattr(request, "user", None)
+        if routing.wrote and user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import ipaddress
 import logging.config
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -30,7 +32,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
 ALLOWED_HOSTS = [
     "54.235.55.114",
@@ -59,6 +61,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "messaging_system.middleware.RequestIDMiddleware",
+    "messaging_system.middleware.MetricsMiddleware",
+    "messaging_system.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -92,13 +97,134 @@ WSGI_APPLICATION = "messaging_system.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# `DATABASE_ENGINE=postgresql` switches from the SQLite file to PostgreSQL, reached
+# with the `DATABASE_NAME`, `DATABASE_USER`, `DATABASE_PASSWORD`, `DATABASE_HOST` and
+# `DATABASE_PORT` variables.
+DATABASE_ENGINE = os.getenv("DATABASE_ENGINE", "sqlite")
+
+# Connections are kept open for `DATABASE_CONN_MAX_AGE` seconds and reused by the
+# later requests of the same worker thread (0 closes them after every request).
+# With health checks on, a reused connection is tested before its first query of a
+# request, so a database restart costs one reconnect instead of a failed request.
+DATABASE_CONN_MAX_AGE = int(os.getenv("DATABASE_CONN_MAX_AGE", 60))
+DATABASE_CONN_HEALTH_CHECKS = (
+    os.getenv("DATABASE_CONN_HEALTH_CHECKS", "true").lower() == "true"
+)
+
+# PostgreSQL connection pool: with `DATABASE_POOL_ENABLED=true` each worker process
+# keeps between `DATABASE_POOL_MIN_SIZE` and `DATABASE_POOL_MAX_SIZE` connections,
+# shared by its threads and handed back at the end of every request; a request
+# waits up to `DATABASE_POOL_TIMEOUT` seconds for a free one. Allow a connection per
+# request thread plus one for the write queue, and keep workers x max size below
+# the server's `max_connections`.
+DATABASE_POOL_ENABLED = os.getenv("DATABASE_POOL_ENABLED", "false").lower() == "true"
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", 2))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", 8))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", 10))
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "messaging_system.db.postgresql",
+            "NAME": os.getenv("DATABASE_NAME", "messaging_system"),
+            "USER": os.getenv("DATABASE_USER", "postgres"),
+            "PASSWORD": os.getenv("DATABASE_PASSWORD", ""),
+            "HOST": os.getenv("DATABASE_HOST", "localhost"),
+            "PORT": os.getenv("DATABASE_PORT", "5432"),
+            # Pooled connections go back to the pool instead of persisting
+            "CONN_MAX_AGE": 0 if DATABASE_POOL_ENABLED else DATABASE_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DATABASE_CONN_HEALTH_CHECKS,
+            "OPTIONS": {
+                "connect_timeout": int(os.getenv("DATABASE_CONNECT_TIMEOUT", 5)),
+            },
+        }
+    }
+    if DATABASE_POOL_ENABLED:
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": DATABASE_POOL_MIN_SIZE,
+            "max_size": DATABASE_POOL_MAX_SIZE,
+            "timeout": DATABASE_POOL_TIMEOUT,
+        }
+elif DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DATABASE_CONN_HEALTH_CHECKS,
+        }
     }
+else:
+    raise ImproperlyConfigured(
+        f"Unknown DATABASE_ENGINE {DATABASE_ENGINE!r}; use sqlite or postgresql."
+    )
+
+# `SQLITE_PROFILE=production` tunes SQLite for several gunicorn workers writing to
+# the same file: WAL journal (readers don't wait for writers), synchronous=NORMAL
+# (no fsync per commit in WAL mode), a memory-mapped read path, writers waiting up
+# to `SQLITE_BUSY_TIMEOUT` seconds for the lock, and `BEGIN IMMEDIATE` transactions.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_PRODUCTION_OPTIONS = {
+    "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", 5)),
+    "pragmas": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    },
 }
+if SQLITE_PROFILE == "production" and DATABASE_ENGINE == "sqlite":
+    DATABASES["default"].update(
+        {"ENGINE": "messaging_system.db.sqlite3", "OPTIONS": SQLITE_PRODUCTION_OPTIONS}
+    )
+
+# Read replicas: `DATABASE_REPLICAS` lists them comma-separated, as SQLite file paths
+# or as PostgreSQL `host:port` pairs sharing the primary's name and credentials.
+# Mailbox reads of GET requests go to a replica (see `ReplicaRouter`); a user who
+# wrote is pinned to the primary for `DATABASE_REPLICA_PIN_SECONDS`, recorded in
+# the `DATABASE_REPLICA_PIN_CACHE` cache, which must be shared by all workers.
+DATABASE_REPLICAS = [
+    replica.strip()
+    for replica in os.getenv("DATABASE_REPLICAS", "").split(",")
+    if replica.strip()
+]
+DATABASE_REPLICA_PIN_SECONDS = float(os.getenv("DATABASE_REPLICA_PIN_SECONDS", 5))
+DATABASE_REPLICA_PIN_CACHE = os.getenv("DATABASE_REPLICA_PIN_CACHE", "default")
+DATABASE_REPLICA_ALIASES = []
+for number, replica in enumerate(DATABASE_REPLICAS, start=1):
+    alias = f"replica{number}"
+    if DATABASE_ENGINE == "postgresql":
+        host, _, port = replica.partition(":")
+        location = {"HOST": host, "PORT": port or DATABASES["default"]["PORT"]}
+    else:
+        location = {"NAME": replica}
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        **location,
+        "OPTIONS": dict(DATABASES["default"].get("OPTIONS", {})),
+        # Tests read the replicas through the test database
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICA_ALIASES.append(alias)
 
+DATABASE_ROUTERS = ["messaging_system.db.routers.ReplicaRouter"]
+
+
+AUTHENTICATION_BACKENDS = ["accounts.backends.HashingPoolModelBackend"]
+
+# Password hashing pool: when enabled, registration and token issuance hash and verify
+# passwords in a pool of worker processes instead of the request worker. At most
+# ACCOUNTS_HASHING_MAX_PENDING operations run or wait per web process; further ones
+# get 429 with Retry-After, so a login storm cannot starve the message endpoints.
+# The limit is per web process, so the pool only helps with threaded (gunicorn
+# `--threads`) or ASGI workers; a sync worker handles one request at a time and
+# never rejects one. Every web process starts its own pool, i.e. web workers x
+# ACCOUNTS_HASHING_WORKERS hashing processes in total.
+ACCOUNTS_HASHING_POOL_ENABLED = (
+    os.getenv("ACCOUNTS_HASHING_POOL_ENABLED", "false").lower() == "true"
+)
+ACCOUNTS_HASHING_WORKERS = int(os.getenv("ACCOUNTS_HASHING_WORKERS", 2))
+ACCOUNTS_HASHING_MAX_PENDING = int(os.getenv("ACCOUNTS_HASHING_MAX_PENDING", 8))
+ACCOUNTS_HASHING_RETRY_AFTER = int(os.getenv("ACCOUNTS_HASHING_RETRY_AFTER", 1))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -126,8 +252,93 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # JSON responses are encoded with orjson when it is installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "messaging_system.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
+# Message list pagination
+# Clients may request a smaller or larger page with `?page_size=`, up to the cap.
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", 50))
+MESSAGE_MAX_PAGE_SIZE = int(os.getenv("MESSAGE_MAX_PAGE_SIZE", 200))
+
+# Bulk send: maximum messages per request and rows per INSERT batch
+MESSAGE_BULK_MAX_ITEMS = int(os.getenv("MESSAGE_BULK_MAX_ITEMS", 50000))
+MESSAGE_BULK_BATCH_SIZE = int(os.getenv("MESSAGE_BULK_BATCH_SIZE", 1000))
+
+# Delta sync: changes younger than the settle window are held back until in-flight
+# writes have committed; tombstones older than the retention make sync tokens expire.
+MESSAGE_SYNC_SETTLE_SECONDS = float(os.getenv("MESSAGE_SYNC_SETTLE_SECONDS", 1))
+MESSAGE_SYNC_TOMBSTONE_DAYS = int(os.getenv("MESSAGE_SYNC_TOMBSTONE_DAYS", 30))
+
+# Real-time events (served by /api/v1/messages/events/ under ASGI). The in-process
+# broker only reaches clients connected to the same process; multi-node deployments
+# plug in a shared broker implementing message.events.BaseEventBroker.
+MESSAGE_EVENT_BROKER = os.getenv(
+    "MESSAGE_EVENT_BROKER", "message.events.InProcessEventBroker"
+)
+MESSAGE_EVENTS_KEEPALIVE_SECONDS = float(
+    os.getenv("MESSAGE_EVENTS_KEEPALIVE_SECONDS", 15)
+)
+MESSAGE_EVENTS_QUEUE_SIZE = int(os.getenv("MESSAGE_EVENTS_QUEUE_SIZE", 100))
+
+# Longest a `GET /api/v1/messages/?wait=<seconds>` long poll may block
+MESSAGE_LONG_POLL_MAX_WAIT = float(os.getenv("MESSAGE_LONG_POLL_MAX_WAIT", 30))
+# How often a waiting long poll also checks the database for new messages, which
+# catches messages created in other processes when the event broker is in-process
+MESSAGE_LONG_POLL_RECHECK_INTERVAL = float(
+    os.getenv("MESSAGE_LONG_POLL_RECHECK_INTERVAL", 5)
+)
+
+# Per-user response cache for the message list and detail views. The local-memory
+# LRU backend keeps up to `MESSAGE_CACHE_MAX_ENTRIES` responses per process; with
+# several workers use the shared backend instead, which stores them for
+# `MESSAGE_CACHE_TIMEOUT` seconds in the Django cache `MESSAGE_CACHE_ALIAS`:
+#   MESSAGE_CACHE_BACKEND=message.cache.DjangoCacheBackend
+MESSAGE_CACHE_ENABLED = os.getenv("MESSAGE_CACHE_ENABLED", "false").lower() == "true"
+MESSAGE_CACHE_BACKEND = os.getenv(
+    "MESSAGE_CACHE_BACKEND", "message.cache.LocMemLRUBackend"
+)
+if MESSAGE_CACHE_BACKEND == "message.cache.DjangoCacheBackend":
+    MESSAGE_CACHE_OPTIONS = {
+        "alias": os.getenv("MESSAGE_CACHE_ALIAS", "default"),
+        "timeout": int(os.getenv("MESSAGE_CACHE_TIMEOUT", 300)),
+    }
+elif MESSAGE_CACHE_BACKEND == "message.cache.LocMemLRUBackend":
+    MESSAGE_CACHE_OPTIONS = {
+        "max_entries": int(os.getenv("MESSAGE_CACHE_MAX_ENTRIES", 10000))
+    }
+else:
+    # Custom backends are built with their own defaults
+    MESSAGE_CACHE_OPTIONS = {}
+
+# Message endpoints resolve the user from the JWT claims without loading the user
+# row; only the active status is read, and cached per process for this many seconds
+# (0 checks it on every request). A deactivated user is locked out within the TTL.
+MESSAGE_AUTH_ACTIVE_CACHE_SECONDS = float(
+    os.getenv("MESSAGE_AUTH_ACTIVE_CACHE_SECONDS", 30)
+)
+
+# Cold storage: `python manage.py move_cold_messages` moves messages older than this
+# out of the hot messages table; the API keeps reading them through.
+MESSAGE_COLD_AFTER_DAYS = int(os.getenv("MESSAGE_COLD_AFTER_DAYS", 90))
+
+# Serve the message list, detail and mark-read endpoints with native async views
+# reading through the async ORM. Only worth enabling under an ASGI server (the
+# `asgi` docker-compose profile); under WSGI every request pays an event loop.
+MESSAGE_ASYNC_VIEWS = os.getenv("MESSAGE_ASYNC_VIEWS", "false").lower() == "true"
+
+# Write queue: message creation and mark-read writes are handed to one background
+# thread per process, which commits up to `MESSAGE_WRITE_QUEUE_BATCH_SIZE` of them
+# (those queued within `MESSAGE_WRITE_QUEUE_MAX_WAIT` seconds) in one transaction.
+MESSAGE_WRITE_QUEUE_ENABLED = (
+    os.getenv("MESSAGE_WRITE_QUEUE_ENABLED", "false").lower() == "true"
+)
+MESSAGE_WRITE_QUEUE_BATCH_SIZE = int(os.getenv("MESSAGE_WRITE_QUEUE_BATCH_SIZE", 50))
+MESSAGE_WRITE_QUEUE_MAX_WAIT = float(os.getenv("MESSAGE_WRITE_QUEUE_MAX_WAIT", 0.002))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -155,15 +366,40 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
 
+# Log records are written as text, or as JSON lines with `LOG_FORMAT=json`. With
+# `LOG_QUEUE_ENABLED=true` requests only put records on an in-memory queue (of
+# `LOG_QUEUE_SIZE` records, dropping further ones when full) and a background thread
+# writes the file. `LOG_INFO_SAMPLE_RATE` keeps that fraction of INFO records.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_ENABLED = os.getenv("LOG_QUEUE_ENABLED", "false").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", 1))
+
+LOG_FILE_HANDLER = {
+    "level": "INFO",
+    "class": "logging.FileHandler",
+    "filename": os.path.join(LOGS_DIR, "logger.log"),
+}
+if LOG_QUEUE_ENABLED:
+    LOG_FILE_HANDLER.update(
+        {"class": "messaging_system.log.QueueFileHandler", "queue_size": LOG_QUEUE_SIZE}
+    )
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "messaging_system.log.RequestIDFilter"},
+        "sampling": {
+            "()": "messaging_system.log.SamplingFilter",
+            "rate": LOG_INFO_SAMPLE_RATE,
+        },
+    },
     "handlers": {
         "file": {
-            "level": "INFO",
-            "class": "logging.FileHandler",
-            "filename": os.path.join(LOGS_DIR, "logger.log"),
-            "formatter": "simple",
+            **LOG_FILE_HANDLER,
+            "formatter": "json" if LOG_FORMAT == "json" else "simple",
+            "filters": ["sampling", "request_id"],
         },
     },
     "loggers": {
@@ -177,15 +413,36 @@ LOGGING = {
             "level": "INFO",
             "propagate": True,
         },
+        "messaging_system": {
+            "handlers": ["file"],
+            "level": "INFO",
+            "propagate": True,
+        },
     },
     "formatters": {
         "simple": {"format": "%(asctime)s - %(levelname)s - %(message)s"},
+        "json": {"()": "messaging_system.log.JSONFormatter"},
     },
 }
 
 # Configure logging
 logging.config.dictConfig(LOGGING)
 
+# Request metrics: with `METRICS_ENABLED=true` every response carries a
+# `Server-Timing` header with its query count and timings, per-view histograms are
+# served to Prometheus at `/metrics`, and requests running more than
+# `METRICS_QUERY_BUDGET` queries are logged as warnings. `/metrics` only answers
+# clients in `METRICS_ALLOWED_NETWORKS` (comma-separated addresses or networks,
+# localhost by default) or sending `Authorization: Bearer <METRICS_TOKEN>`.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_QUERY_BUDGET = int(os.getenv("METRICS_QUERY_BUDGET", 20))
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv("METRICS_ALLOWED_NETWORKS", "127.0.0.1,::1").split(",")
+    if network.strip()
+]
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 SWAGGER_SETTINGS = {
     "USE_SESSION_AUTH": False,
     "SECURITY_DEFINITIONS": {
@@ -0,0 +1,515 @@
+import ipaddress
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import (
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from message.async_views import AsyncMessageRetrieveUpdateDestroyView
+from message.models import Message
+from message.utils import get_user_related_messages
+
+from .db.postgresql import base as postgresql_base
+from .db.routers import RequestRouting, pin_to_primary, request_routing_var
+from .db.sqlite3 import base as sqlite3_base
+from .log import (
+    JSONFormatter,
+    QueueFileHandler,
+    RequestIDFilter,
+    SamplingFilter,
+    request_id_var,
+)
+from .metrics import RequestMetrics, request_metrics_var
+from .renderers import FastJSONRenderer
+
+
+class CapturingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingTests(SimpleTestCase):
+    def make_record(self, level=logging.INFO, extra=None):
+        record = logging.makeLogRecord(
+            {"name": "message", "levelno": level, "levelname": "INFO"}
+        )
+        record.msg = "Marked message as read: %s"
+        record.args = (7,)
+        record.__dict__.update(extra or {})
+        return record
+
+    def test_json_formatter(self):
+        token = request_id_var.set("abc")
+        try:
+            record = self.make_record(extra={"user_id": 3})
+            RequestIDFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry["message"], "Marked message as read: 7")
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["user_id"], 3)
+        self.assertEqual(entry["logger"], "message")
+
+    def test_sampling(self):
+        sampling = SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(self.make_record()))
+        self.assertTrue(sampling.filter(self.make_record(level=logging.WARNING)))
+        self.assertTrue(sampling.filter(self.make_record(extra={"sampled": False})))
+        self.assertTrue(SamplingFilter(rate=1).filter(self.make_record()))
+
+    def test_queue_file_handler(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.log")
+            handler = QueueFileHandler(filename, queue_size=2)
+            handler.setFormatter(JSONFormatter())
+            handler.handle(self.make_record())
+            handler.close()
+            with open(filename) as file:
+                entries = [json.loads(line) for line in file]
+        self.assertEqual(
+            [entry["message"] for entry in entries], ["Marked message as read: 7"]
+        )
+
+    def test_queue_file_handler_renders_message_when_logged(self):
+        class Counter:
+            value = 1
+
+            def __str__(self):
+                return str(self.value)
+
+        counter = Counter()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.log")
+            handler = QueueFileHandler(filename)
+            handler.setFormatter(JSONFormatter())
+            # Stop the listener so the record is only formatted after the change
+            handler.listener.stop()
+            record = self.make_record()
+            record.args = (counter,)
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                record.exc_info = sys.exc_info()
+            handler.handle(record)
+            counter.value = 2
+            handler.listener.start()
+            handler.close()
+            with open(filename) as file:
+                entry = json.loads(file.readline())
+        self.assertEqual(entry["message"], "Marked message as read: 1")
+        self.assertIn("ZeroDivisionError", entry["exception"])
+
+    def test_queue_file_handler_drops_when_full(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = QueueFileHandler(
+                os.path.join(directory, "test.log"), queue_size=1
+            )
+            # Stop the listener so nothing drains the queue
+            handler.listener.stop()
+            handler.listener = None
+            for _ in range(3):
+                handler.handle(self.make_record())
+            self.assertEqual(handler.dropped, 2)
+            handler.close()
+
+
+class RequestIDMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username="alice"))
+        self.url = reverse("message:message-list-create")
+        self.handler = CapturingHandler()
+        self.handler.addFilter(RequestIDFilter())
+        logging.getLogger("message").addHandler(self.handler)
+        self.addCleanup(logging.getLogger("message").removeHandler, self.handler)
+
+    def test_request_id_is_logged_and_returned(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        request_id = response["X-Request-ID"]
+        self.assertEqual(len(request_id), 32)
+        self.assertTrue(self.handler.records)
+        self.assertTrue(
+            all(record.request_id == request_id for record in self.handler.records)
+        )
+        self.assertIsNone(request_id_var.get())
+
+    def test_incoming_request_id(self):
+        response = self.client.get(self.url, headers={"x-request-id": "lb-1234"})
+        self.assertEqual(response["X-Request-ID"], "lb-1234")
+
+        response = self.client.get(self.url, headers={"x-request-id": "bad id\n"})
+        self.assertNotEqual(response["X-Request-ID"], "bad id\n")
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.message = Message.objects.create(
+            sender=self.user_a, receiver=self.user_b, subject="S", content="C"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_b)
+
+    def test_server_timing_and_metrics(self):
+        url = reverse("message:message-detail", kwargs={"pk": self.message.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = dict(
+            entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(set(timings), {"db", "render", "total"})
+        self.assertRegex(timings["db"], r'^dur=[\d.]+;desc="\d+ queries"$')
+
+        metrics = self.client.get("/metrics").content.decode()
+        labels = 'method="GET",view="message:message-detail"'
+        self.assertIn("# TYPE http_request_db_queries histogram", metrics)
+        self.assertIn(f'http_request_db_queries_bucket{{{labels},le="+Inf"}}', metrics)
+        self.assertIn(f"http_request_duration_seconds_count{{{labels}}}", metrics)
+        self.assertIn(
+            'http_requests_total{method="GET",status="200",'
+            'view="message:message-detail"}',
+            metrics,
+        )
+
+    def test_async_view_render_time(self):
+        metrics = RequestMetrics()
+        token = request_metrics_var.set(metrics)
+        try:
+            view = AsyncMessageRetrieveUpdateDestroyView.as_view()
+            request = AsyncRequestFactory().get(
+                "/",
+                headers={
+                    "authorization": f"Bearer {AccessToken.for_user(self.user_b)}"
+                },
+            )
+            response = async_to_sync(view)(request, pk=self.message.id)
+        finally:
+            request_metrics_var.reset(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(metrics.render_time, 0)
+
+    def test_metrics_access(self):
+        self.assertEqual(
+            self.client.get("/metrics", REMOTE_ADDR="10.0.0.5").status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        with override_settings(
+            METRICS_ALLOWED_NETWORKS=[ipaddress.ip_network("10.0.0.0/8")]
+        ):
+            response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.5")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                "/metrics", REMOTE_ADDR="10.0.0.5", HTTP_AUTHORIZATION="Bearer wrong"
+            )
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(
+                "/metrics", REMOTE_ADDR="10.0.0.5", HTTP_AUTHORIZATION="Bearer secret"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_QUERY_BUDGET=1)
+    def test_query_budget_warning(self):
+        with self.assertLogs("messaging_system.middleware", "WARNING") as logs:
+            self.client.get(reverse("message:message-list-create"))
+        self.assertIn("message:message-list-create ran", logs.output[0])
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("message:message-list-create"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+class SQLiteProductionProfileTests(SimpleTestCase):
+    def test_pragmas_and_immediate_transactions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {
+                **connections["default"].settings_dict,
+                "ENGINE": "messaging_system.db.sqlite3",
+                "NAME": os.path.join(directory, "db.sqlite3"),
+                "OPTIONS": {
+                    "timeout": 1,
+                    "pragmas": {"journal_mode": "wal", "synchronous": "normal"},
+                },
+            }
+            wrapper = sqlite3_base.DatabaseWrapper(
+                settings_dict, alias="sqlite_profile"
+            )
+            connections["sqlite_profile"] = wrapper
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)
+
+                with CaptureQueriesContext(wrapper) as queries:
+                    with transaction.atomic(using="sqlite_profile"):
+                        pass
+            finally:
+                wrapper.close()
+                del connections["sqlite_profile"]
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+
+class PostgreSQLPoolTests(SimpleTestCase):
+    def get_wrapper(self, **settings):
+        settings_dict = {
+            **connections["default"].settings_dict,
+            "ENGINE": "messaging_system.db.postgresql",
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {"pool": {"min_size": 1, "max_size": 1}},
+            **settings,
+        }
+        wrapper = postgresql_base.DatabaseWrapper(settings_dict, alias="pooled")
+        self.addCleanup(wrapper.close_pool)
+        return wrapper
+
+    def test_persistent_connections_are_rejected(self):
+        wrapper = self.get_wrapper(CONN_MAX_AGE=60)
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.pool
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL")
+    def test_closed_connections_return_to_the_pool(self):
+        wrapper = self.get_wrapper()
+        backend_pids = []
+        for _ in range(2):
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                backend_pids.append(cursor.fetchone()[0])
+            wrapper.close()
+            self.assertIsNone(wrapper.connection)
+
+        self.assertEqual(backend_pids[0], backend_pids[1])
+        self.assertEqual(wrapper.pool.get_stats()["pool_available"], 1)
+
+    @skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL")
+    def test_connections_return_to_the_pool_they_came_from(self):
+        wrapper = self.get_wrapper()
+        wrapper.ensure_connection()
+        pool = wrapper.pool
+        self.addCleanup(pool.close)
+        # E.g. the settings changed while the connection was open
+        del wrapper._connection_pools["pooled"]
+        wrapper.close()
+        self.assertIsNone(wrapper.checkout_pool)
+        self.assertEqual(pool.get_stats()["pool_available"], 1)
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=["replica"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(id=1, username="alice")
+
+    def route(self, method="GET"):
+        token = request_routing_var.set(RequestRouting(method))
+        self.addCleanup(request_routing_var.reset, token)
+
+    def test_mailbox_reads_of_safe_requests_use_a_replica(self):
+        self.route()
+        self.assertEqual(get_user_related_messages(self.user).db, "replica")
+        self.assertEqual(
+            get_user_related_messages(self.user).filter(is_read=False).db, "replica"
+        )
+        # Other reads, and mailbox writes, stay on the primary
+        self.assertEqual(Message.objects.all().db, "default")
+        self.assertEqual(
+            get_user_related_messages(self.user).select_for_update().db, "default"
+        )
+
+    def test_reads_stay_on_the_primary(self):
+        # Outside requests
+        self.assertEqual(get_user_related_messages(self.user).db, "default")
+
+        self.route("PATCH")
+        self.assertEqual(get_user_related_messages(self.user).db, "default")
+
+        pin_to_primary(self.user.id)
+        self.route()
+        self.assertEqual(get_user_related_messages(self.user).db, "default")
+
+    @override_settings(DATABASE_REPLICA_ALIASES=[])
+    def test_no_replicas(self):
+        self.assertEqual(get_user_related_messages(self.user).db, "default")
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=["replica"])
+class ReplicaRoutingMiddlewareTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        # A second connection to the test database stands in for the replica
+        default = connections["default"]
+        backend = load_backend(default.settings_dict["ENGINE"])
+        replica = backend.DatabaseWrapper(dict(default.settings_dict), alias="replica")
+        connections["replica"] = replica
+        self.addCleanup(connections.__delitem__, "replica")
+        if hasattr(replica, "close_pool"):
+            self.addCleanup(replica.close_pool)
+        self.addCleanup(replica.close)
+
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.message = Message.objects.create(
+            sender=self.user_b, receiver=self.user_a, subject="S", content="C"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_a)
+        self.url = reverse("message:message-list-create")
+
+    def replica_queries(self, request):
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            response = request()
+        self.assertLess(response.status_code, 300)
+        return len(queries)
+
+    def test_writer_is_pinned_to_the_primary(self):
+        self.assertGreater(self.replica_queries(lambda: self.client.get(self.url)), 0)
+
+        create = lambda: self.client.post(
+            self.url, {"receiver": self.user_b.id, "subject": "S", "content": "C"}
+        )
+        self.assertEqual(self.replica_queries(create), 0)
+        self.assertEqual(self.replica_queries(lambda: self.client.get(self.url)), 0)
+
+        # Once the pin expires the replica serves the user again
+        cache.clear()
+        self.assertGreater(self.replica_queries(lambda: self.client.get(self.url)), 0)
+
+    def test_transactions_read_from_the_primary(self):
+        token = request_routing_var.set(RequestRouting("GET"))
+        try:
+            self.assertEqual(get_user_related_messages(self.user_a).db, "replica")
+            with transaction.atomic():
+                self.assertEqual(get_user_related_messages(self.user_a).db, "default")
+        finally:
+            request_routing_var.reset(token)
+
+    def test_updates_read_from_the_primary(self):
+        url = reverse("message:message-detail", kwargs={"pk": self.message.id})
+        self.client.force_authenticate(user=self.user_b)
+        update = lambda: self.client.patch(url, {"subject": "Edited"})
+        self.assertEqual(self.replica_queries(update), 0)
+
+
+@skipUnless(connection.vendor == "sqlite", "Copies the SQLite test database")
+@override_settings(DATABASE_REPLICA_ALIASES=["replica"], MESSAGE_CACHE_ENABLED=True)
+class ReplicaLagTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        # A copy of the test database that is only refreshed by `replicate` stands in
+        # for a lagging replica
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_file = os.path.join(directory.name, "replica.sqlite3")
+        replica = sqlite3_base.DatabaseWrapper(
+            {**connections["default"].settings_dict, "NAME": self.replica_file},
+            alias="replica",
+        )
+        connections["replica"] = replica
+        self.addCleanup(connections.__delitem__, "replica")
+        self.addCleanup(replica.close)
+
+        self.user_a = User.objects.create_user(username="alice")
+        self.user_b = User.objects.create_user(username="bob")
+        self.sender = APIClient()
+        self.sender.force_authenticate(user=self.user_b)
+        self.receiver = APIClient()
+        self.receiver.force_authenticate(user=self.user_a)
+        self.url = reverse("message:message-list-create")
+
+    def replicate(self):
+        connections["replica"].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(self.replica_file)
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+
+    def send(self, subject):
+        response = self.sender.post(
+            self.url, {"receiver": self.user_a.id, "subject": subject, "content": "C"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def subjects(self, response):
+        return [message["subject"] for message in response.data["results"]]
+
+    def test_stale_page_is_not_cached_or_tagged_as_current(self):
+        self.send("First")
+        self.replicate()
+        self.send("Second")
+
+        # The receiver isn't pinned, so the lagging replica serves an old page
+        response = self.receiver.get(self.url)
+        self.assertEqual(self.subjects(response), ["First"])
+
+        self.replicate()
+        response = self.receiver.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.subjects(response), ["Second", "First"])
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    data = {
+        "id": 1,
+        "sent": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        "price": Decimal("1.50"),
+        "label": gettext_lazy("Subject"),
+        "text": "caf\u00e9 \u2028\u2029",
+        "nested": [{"ok": True, "none": None}],
+        2: "non-string key",
+    }
+
+    def test_matches_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_indent_and_large_integers_use_json_renderer(self):
+        media_type = "application/json; indent=2"
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type),
+        )
+        self.assertEqual(
+            FastJSONRenderer().render({"big": 2**70}), b'{"big":%d}' % 2**70
+        )
@@ -5,6 +5,8 @@ from django.urls import include, path
 from django.views.generic import RedirectView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from .metrics import metrics_view
+
 urlpatterns = [
     # Include your app's URLs
     path("", include("message.urls")),
@@ -16,6 +18,8 @@ urlpatterns = [
     # JWT token URLs
     path("api/v1/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/v1/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    # Prometheus metrics (served when METRICS_ENABLED is on)
+    path("metrics", metrics_view, name="metrics"),
     # Redirect root URL to Swagger page
     path("", RedirectView.as_view(url="/swagger/", permanent=False)),
 ]